@@ -0,0 +1,85 @@
+"""测量导入入口模块的耗时，以及导入时向微信读书和Notion发出的请求数
+
+导入时不应该发出任何请求，也不应该创建日志文件。
+
+用法: python benchmarks/bench_import.py [重复次数]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weread2notionpro.fake_notion import FakeNotionServer
+from weread2notionpro.fake_weread import FakeLibrary, FakeWeReadServer
+
+ROOT = sys.path[0]
+
+MODULES = (
+    "weread2notionpro.book",
+    "weread2notionpro.weread",
+    "weread2notionpro.read_time",
+)
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({"import_time": time.perf_counter() - start}))
+"""
+
+
+def measure(module, env, workdir):
+    process = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT, module],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(process.stdout.splitlines()[-1])["import_time"]
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    weread_server = FakeWeReadServer(FakeLibrary(books=50)).start()
+    notion_server = FakeNotionServer(rate_limit=1000).start()
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        WEREAD_BASE_URL=weread_server.url,
+        WEREAD_COOKIE="wr_vid=1",
+        WEREAD_STATE_DIR=os.path.join(workdir, ".weread"),
+        NOTION_BASE_URL=notion_server.url,
+        NOTION_TOKEN="fake",
+        NOTION_PAGE=notion_server.page_id,
+    )
+    try:
+        for module in MODULES:
+            before = weread_server.request_count.total() + (
+                notion_server.request_count.total()
+            )
+            times = [measure(module, env, workdir) for _ in range(repeat)]
+            requests = (
+                weread_server.request_count.total()
+                + notion_server.request_count.total()
+                - before
+            )
+            print(
+                f"{module:<28} 最快 {min(times) * 1000:>7.1f} ms, "
+                f"中位数 {sorted(times)[len(times) // 2] * 1000:>7.1f} ms, "
+                f"每次导入请求 {requests / repeat:>5.1f} 次"
+            )
+        created = sorted(os.listdir(workdir))
+        print(f"导入时创建的文件: {created or '无'}")
+    finally:
+        weread_server.stop()
+        notion_server.stop()
+
+
+if __name__ == "__main__":
+    main()
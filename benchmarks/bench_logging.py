@@ -0,0 +1,134 @@
+"""对比旧的日志方式和后台线程日志的每本书开销
+
+旧方式：在调用线程里同步写控制台和文件，INFO级别输出完整的接口响应和Notion参数。
+新方式：日志经队列交给后台线程写入，大对象只在DEBUG级别以截断的预览输出。
+
+用法: python benchmarks/bench_logging.py [书籍数量] [每本书的阅读天数]
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stderr
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weread2notionpro import utils
+from weread2notionpro.config import book_properties_type_dict
+from weread2notionpro.fake_weread import DAY, FakeLibrary
+from weread2notionpro.log_config import (
+    TEXT_FORMAT,
+    LogSetup,
+    preview,
+)
+
+
+def make_books(count, read_days):
+    library = FakeLibrary(books=count)
+    books = []
+    for i in range(count):
+        data = library.read_info(i)
+        update_time = data["book"]["updateTime"]
+        data["readDetail"]["data"] = [
+            {"readDate": update_time - d * DAY, "readTime": 600}
+            for d in range(read_days)
+        ]
+        book = {**library.book(i), **data["book"], "时间": update_time}
+        book.update(书名=book["title"], BookId=book["bookId"], 简介=book["intro"])
+        properties = utils.get_properties(book, book_properties_type_dict)
+        books.append((book, data, properties))
+    return books
+
+
+def log_legacy(logger, book, data, properties):
+    """和原来insert_book_to_notion、get_read_info中的日志相同"""
+    logger.info(f"获取阅读信息 - 发起请求，参数: {dict(bookId=book['bookId'])}")
+    logger.info(f"获取阅读信息 - 完整原始响应: {data}")
+    logger.info(
+        f"   书籍《{book['title']}》阅读信息合并完成，当前book数据键: {list(book.keys())}"
+    )
+    logger.info(f"   书籍《{book['title']}》的时间戳字段处理:")
+    for key in ("startReadingTime", "updateTime", "finishedDate", "lastReadingDate"):
+        logger.info(f"     原始时间戳 - {key}: {book.get(key)}")
+    logger.info(f"正在插入《{book['title']}》")
+    logger.info(f"传入Notion的完整参数 - properties: {properties}")
+    logger.info(f"传入Notion的完整参数 - cover/icon: {utils.get_icon(book['cover'])}")
+
+
+def log_current(logger, book, data, properties):
+    logger.info(f"获取阅读信息 - 发起请求，参数: {dict(bookId=book['bookId'])}")
+    logger.debug("获取阅读信息 - 原始响应: %s", preview(data))
+    logger.info(f"   书籍《{book['title']}》阅读信息合并完成")
+    logger.debug("   当前book数据键: %s", list(book))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("   书籍《%s》的时间戳字段处理:", book["title"])
+        for key in ("startReadingTime", "updateTime", "finishedDate"):
+            logger.debug("     原始时间戳 - %s: %s", key, book.get(key))
+    logger.info(f"正在插入《{book['title']}》")
+    logger.debug("传入Notion的参数 - properties: %s", preview(properties))
+    logger.debug("传入Notion的参数 - cover: %s", book["cover"])
+
+
+def run_legacy(books, log_dir):
+    logger = logging.getLogger("bench.legacy")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    formatter = logging.Formatter(TEXT_FORMAT)
+    filename = os.path.join(log_dir, "legacy.log")
+    with open(os.devnull, "w") as devnull:
+        handlers = [
+            logging.StreamHandler(devnull),
+            logging.FileHandler(filename, encoding="utf-8"),
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        start = time.perf_counter()
+        for book, data, properties in books:
+            log_legacy(logger, book, data, properties)
+        elapsed = time.perf_counter() - start
+        for handler in handlers:
+            logger.removeHandler(handler)
+            handler.close()
+    return elapsed, elapsed, os.path.getsize(filename)
+
+
+def run_current(books, log_dir, fmt):
+    # setup时创建的控制台handler写到当时的sys.stderr，整个测试期间都要保持打开
+    with open(os.devnull, "w") as devnull:
+        with redirect_stderr(devnull):
+            log_setup = LogSetup()
+            filename = log_setup.setup(fmt=fmt, log_dir=os.path.join(log_dir, fmt))
+        logger = logging.getLogger("weread2notionpro.bench")
+        start = time.perf_counter()
+        for book, data, properties in books:
+            log_current(logger, book, data, properties)
+        elapsed = time.perf_counter() - start
+        # 等待后台线程写完，得到包含写入的总耗时
+        log_setup.stop()
+        total = time.perf_counter() - start
+    return elapsed, total, os.path.getsize(filename)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    read_days = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+    books = make_books(count, read_days)
+    log_dir = tempfile.mkdtemp(prefix="bench_logging_")
+    results = [
+        ("同步写入+完整参数", run_legacy(books, log_dir)),
+        ("队列写入 text", run_current(books, log_dir, "text")),
+        ("队列写入 json", run_current(books, log_dir, "json")),
+    ]
+    print(f"{count} 本书, 每本 {read_days} 天阅读记录")
+    for name, (elapsed, total, size) in results:
+        print(
+            f"{name:<16} 调用线程每本书 {elapsed / count * 1e6:>8.0f} µs, "
+            f"含写入总耗时 {total:>6.2f} s, 日志 {size / 1024 / 1024:>7.2f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
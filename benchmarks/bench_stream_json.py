@@ -0,0 +1,94 @@
+"""对比一次性解析和流式解析笔记本列表的内存峰值和耗时
+
+用法: python benchmarks/bench_stream_json.py [书籍数量]
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weread2notionpro.json_stream import JsonArrayStream
+from weread2notionpro.weread_api import WEREAD_STREAM_CHUNK_SIZE, WeReadApi
+
+
+def make_notebook(i):
+    return {
+        "bookId": str(10000000 + i),
+        "book": {
+            "bookId": str(10000000 + i),
+            "title": f"测试书籍{i}",
+            "author": f"作者{i % 100}",
+            "cover": f"https://cdn.weread.qq.com/cover/{i}.jpg",
+            "intro": "这是一段比较长的书籍简介。" * 20,
+            "categories": [{"categoryId": i % 30, "title": "文学"}],
+            "isbn": f"978{i:010d}",
+            "price": 39.9,
+            "publishTime": "2020-01-01 00:00:00",
+        },
+        "reviewCount": i % 7,
+        "noteCount": i % 13,
+        "sort": 1700000000 + i,
+    }
+
+
+def make_payload(count):
+    notebooks = [make_notebook(i) for i in range(count)]
+    return json.dumps(
+        {"synckey": 1700000000, "totalBookCount": count, "books": notebooks},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def iter_chunks(payload):
+    """模拟requests的iter_content，按块返回响应体"""
+    for i in range(0, len(payload), WEREAD_STREAM_CHUNK_SIZE):
+        yield payload[i : i + WEREAD_STREAM_CHUNK_SIZE]
+
+
+def load_all(api, chunks):
+    """原来的方式：读取完整响应后r.json()，再转换全部书籍"""
+    data = json.loads(b"".join(chunks))
+    books = data.get("books")
+    books.sort(key=lambda x: x["sort"])
+    return sum(1 for _ in api.format_notebooks(books))
+
+
+def load_stream(api, chunks):
+    """流式解析，每次只处理一本书"""
+    return sum(
+        1
+        for notebook in JsonArrayStream(chunks, "books")
+        if api.format_notebook(notebook)
+    )
+
+
+def measure(func, api, payload):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(api, iter_chunks(payload))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, peak, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    payload = make_payload(count)
+    # 只用到格式转换方法，不需要Cookie
+    api = WeReadApi.__new__(WeReadApi)
+    print(f"{count} 本书, 响应大小 {len(payload) / 1024 / 1024:.1f} MB")
+    for name, func in (("r.json()", load_all), ("stream", load_stream)):
+        books, peak, elapsed = measure(func, api, payload)
+        print(
+            f"{name:>10}: {books} 本书, 内存峰值 {peak / 1024 / 1024:.1f} MB, "
+            f"耗时 {elapsed:.2f} 秒"
+        )
+
+
+if __name__ == "__main__":
+    main()
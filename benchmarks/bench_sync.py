@@ -0,0 +1,216 @@
+"""端到端的同步性能测试，使用本地模拟的微信读书和Notion服务器
+
+依次运行book、weread、read_time三个阶段，每个阶段在单独的进程中执行，
+记录耗时、每个接口的请求次数、重试次数、传输的字节数和内存峰值。
+
+    python benchmarks/bench_sync.py --preset smoke --save results.json
+    python benchmarks/bench_sync.py --preset smoke --baseline results.json
+
+默认不限制模拟Notion的速率，主要比较请求次数和客户端开销；
+--notion-rate 3 可以模拟真实的限流，但大书库会非常慢。
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weread2notionpro.fake_notion import FakeNotionServer
+from weread2notionpro.fake_weread import FakeLibrary, FakeWeReadServer
+
+ROOT = sys.path[0]
+
+STAGES = ("book", "weread", "read_time")
+# (书籍数, 每本书的划线数)
+PRESETS = {
+    "smoke": [(50, 10)],
+    "standard": [(50, 10), (500, 10), (50, 1000)],
+    "full": list(itertools.product((50, 500, 5000), (10, 1000, 10000))),
+}
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+def run_stage(stage):
+    """在子进程中运行一个阶段，导入模块的耗时也计算在内"""
+    start = time.perf_counter()
+    module = importlib.import_module(f"weread2notionpro.{stage}")
+    module.main()
+    wall_time = time.perf_counter() - start
+    from weread2notionpro.retry_policy import retry_policy
+
+    result = {
+        "wall_time": round(wall_time, 3),
+        "retries": retry_policy.retries,
+        # Linux上ru_maxrss的单位是KB
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def diff(after, before):
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+
+def run_scenario(books, highlights, args):
+    name = f"{books}x{highlights}"
+    print(f"== {name}: {books} 本书, 每本 {highlights} 条划线", flush=True)
+    library = FakeLibrary(books=books, highlights=highlights)
+    weread_server = FakeWeReadServer(library, latency=args.latency).start()
+    notion_server = FakeNotionServer(
+        rate_limit=args.notion_rate, latency=args.latency
+    ).start()
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    env = {
+        k: v
+        for k, v in os.environ.items()
+        if not k.startswith(("CC_", "HTTP_CASSETTE"))
+    }
+    env.update(
+        PYTHONPATH=ROOT,
+        WEREAD_BASE_URL=weread_server.url,
+        WEREAD_COOKIE="wr_vid=1",
+        WEREAD_STATE_DIR=os.path.join(workdir, ".weread"),
+        NOTION_BASE_URL=notion_server.url,
+        NOTION_TOKEN="fake",
+        NOTION_PAGE=notion_server.page_id,
+        NOTION_RATE_LIMIT=str(args.notion_rate or 1000),
+    )
+    stages = {}
+    try:
+        for stage in args.stages:
+            weread_before = Counter(weread_server.request_count)
+            notion_before = Counter(notion_server.request_count)
+            bytes_before = weread_server.bytes + notion_server.bytes
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-stage", stage],
+                cwd=workdir,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=args.timeout,
+            )
+            lines = [
+                x for x in process.stdout.splitlines() if x.startswith(RESULT_PREFIX)
+            ]
+            if process.returncode != 0 or not lines:
+                print(process.stderr[-2000:], file=sys.stderr)
+                raise RuntimeError(f"{name} {stage} 运行失败")
+            result = json.loads(lines[-1][len(RESULT_PREFIX) :])
+            result["weread_calls"] = diff(weread_server.request_count, weread_before)
+            result["notion_calls"] = diff(notion_server.request_count, notion_before)
+            result["bytes"] = diff(
+                weread_server.bytes + notion_server.bytes, bytes_before
+            )
+            result["total_calls"] = sum(result["weread_calls"].values()) + sum(
+                result["notion_calls"].values()
+            )
+            stages[stage] = result
+            print(
+                f"   {stage:<10} {result['wall_time']:>8.2f}s "
+                f"{result['total_calls']:>8} 次请求 "
+                f"{sum(result['bytes'].values()) / 1024:>10.0f} KB "
+                f"重试 {result['retries']:>4} 次 "
+                f"内存 {result['peak_rss_mb']:>7.1f} MB",
+                flush=True,
+            )
+    finally:
+        weread_server.stop()
+        notion_server.stop()
+    return {"name": name, "books": books, "highlights": highlights, "stages": stages}
+
+
+def compare(results, baseline, time_tolerance, call_tolerance, min_time):
+    """和基准结果比较，返回回归的描述列表"""
+    failures = []
+    baseline = {x["name"]: x for x in baseline.get("scenarios", [])}
+    for scenario in results["scenarios"]:
+        base = baseline.get(scenario["name"])
+        if base is None:
+            continue
+        for stage, result in scenario["stages"].items():
+            base_stage = base["stages"].get(stage)
+            if base_stage is None:
+                continue
+            label = f"{scenario['name']} {stage}"
+            calls, base_calls = result["total_calls"], base_stage["total_calls"]
+            if calls > base_calls * (1 + call_tolerance):
+                failures.append(f"{label}: 请求次数 {base_calls} -> {calls}")
+            wall, base_wall = result["wall_time"], base_stage["wall_time"]
+            # 很短的阶段误差较大，至少慢min_time秒才算回归
+            if wall > base_wall * (1 + time_tolerance) and wall - base_wall > min_time:
+                failures.append(f"{label}: 耗时 {base_wall:.2f}s -> {wall:.2f}s")
+    return failures
+
+
+def parse_sizes(value):
+    return [int(x) for x in value.split(",") if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端同步性能测试")
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--preset", choices=PRESETS, default="smoke")
+    parser.add_argument("--books", type=parse_sizes, help="书籍数，逗号分隔")
+    parser.add_argument("--highlights", type=parse_sizes, help="划线数，逗号分隔")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--latency", type=float, default=0, help="模拟的接口延迟")
+    parser.add_argument(
+        "--notion-rate", type=float, default=0, help="模拟Notion的限流，0为不限制"
+    )
+    parser.add_argument("--timeout", type=float, help="每个阶段的超时秒数")
+    parser.add_argument("--save", help="保存结果的JSON文件")
+    parser.add_argument("--baseline", help="用于比较的基准结果JSON文件")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--call-tolerance", type=float, default=0.0)
+    parser.add_argument("--min-time", type=float, default=1.0)
+    args = parser.parse_args()
+    if args.run_stage:
+        return run_stage(args.run_stage)
+
+    if args.books or args.highlights:
+        sizes = list(itertools.product(args.books or [50], args.highlights or [10]))
+    else:
+        sizes = PRESETS[args.preset]
+    results = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "latency": args.latency,
+        "notion_rate": args.notion_rate,
+        "scenarios": [
+            run_scenario(books, highlights, args) for books, highlights in sizes
+        ],
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = compare(
+            results,
+            baseline,
+            args.time_tolerance,
+            args.call_tolerance,
+            args.min_time,
+        )
+        for failure in failures:
+            print(f"回归: {failure}")
+        if failures:
+            sys.exit(1)
+        print("没有发现回归")
+
+
+if __name__ == "__main__":
+    main()
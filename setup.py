@@ -5,17 +5,19 @@ setup(
     packages=find_packages(),
     install_requires=[
         "requests",
+        "httpx",
         "pendulum",
-        "retrying",
         "notion-client",
         "github-heatmap",
         "github-heatmap",
+        "cryptography",
     ],
     entry_points={
         "console_scripts": [
             "book = weread2notionpro.book:main",
             "weread = weread2notionpro.weread:main",
             "read_time = weread2notionpro.read_time:main",
+            "sync = weread2notionpro.sync:main",
         ],
     },
     author="malinkang",
@@ -29,5 +31,5 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.9",
 )
@@ -0,0 +1,66 @@
+"""测试共用的环境和模拟服务器
+
+很多配置在模块导入时从环境变量读取，所以在导入weread2notionpro之前设置好：
+状态文件写到临时目录，Notion不限流，微信读书指向本地的模拟服务器。
+"""
+
+import os
+import tempfile
+
+import pytest
+
+os.environ["WEREAD_STATE_DIR"] = tempfile.mkdtemp(prefix="weread_test_state_")
+os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="weread_test_logs_")
+os.environ["WEREAD_COOKIE"] = "wr_vid=1"
+os.environ["NOTION_TOKEN"] = "fake"
+os.environ["NOTION_RATE_LIMIT"] = "1000"
+os.environ["NOTION_BURST"] = "1000"
+os.environ["RETRY_BASE_DELAY"] = "0.01"
+os.environ["WEREAD_RATE_LIMIT"] = "0"
+os.environ.pop("CC_URL", None)
+os.environ.pop("HTTP_CASSETTE", None)
+os.environ.pop("TRACE_FILE", None)
+
+from weread2notionpro.fake_notion import FakeNotionServer
+from weread2notionpro.fake_weread import FakeLibrary, FakeWeReadServer
+
+# WEREAD_URL等在导入weread_api时确定，整个测试过程共用一个模拟服务器
+weread_server = FakeWeReadServer(FakeLibrary(books=5, highlights=3, reviews=2))
+weread_server.start()
+os.environ["WEREAD_BASE_URL"] = weread_server.url
+
+
+def pytest_unconfigure(config):
+    weread_server.stop()
+
+
+@pytest.fixture
+def fake_weread():
+    """每个测试使用新的书库和请求计数"""
+    weread_server.library = FakeLibrary(books=5, highlights=3, reviews=2)
+    weread_server.request_count.clear()
+    weread_server.login_timeout_rate = 0
+    return weread_server
+
+
+@pytest.fixture
+def fake_notion(monkeypatch):
+    server = FakeNotionServer(rate_limit=0).start()
+    monkeypatch.setenv("NOTION_BASE_URL", server.url)
+    monkeypatch.setenv("NOTION_PAGE", server.page_id)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def notion_helper(fake_notion, monkeypatch, tmp_path):
+    """连接模拟Notion服务器的NotionHelper，关联页面索引写到临时目录"""
+    from weread2notionpro import notion_helper as module
+    from weread2notionpro.relation_index import RelationIndex
+
+    monkeypatch.setattr(
+        module,
+        "RelationIndex",
+        lambda: RelationIndex(str(tmp_path / "relations.sqlite3")),
+    )
+    return module.NotionHelper()
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from weread2notionpro.async_weread_api import AsyncWeReadApi, BookPrefetcher
+from weread2notionpro.weread_api import WeReadApi
+
+
+def test_async_api_returns_same_data_as_sync_api(fake_weread):
+    api = WeReadApi()
+    bookId = fake_weread.library.book_id(1)
+
+    async def fetch():
+        async with AsyncWeReadApi(api) as async_api:
+            return await asyncio.gather(
+                async_api.get_read_info(bookId),
+                async_api.get_review_list(bookId),
+            )
+
+    read_info, reviews = asyncio.run(fetch())
+    assert read_info == api.get_read_info(bookId)
+    assert reviews == api.get_review_list(bookId)
+
+
+def test_prefetcher_yields_in_order_and_bounds_lookahead(fake_weread):
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    async def fetch(async_api, bookId):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        # 先提交的书更晚完成，结果仍然按提交顺序返回
+        await asyncio.sleep(0.02 * (10 - int(bookId)))
+        with lock:
+            running -= 1
+        return int(bookId) * 2
+
+    bookIds = [str(i) for i in range(10)]
+    with BookPrefetcher(AsyncWeReadApi(WeReadApi()), fetch, ahead=3) as prefetcher:
+        results = list(prefetcher.iter_results(bookIds))
+    assert results == [(bookId, int(bookId) * 2) for bookId in bookIds]
+    # 正在等待的一本加上最多提前的3本
+    assert peak <= 4
+
+
+def test_prefetcher_returns_none_for_failed_books(fake_weread):
+    async def fetch(async_api, bookId):
+        if bookId == "b":
+            raise ValueError("获取失败")
+        return bookId.upper()
+
+    with BookPrefetcher(AsyncWeReadApi(WeReadApi()), fetch) as prefetcher:
+        results = list(prefetcher.iter_results(["a", "b", "c"]))
+    assert results == [("a", "A"), ("b", None), ("c", "C")]
@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from weread2notionpro import book_info_cache as module
+from weread2notionpro.book_info_cache import BookInfoCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(module.time, "time", lambda: clock[0])
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "book_info.json")
+
+
+def info(bookId):
+    return {"bookId": bookId, "title": f"书{bookId}", "author": "作者"}
+
+
+def test_only_sync_fields_are_cached(path, clock):
+    cache = BookInfoCache(path)
+    cache.put("1", dict(info("1"), newRating=900, AISummary="摘要"))
+    assert cache.get("1") == info("1")
+    assert cache.get("2") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_returned_data_is_a_copy(path, clock):
+    cache = BookInfoCache(path)
+    cache.put("1", info("1"))
+    cache.get("1")["title"] = "改了"
+    assert cache.get("1") == info("1")
+
+
+def test_empty_data_is_not_cached(path, clock):
+    cache = BookInfoCache(path)
+    cache.put("1", None)
+    cache.put("2", {})
+    assert cache.get("1") is None and cache.get("2") is None
+
+
+def test_entries_expire_after_ttl(path, clock):
+    cache = BookInfoCache(path, ttl=100)
+    cache.put("1", info("1"))
+    clock[0] += 100
+    assert cache.get("1") == info("1")
+    clock[0] += 1
+    assert cache.get("1") is None
+
+
+def test_using_an_entry_does_not_extend_ttl(path, clock):
+    cache = BookInfoCache(path, ttl=100)
+    cache.put("1", info("1"))
+    clock[0] += 90
+    cache.get("1")
+    clock[0] += 20
+    assert cache.get("1") is None
+
+
+def test_least_recently_used_is_evicted(path, clock):
+    cache = BookInfoCache(path, max_size=2)
+    cache.put("1", info("1"))
+    clock[0] += 1
+    cache.put("2", info("2"))
+    clock[0] += 1
+    cache.get("1")
+    clock[0] += 1
+    cache.put("3", info("3"))
+    assert cache.get("2") is None
+    assert cache.get("1") == info("1")
+    assert cache.get("3") == info("3")
+
+
+def test_expired_entries_are_evicted_first(path, clock):
+    cache = BookInfoCache(path, ttl=100, max_size=2)
+    cache.put("1", info("1"))
+    clock[0] += 50
+    cache.put("2", info("2"))
+    clock[0] += 60
+    cache.get("2")
+    cache.put("3", info("3"))
+    assert sorted(cache.entries) == ["2", "3"]
+
+
+def test_flush_writes_and_reloads(path, clock):
+    cache = BookInfoCache(path)
+    cache.put("1", info("1"))
+    cache.flush()
+    assert not cache.dirty
+    assert BookInfoCache(path).get("1") == info("1")
+
+
+def test_flush_without_changes_does_not_write(path, clock):
+    BookInfoCache(path).flush()
+    cache = BookInfoCache(path)
+    assert cache.get("1") is None
+    cache.flush()
+    assert not os.path.exists(path)
+
+
+def test_corrupted_file_is_ignored(path, clock):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{broken")
+    cache = BookInfoCache(path)
+    assert cache.get("1") is None
+    cache.put("1", info("1"))
+    cache.flush()
+    assert BookInfoCache(path).get("1") == info("1")
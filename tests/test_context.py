@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from weread2notionpro import context, notion_helper, weread_api
+from weread2notionpro.context import ClientProxy, SyncContext
+
+
+@pytest.fixture
+def created(monkeypatch):
+    """替换WeReadApi和NotionHelper，记录创建的次数"""
+    created = []
+
+    class FakeClient:
+        def __init__(self, name):
+            # 创建较慢，多个线程同时访问时更容易重复创建
+            time.sleep(0.01)
+            created.append(name)
+            self.name = name
+
+        def get_all_book(self):
+            created.append("books")
+            return {"1": {"pageId": "page-1"}}
+
+    monkeypatch.setattr(weread_api, "WeReadApi", lambda: FakeClient("weread_api"))
+    monkeypatch.setattr(
+        notion_helper, "NotionHelper", lambda: FakeClient("notion_helper")
+    )
+    return created
+
+
+def test_clients_are_created_on_first_use(created):
+    sync_context = SyncContext()
+    assert created == []
+    assert sync_context.weread_api is sync_context.weread_api
+    assert created == ["weread_api"]
+    assert sync_context.notion_books is sync_context.notion_books
+    assert created == ["weread_api", "notion_helper", "books"]
+
+
+def test_clients_passed_in_are_used(created):
+    api = object()
+    sync_context = SyncContext(weread_api=api)
+    assert sync_context.weread_api is api
+    assert created == []
+
+
+def test_concurrent_first_use_creates_one_client(created):
+    sync_context = SyncContext()
+    results = []
+
+    def work():
+        results.append(sync_context.notion_helper)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert created == ["notion_helper"]
+    assert all(x is results[0] for x in results)
+
+
+def test_proxy_follows_the_current_context(created, monkeypatch):
+    monkeypatch.setattr(context, "sync_context", SyncContext())
+    proxy = ClientProxy("weread_api")
+    assert created == []
+    assert proxy.name == "weread_api"
+
+    other = SyncContext(weread_api=type("Api", (), {"name": "other"})())
+    context.use_context(other)
+    assert proxy.name == "other"
+    assert context.get_context() is other
+    assert created == ["weread_api"]
+
+
+def test_importing_entry_modules_creates_no_clients(tmp_path):
+    # 没有Cookie和Notion配置时导入也不能出错，导入时不应该发出请求
+    env = {
+        k: v for k, v in os.environ.items() if not k.startswith(("WEREAD", "NOTION"))
+    }
+    env.update(LOG_DIR=str(tmp_path / "logs"), WEREAD_STATE_DIR=str(tmp_path))
+    script = (
+        "import weread2notionpro.book, weread2notionpro.weread, "
+        "weread2notionpro.read_time, weread2notionpro.sync\n"
+        "from weread2notionpro.context import get_context\n"
+        "context = get_context()\n"
+        "assert context._weread_api is None and context._notion_helper is None\n"
+    )
+    subprocess.run([sys.executable, "-c", script], env=env, check=True)
+    assert not (tmp_path / "logs").exists()
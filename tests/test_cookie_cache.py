@@ -0,0 +1,78 @@
+import base64
+import json
+
+import pytest
+
+from weread2notionpro.cookie_cache import CookieCache
+
+COOKIE = "wr_vid=1; wr_skey=abc; 中文=值"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cookie.enc")
+
+
+def test_round_trip(path):
+    CookieCache("id", "password", path).save(COOKIE)
+    assert CookieCache("id", "password", path).load() == COOKIE
+    with open(path, encoding="utf-8") as f:
+        assert "wr_skey" not in f.read()
+
+
+def test_each_save_uses_new_salt_and_nonce(path):
+    cache = CookieCache("id", "password", path)
+    assert cache.encrypt(b"cookie") != cache.encrypt(b"cookie")
+
+
+@pytest.mark.parametrize("id, password", [("id", "wrong"), ("other", "password")])
+def test_wrong_password_or_id_is_rejected(path, id, password):
+    CookieCache("id", "password", path).save(COOKIE)
+    cache = CookieCache(id, password, path)
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    with pytest.raises(ValueError):
+        cache.decrypt(payload)
+    assert cache.load() is None
+
+
+@pytest.mark.parametrize("field", ["salt", "nonce", "data"])
+def test_tampered_cache_is_rejected(path, field):
+    cache = CookieCache("id", "password", path)
+    cache.save(COOKIE)
+    with open(path, encoding="utf-8") as f:
+        payload = json.load(f)
+    value = bytearray(base64.b64decode(payload[field]))
+    value[-1] ^= 1
+    payload[field] = base64.b64encode(value).decode("ascii")
+    with pytest.raises(ValueError):
+        cache.decrypt(payload)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    assert cache.load() is None
+
+
+def test_corrupted_or_missing_cache_returns_none(path):
+    cache = CookieCache("id", "password", path)
+    assert cache.load() is None
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("not json")
+    assert cache.load() is None
+
+
+def test_expired_cookie_is_not_returned(path, monkeypatch):
+    cache = CookieCache("id", "password", path, ttl=100)
+    monkeypatch.setattr("time.time", lambda: 1000)
+    cache.save(COOKIE, expires=1050)
+    monkeypatch.setattr("time.time", lambda: 1049)
+    assert cache.load() == COOKIE
+    monkeypatch.setattr("time.time", lambda: 1050)
+    assert cache.load() is None
+
+
+def test_ttl_caps_cookie_expiry(path, monkeypatch):
+    cache = CookieCache("id", "password", path, ttl=100)
+    monkeypatch.setattr("time.time", lambda: 1000)
+    cache.save(COOKIE, expires=5000)
+    monkeypatch.setattr("time.time", lambda: 1100)
+    assert cache.load() is None
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from weread2notionpro.json_stream import JsonArrayStream, JsonStreamError
+
+
+def split(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def parse(chunks, key="books"):
+    stream = JsonArrayStream(chunks, key)
+    return list(stream), stream.fields
+
+
+def test_returns_array_items_and_other_fields():
+    data = {"synckey": 123, "books": [{"bookId": "1"}, {"bookId": "2"}], "x": [1]}
+    text = json.dumps(data, ensure_ascii=False).encode()
+    for size in (1, 3, 7, len(text)):
+        items, fields = parse(split(text, size))
+        assert items == data["books"]
+        assert fields == {"synckey": 123, "x": [1]}
+
+
+def test_multibyte_characters_split_across_chunks():
+    data = {"books": [{"title": "三体·黑暗森林"}, "《红楼梦》"]}
+    items, _ = parse(split(json.dumps(data, ensure_ascii=False).encode(), 1))
+    assert items == data["books"]
+
+
+def test_numbers_at_chunk_boundary_are_not_cut():
+    text = b'{"books": [12345, 6.75], "total": 1000}'
+    items, fields = parse(split(text, 2))
+    assert items == [12345, 6.75]
+    assert fields == {"total": 1000}
+
+
+def test_empty_array_and_missing_key():
+    assert parse([b'{"books": []}']) == ([], {})
+    assert parse([b'{"other": [1, 2]}']) == ([], {"other": [1, 2]})
+
+
+@pytest.mark.parametrize(
+    "text",
+    [b'{"books": [{"bookId": "1"}, {"bookId": ', b'{"books": [1, 2', b'{"books"'],
+)
+def test_truncated_json_raises(text):
+    with pytest.raises(JsonStreamError):
+        parse(split(text, 4))
+
+
+def test_large_item_across_many_chunks_is_parsed_in_linear_time():
+    item = {"bookId": "1", "intro": "简介" * 20000}
+    text = json.dumps({"books": [item, {"bookId": "2"}]}, ensure_ascii=False).encode()
+    stream = JsonArrayStream(split(text, 64), "books")
+    decode = stream.decoder.raw_decode
+    parsed = []
+
+    def raw_decode(s, idx=0):
+        parsed.append(len(s) - idx)
+        return decode(s, idx)
+
+    stream.decoder.raw_decode = raw_decode
+    assert list(stream) == [item, {"bookId": "2"}]
+    # 每次读到一个片段就重新解析时，总的解析量约为 片段数 * 元素大小 / 2
+    assert sum(parsed) < 5 * len(text)
@@ -0,0 +1,28 @@
+import glob
+import os
+import subprocess
+import sys
+
+SCRIPT = """
+from weread2notionpro.log_config import setup_logging
+from weread2notionpro.tracing import tracer
+
+setup_logging()
+with tracer.span("运行"):
+    pass
+"""
+
+
+def test_logs_written_by_atexit_functions_are_not_lost(tmp_path):
+    # tracing在setup_logging之前导入，退出时写追踪文件的日志在最后输出
+    env = dict(
+        os.environ,
+        LOG_DIR=str(tmp_path / "logs"),
+        TRACE_FILE=str(tmp_path / "trace.json"),
+    )
+    subprocess.run([sys.executable, "-c", SCRIPT], env=env, check=True)
+
+    assert os.path.exists(tmp_path / "trace.json")
+    (filename,) = glob.glob(str(tmp_path / "logs" / "*.log"))
+    with open(filename, encoding="utf-8") as f:
+        assert "追踪事件" in f.read()
@@ -0,0 +1,185 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from notion_client import APIErrorCode, APIResponseError
+
+from weread2notionpro.notion_helper import USER_ICON_URL
+from weread2notionpro.utils import get_property_value, get_title
+
+RELATION_DATABASES = ("年", "月", "周", "日", "作者")
+
+
+def api_error(code, message):
+    response = httpx.Response(400, request=httpx.Request("POST", "http://notion"))
+    return APIResponseError(response, message, code)
+
+
+def fail_next_create(monkeypatch, helper, error):
+    """让下一次pages.create返回error，之后恢复正常，返回所有调用的参数"""
+    create = helper.client.pages.create
+    calls = []
+
+    def fake_create(**kwargs):
+        calls.append(kwargs)
+        if not getattr(fake_create, "failed", False):
+            fake_create.failed = True
+            raise error
+        return create(**kwargs)
+
+    monkeypatch.setattr(helper.client.pages, "create", fake_create)
+    return calls
+
+
+def relation_counts(fake_notion):
+    count = fake_notion.workspace.count()
+    return {name: count[name] for name in RELATION_DATABASES}
+
+
+def bookmark(bookmarkId, create_time):
+    return {
+        "bookmarkId": bookmarkId,
+        "bookId": "1",
+        "markText": "划线",
+        "range": "0-10",
+        "blockId": f"block-{bookmarkId}",
+        "createTime": int(create_time.timestamp()),
+    }
+
+
+def test_validation_error_unrelated_to_relations_keeps_index(
+    notion_helper, fake_notion, monkeypatch
+):
+    date = datetime(2024, 3, 5, 12)
+    notion_helper.preload_dates([date])
+    notion_helper.get_relation_id(
+        "作者甲", notion_helper.author_database_id, USER_ICON_URL
+    )
+    notion_helper.insert_bookmark("book", bookmark("b1", date))
+    before = relation_counts(fake_notion)
+    index_before = notion_helper.relation_index.stats()
+
+    error = api_error(
+        APIErrorCode.ValidationError, "body.properties.style.number should be a number"
+    )
+    fail_next_create(monkeypatch, notion_helper, error)
+    with pytest.raises(APIResponseError) as raised:
+        notion_helper.insert_bookmark("book", bookmark("b2", date))
+
+    assert raised.value is error
+    assert relation_counts(fake_notion) == before
+    assert notion_helper.relation_index.stats() == index_before
+
+
+def test_stale_relation_named_in_error_is_requeried(
+    notion_helper, fake_notion, monkeypatch
+):
+    database_id = notion_helper.author_database_id
+    page_id = notion_helper.get_relation_id("作者乙", database_id, USER_ICON_URL)
+    # 模拟索引中保存的是一个已经不存在的页面
+    stale_id = "00000000-0000-0000-0000-000000000001"
+    notion_helper._NotionHelper__cache.clear()
+    notion_helper.relation_index.put(database_id, "作者乙", stale_id)
+    assert notion_helper.get_relation_id("作者乙", database_id, USER_ICON_URL) == (
+        stale_id
+    )
+
+    error = api_error(
+        APIErrorCode.ObjectNotFound, f"Could not find page with ID: {stale_id}."
+    )
+    calls = fail_next_create(monkeypatch, notion_helper, error)
+    properties = {"作者": {"relation": [{"id": stale_id}]}}
+    notion_helper.create_page(
+        {"database_id": notion_helper.bookmark_database_id}, properties, None
+    )
+
+    assert calls[-1]["properties"]["作者"]["relation"] == [{"id": page_id}]
+    assert notion_helper.relation_index.get(database_id, "作者乙") == page_id
+    assert fake_notion.workspace.count()["作者"] == 1
+
+
+def test_deleted_relation_is_not_recreated_while_refreshing(
+    notion_helper, fake_notion, monkeypatch
+):
+    database_id = notion_helper.author_database_id
+    page_id = notion_helper.get_relation_id("作者丙", database_id, USER_ICON_URL)
+    notion_helper.client.pages.update(page_id=page_id, archived=True)
+
+    error = api_error(APIErrorCode.ObjectNotFound, f"Could not find page: {page_id}")
+    fail_next_create(monkeypatch, notion_helper, error)
+    properties = {"作者": {"relation": [{"id": page_id}]}}
+    with pytest.raises(APIResponseError):
+        notion_helper.create_page(
+            {"database_id": notion_helper.bookmark_database_id}, properties, None
+        )
+    assert fake_notion.workspace.count()["作者"] == 0
+
+    # 之后再用到这个作者时按标题查询，查不到才创建新的页面
+    new_page_id = notion_helper.get_relation_id("作者丙", database_id, USER_ICON_URL)
+    assert new_page_id != page_id
+    assert fake_notion.workspace.count()["作者"] == 1
+
+
+def test_concurrent_relations_keep_their_own_properties(notion_helper, fake_notion):
+    database_id = notion_helper.author_database_id
+    names = {f"作者{i}" for i in range(20)}
+    # 和book.py中一样不传properties
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(
+            executor.map(
+                lambda name: notion_helper.get_relation_id(
+                    name, database_id, USER_ICON_URL
+                ),
+                names,
+            )
+        )
+
+    pages = notion_helper.query_all(database_id)
+    titles = {get_property_value(x["properties"]["标题"]) for x in pages}
+    assert titles == names
+    for page in pages:
+        name, _, _, properties = notion_helper.relation_args[page["id"]]
+        assert properties["标题"] == get_title(name)
+
+
+def new_run(fake_notion):
+    """用同一个本地索引创建新的NotionHelper，模拟下一次运行，并清空请求计数"""
+    from weread2notionpro import notion_helper as module
+
+    helper = module.NotionHelper()
+    fake_notion.request_count.clear()
+    return helper
+
+
+def test_preloading_dates_with_warm_index_reads_each_database_once(
+    notion_helper, fake_notion
+):
+    notion_helper.preload_dates([datetime(2024, 1, 1)])
+    assert notion_helper.relation_index.is_warmed(notion_helper.day_database_id)
+
+    helper = new_run(fake_notion)
+    dates = [datetime(2024, 3, 1) + timedelta(days=i) for i in range(40)]
+    helper.preload_dates(dates)
+
+    # 年、月、周、日各分页读取一次，新的日期不再逐个按标题查询
+    assert fake_notion.request_count["query_database"] == 4
+    assert relation_counts(fake_notion)["日"] == 41
+    assert helper.relation_index.get(
+        helper.day_database_id, "2024年03月01日"
+    ) == helper.get_day_relation_id(dates[0])
+
+
+def test_preloading_authors_with_warm_index_reads_the_database_once(
+    notion_helper, fake_notion
+):
+    database_id = notion_helper.author_database_id
+    notion_helper.preload_relations(database_id, ["作者甲", "作者乙"], USER_ICON_URL)
+
+    helper = new_run(fake_notion)
+    names = ["作者甲"] + [f"新作者{i}" for i in range(15)]
+    helper.preload_relations(database_id, names, USER_ICON_URL)
+
+    assert fake_notion.request_count["query_database"] == 1
+    assert fake_notion.workspace.count()["作者"] == 17
+    assert helper.relation_index.get(database_id, "新作者0") is not None
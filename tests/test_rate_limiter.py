@@ -0,0 +1,110 @@
+import pytest
+
+from weread2notionpro import rate_limiter as module
+from weread2notionpro.rate_limiter import RateLimiter, TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonic返回clock[0]，time.sleep让时间前进而不真正等待"""
+    clock = [100.0]
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    monkeypatch.setattr(module.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(module.time, "sleep", sleep)
+    return clock
+
+
+def test_burst_then_waits_queue_up(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    # 后面的请求依次预定之后的令牌
+    assert [bucket.reserve() for _ in range(3)] == [0.5, 1.0, 1.5]
+
+
+def test_tokens_refill_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.reserve()
+    clock[0] += 1
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0.5]
+    clock[0] += 100
+    assert [bucket.reserve() for _ in range(4)] == [0, 0, 0, 0.5]
+
+
+def test_penalize_halves_rate_down_to_min_rate(clock):
+    bucket = TokenBucket(rate=4, capacity=5, min_rate=1.5)
+    bucket.penalize()
+    assert bucket.rate == 2
+    bucket.penalize()
+    assert bucket.rate == 1.5
+    # 没有剩余的令牌，下一个请求按降低后的速率等待
+    assert bucket.reserve() == pytest.approx(1 / 1.5)
+
+
+def test_retry_after_pauses_all_requests(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.penalize(retry_after=3)
+    clock[0] += 1
+    assert bucket.reserve() == pytest.approx(2)
+    # 更短的Retry-After不会缩短已有的暂停
+    bucket.penalize(retry_after=1)
+    assert bucket.reserve() == pytest.approx(2)
+
+
+def test_reward_recovers_rate_gradually(clock):
+    bucket = TokenBucket(rate=4, capacity=5)
+    bucket.penalize()
+    bucket.reward()
+    assert bucket.rate == pytest.approx(2.2)
+    for _ in range(100):
+        bucket.reward()
+    assert bucket.rate == 4
+
+
+def test_limiter_sleeps_and_counts_waits(clock):
+    limiter = RateLimiter(rate=1, capacity=1)
+    assert limiter.acquire("api.notion.com") == 0
+    start = clock[0]
+    assert limiter.acquire("api.notion.com") == 1
+    assert clock[0] - start == 1
+    assert (limiter.wait_count, limiter.wait_time) == (1, 1)
+
+
+def test_limiter_keeps_a_bucket_per_host(clock):
+    limiter = RateLimiter(rate=1, capacity=1)
+    limiter.acquire("a")
+    assert limiter.acquire("b") == 0
+    limiter.observe("a", 429, "5")
+    assert limiter.throttled_count == 1
+    assert limiter.get_bucket("a").rate < limiter.get_bucket("b").rate
+    assert limiter.acquire("a") == pytest.approx(5)
+    # 等待a的5秒内b又生成了令牌
+    assert limiter.acquire("b") == 0
+
+
+def test_limiter_rewards_only_successful_responses(clock):
+    limiter = RateLimiter(rate=4, capacity=1)
+    limiter.observe("a", 429)
+    rate = limiter.get_bucket("a").rate
+    limiter.observe("a", 500)
+    assert limiter.get_bucket("a").rate == rate
+    limiter.observe("a", 200)
+    assert limiter.get_bucket("a").rate > rate
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2", 2.0),
+        ("0.5", 0.5),
+        ("-1", 0.0),
+        (None, None),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", None),
+        ("", None),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from weread2notionpro import notion_helper as helper_module
+from weread2notionpro.notion_helper import USER_ICON_URL
+from weread2notionpro.relation_index import RelationIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return RelationIndex(str(tmp_path / "relations.sqlite3"))
+
+
+def test_get_and_put(index):
+    assert index.get("authors", "作者甲") is None
+    index.put("authors", "作者甲", "page-1")
+    index.put("authors", "作者甲", "page-2")
+    assert index.get("authors", "作者甲") == "page-2"
+    assert index.get("categories", "作者甲") is None
+    assert (index.hits, index.misses) == (1, 2)
+
+
+def test_index_persists_between_runs(index):
+    index.warm("authors", [("作者甲", "page-1"), ("作者乙", "page-2")])
+    index = RelationIndex(index.path)
+    assert index.is_warmed("authors")
+    assert not index.is_warmed("categories")
+    assert index.get("authors", "作者乙") == "page-2"
+    assert index.stats() == {"authors": 2}
+
+
+def test_remove_pages_removes_every_title_of_the_page(index):
+    index.put_many("authors", [("作者甲", "page-1"), ("作者乙", "page-2")])
+    index.put("categories", "别名", "page-1")
+    assert index.remove_pages(["page-1", "page-unknown"]) == 2
+    assert index.get("authors", "作者甲") is None
+    assert index.get("categories", "别名") is None
+    assert index.get("authors", "作者乙") == "page-2"
+
+
+def test_clear_one_database_or_all(index):
+    index.warm("authors", [("作者甲", "page-1")])
+    index.warm("categories", [("小说", "page-2")])
+    index.clear("authors")
+    assert index.stats() == {"categories": 1}
+    assert not index.is_warmed("authors") and index.is_warmed("categories")
+    index.clear()
+    assert index.stats() == {}
+    assert not index.is_warmed("categories")
+
+
+def test_concurrent_access(index):
+    def work(i):
+        for j in range(50):
+            index.put("authors", f"作者{i}-{j}", f"page-{i}-{j}")
+            assert index.get("authors", f"作者{i}-{j}") == f"page-{i}-{j}"
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert index.stats() == {"authors": 200}
+
+
+def test_warmed_index_avoids_queries_in_the_next_run(notion_helper, fake_notion):
+    database_id = notion_helper.author_database_id
+    page_id = notion_helper.get_relation_id("作者甲", database_id, USER_ICON_URL)
+
+    fake_notion.request_count.clear()
+    helper = helper_module.NotionHelper()
+    fake_notion.request_count.clear()
+    assert helper.get_relation_id("作者甲", database_id, USER_ICON_URL) == page_id
+    assert fake_notion.request_count["query_database"] == 0
+
+
+def test_removed_page_is_looked_up_by_title_again(notion_helper, fake_notion):
+    database_id = notion_helper.author_database_id
+    page_id = notion_helper.get_relation_id("作者乙", database_id, USER_ICON_URL)
+    notion_helper.relation_index.remove_pages([page_id])
+
+    # 下一次运行时索引中没有这个标题，按标题查询到已有的页面，不会重复创建
+    helper = helper_module.NotionHelper()
+    assert helper.get_relation_id("作者乙", database_id, USER_ICON_URL) == page_id
+    assert fake_notion.workspace.count()["作者"] == 1
+    assert helper.relation_index.get(database_id, "作者乙") == page_id
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from weread2notionpro import retry_policy as module
+from weread2notionpro.retry_policy import RetryableResponseError, RetryPolicy
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录等待的秒数而不真正等待"""
+    sleeps = []
+    monkeypatch.setattr(module.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def response_error(status, retry_after=None):
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+    return RetryableResponseError(httpx.Response(status, headers=headers))
+
+
+def failing(errors, result="ok"):
+    """依次抛出errors中的异常，之后返回result"""
+    errors = list(errors)
+    calls = []
+
+    def func():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    func.calls = calls
+    return func
+
+
+def test_retry_after_longer_than_max_delay_is_honoured(sleeps):
+    policy = RetryPolicy(max_attempts=3, base_delay=1, max_delay=30)
+    func = failing([response_error(429, retry_after=60)])
+    assert policy.call(func) == "ok"
+    assert sleeps == [60]
+
+
+def test_backoff_is_capped_by_max_delay(sleeps):
+    policy = RetryPolicy(max_attempts=6, base_delay=10, max_delay=15)
+    func = failing([response_error(503)] * 5)
+    assert policy.call(func) == "ok"
+    assert all(0 < delay <= 15 for delay in sleeps)
+
+
+def test_gives_up_when_retry_after_exceeds_ceiling(sleeps):
+    policy = RetryPolicy(max_attempts=3, max_retry_after=120)
+    error = response_error(429, retry_after=600)
+    func = failing([error])
+    with pytest.raises(RetryableResponseError) as raised:
+        policy.call(func)
+    assert raised.value is error
+    assert len(func.calls) == 1
+    assert sleeps == []
+
+
+def test_does_not_retry_client_errors(sleeps):
+    policy = RetryPolicy(max_attempts=3)
+    func = failing([ValueError("参数错误")])
+    with pytest.raises(ValueError):
+        policy.call(func)
+    assert len(func.calls) == 1
+    assert policy.retries == 0
+
+
+def test_raises_last_error_after_max_attempts(sleeps):
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    errors = [httpx.ConnectError("断开")] * 3
+    func = failing(errors)
+    with pytest.raises(httpx.ConnectError):
+        policy.call(func)
+    assert len(func.calls) == 3
+    assert policy.retries == 2
+
+
+def test_async_call_retries(monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(module.asyncio, "sleep", no_sleep)
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    errors = [response_error(502)]
+
+    async def func():
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    assert asyncio.run(policy.async_call(func)) == "ok"
+    assert policy.retries == 1
+
+
+def test_retry_count_is_exact_across_threads():
+    policy = RetryPolicy(max_attempts=10, base_delay=0)
+    error = response_error(503)
+
+    def work():
+        for _ in range(200):
+            policy.should_retry(error, 1, "test")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert policy.retries == 1600
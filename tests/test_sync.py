@@ -0,0 +1,17 @@
+import pytest
+
+from weread2notionpro.sync import fetch_api_data
+from weread2notionpro.weread_api import WeReadApi
+
+
+def test_overlap_fetch_does_not_use_shared_session(fake_weread, monkeypatch):
+    api = WeReadApi()
+    expected = api.get_api_data()["readTimes"]
+
+    def shared_session(*args, **kwargs):
+        pytest.fail("后台线程使用了主线程的session")
+
+    monkeypatch.setattr(api.session, "request", shared_session)
+    data = fetch_api_data(api)
+    assert data["readTimes"] == expected
+    assert fake_weread.request_count["/web/readdata/summary"] == 2
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from weread2notionpro.sync_state import SyncState
+
+
+@pytest.fixture
+def state(tmp_path):
+    return SyncState(str(tmp_path), enabled=True)
+
+
+def bookmark(id, text="划线"):
+    return {"bookmarkId": id, "markText": text}
+
+
+def merge(state, synckey, new_synckey, updated=None, removed=None):
+    return state.merge(
+        "bookmarks", "book", synckey, new_synckey, updated, removed, "bookmarkId"
+    )
+
+
+def test_full_fetch_replaces_cache(state):
+    merge(state, 0, 100, [bookmark("a"), bookmark("b")])
+    assert merge(state, 0, 200, [bookmark("c")]) == [bookmark("c")]
+    assert state.get_synckey("bookmarks", "book") == 200
+
+
+def test_incremental_merge_updates_and_removes(state):
+    merge(state, 0, 100, [bookmark("a"), bookmark("b"), bookmark("c")])
+    items = merge(state, 100, 101, [bookmark("b", "修改"), bookmark("d")], ["a"])
+    assert items == [bookmark("b", "修改"), bookmark("c"), bookmark("d")]
+    assert state.load("bookmarks", "book")["synckey"] == 101
+
+
+def test_removed_ids_match_regardless_of_type_or_shape(state):
+    merge(state, 0, 1, [{"bookmarkId": 1}, {"bookmarkId": 2}, {"bookmarkId": 3}])
+    items = merge(state, 1, 2, removed=["1", {"bookmarkId": 2}, "unknown"])
+    assert items == [{"bookmarkId": 3}]
+
+
+def test_removing_an_updated_id_in_the_same_response(state):
+    merge(state, 0, 1, [bookmark("a")])
+    assert merge(state, 1, 2, [bookmark("b")], ["b"]) == [bookmark("a")]
+
+
+def test_response_without_synckey_is_not_saved(state):
+    merge(state, 0, 100, [bookmark("a")])
+    assert merge(state, 100, None, [bookmark("b")]) == [bookmark("a"), bookmark("b")]
+    assert state.load("bookmarks", "book") == {
+        "synckey": 100,
+        "items": {"a": bookmark("a")},
+    }
+
+
+def test_corrupted_state_falls_back_to_full_fetch(state):
+    merge(state, 0, 100, [bookmark("a")])
+    with open(state.get_path("bookmarks", "book"), "w") as f:
+        f.write("{")
+    assert state.get_synckey("bookmarks", "book") == 0
+
+
+def test_disabled_state_always_fetches_everything(tmp_path):
+    state = SyncState(str(tmp_path), enabled=False)
+    merge(state, 0, 100, [bookmark("a")])
+    assert state.get_synckey("bookmarks", "book") == 0
+    assert not (tmp_path / "synckey").exists()
+
+
+def test_merge_dict(state):
+    merge_dict = state.merge_dict
+    assert merge_dict("history", "summary", 0, 1, {1: 60, 2: 30}) == {"1": 60, "2": 30}
+    assert merge_dict("history", "summary", 1, 2, {"2": 90, 3: 10}) == {
+        "1": 60,
+        "2": 90,
+        "3": 10,
+    }
+    with open(state.get_path("history", "summary"), encoding="utf-8") as f:
+        assert json.load(f)["synckey"] == 2
@@ -0,0 +1,80 @@
+import copy
+
+import pytest
+
+from weread2notionpro import context, weread
+from weread2notionpro.utils import get_number, get_relation, get_rich_text, get_title
+
+
+def create_row(helper, database_id, book_page_id, key, value, blockId):
+    properties = {
+        "Name": get_title(str(value)),
+        key: get_number(value) if key == "chapterUid" else get_rich_text(value),
+        "blockId": get_rich_text(blockId) if blockId else {"rich_text": []},
+        "书籍": get_relation([book_page_id]),
+    }
+    helper.client.pages.create(
+        parent={"database_id": database_id}, properties=properties
+    )
+
+
+@pytest.fixture
+def notes(notion_helper, monkeypatch):
+    """一本书在Notion中已有的划线、笔记和章节，包括没有blockId的记录和另一本书的记录"""
+    monkeypatch.setattr(
+        context, "sync_context", context.SyncContext(notion_helper=notion_helper)
+    )
+    books = notion_helper.book_database_id
+    page_id, other_id = (
+        notion_helper.client.pages.create(
+            parent={"database_id": books}, properties={"书名": get_title(name)}
+        )["id"]
+        for name in ("书", "另一本书")
+    )
+    for database_id, key, values in (
+        (notion_helper.bookmark_database_id, "bookmarkId", ["m1", "m2", "m3"]),
+        (notion_helper.review_database_id, "reviewId", ["r1", "r2"]),
+        (notion_helper.chapter_database_id, "chapterUid", [1, 2, 3]),
+    ):
+        for value in values:
+            create_row(notion_helper, database_id, page_id, key, value, f"b-{value}")
+        create_row(notion_helper, database_id, page_id, key, values[0], None)
+        create_row(notion_helper, database_id, other_id, key, values[0], "b-other")
+    return page_id
+
+
+def sync_notes(page_id, monkeypatch):
+    """按当前模式比较一本书的数据，返回结果和要删除的block"""
+    deleted = []
+    monkeypatch.setattr(weread.notion_helper, "delete_block", deleted.append)
+    bookmarks = [
+        {"bookmarkId": "m1", "chapterUid": 1, "range": "0-5"},
+        {"bookmarkId": "m2", "chapterUid": 2, "range": "3-9"},
+        {"bookmarkId": "m4", "chapterUid": 2, "range": "1-2"},
+    ]
+    reviews = [{"reviewId": "r1", "chapterUid": 1, "range": "1-3"}]
+    chapters = {1: {"chapterUid": 1}, 2: {"chapterUid": 2}, 4: {"chapterUid": 4}}
+    bookmarks = weread.get_bookmark_list(page_id, "1", copy.deepcopy(bookmarks))
+    reviews = weread.get_review_list(page_id, "1", copy.deepcopy(reviews))
+    notes = weread.sort_notes(page_id, copy.deepcopy(chapters), bookmarks + reviews)
+    return notes, sorted(deleted, key=str)
+
+
+def test_per_book_and_index_modes_give_same_result(notes, monkeypatch):
+    monkeypatch.setattr(weread, "note_index", {})
+    per_book = sync_notes(notes, monkeypatch)
+    weread.load_note_index()
+    assert weread.note_index
+    assert sync_notes(notes, monkeypatch) == per_book
+
+    notes, deleted = per_book
+    assert [x.get("blockId") for x in notes] == [
+        "b-1",
+        "b-m1",
+        "b-r1",
+        "b-2",
+        None,
+        "b-m2",
+    ]
+    assert "b-m3" in deleted and "b-3" in deleted
+    assert "b-other" not in deleted
@@ -0,0 +1,105 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from weread2notionpro.weread_api import WeReadApi
+
+
+class ChunkedHandler(BaseHTTPRequestHandler):
+    """依次返回server.bodies中的内容，使用分块传输，没有Content-Length
+
+    内容为(状态码, 内容)时使用指定的状态码。
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.server.bodies.pop(0)
+        status, body = body if isinstance(body, tuple) else (200, body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(body), 7):
+            chunk = body[i : i + 7]
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def chunked_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChunkedHandler)
+    server.bodies = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False).encode()
+
+
+def test_chunked_login_timeout_is_detected_and_retried(fake_weread, chunked_server):
+    books = [{"bookId": str(i), "title": f"书{i}"} for i in range(50)]
+    chunked_server.bodies = [
+        dumps({"errCode": -2012, "errMsg": "登录超时"}),
+        dumps({"books": books, "synckey": 1}),
+    ]
+    api = WeReadApi()
+    url = f"http://127.0.0.1:{chunked_server.server_port}/web/shelf/sync"
+    fields = {}
+
+    assert list(api.stream_json_array(url, "books", fields)) == books
+    assert fields == {"synckey": 1}
+    assert chunked_server.bodies == []
+
+
+def test_peeked_stream_is_read_from_the_start(fake_weread, chunked_server):
+    books = [{"bookId": str(i), "intro": "简介" * 200} for i in range(10)]
+    body = dumps({"books": books})
+    chunked_server.bodies = [body]
+    api = WeReadApi()
+    url = f"http://127.0.0.1:{chunked_server.server_port}/"
+
+    with api.session.get(url, stream=True) as r:
+        assert not api.is_login_timeout(r, stream=True)
+        assert b"".join(api.iter_stream(r)) == body
+
+
+def test_retried_stream_responses_release_their_connection(
+    fake_weread, chunked_server, monkeypatch
+):
+    error = dumps({"errCode": -1, "errMsg": "服务器错误"})
+    books = [{"bookId": "1"}]
+    chunked_server.bodies = [(503, error), (502, error), dumps({"books": books})]
+    api = WeReadApi()
+    api.warm_up()
+    responses = []
+    request = api.session.request
+
+    def record(*args, **kwargs):
+        responses.append(request(*args, **kwargs))
+        return responses[-1]
+
+    monkeypatch.setattr(api.session, "request", record)
+    url = f"http://127.0.0.1:{chunked_server.server_port}/web/shelf/sync"
+    assert list(api.stream_json_array(url, "books", {})) == books
+    assert [r.status_code for r in responses] == [503, 502, 200]
+    assert all(r.raw.closed for r in responses[:2])
+
+
+def test_stream_error_body_is_readable_after_retries(fake_weread, chunked_server):
+    error = dumps({"errcode": -1, "errMsg": "服务器错误"})
+    chunked_server.bodies = [(503, error)] * 5
+    api = WeReadApi()
+    url = f"http://127.0.0.1:{chunked_server.server_port}/web/shelf/sync"
+    r = api.send_with_retry("GET", url, stream=True)
+    assert r.status_code == 503
+    assert b"".join(api.iter_stream(r)) == error
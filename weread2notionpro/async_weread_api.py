@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import httpx
+from requests.utils import dict_from_cookiejar
+
+from weread2notionpro.cassette import AsyncCassetteTransport, cassette
+from weread2notionpro.metrics import (
+    metrics,
+    request_key,
+    response_size,
+    weread_endpoint,
+)
+from weread2notionpro.retry_policy import (
+    RETRYABLE_STATUS,
+    RetryableResponseError,
+    retry_policy,
+)
+from weread2notionpro.tracing import tracer
+from weread2notionpro.weread_api import (
+    WEREAD_BOOK_INFO,
+    WEREAD_BOOKMARKLIST_URL,
+    WEREAD_CHAPTER_BATCH_SIZE,
+    WEREAD_CHAPTER_INFO,
+    WEREAD_HISTORY_URL,
+    WEREAD_NOTEBOOKS_URL,
+    WEREAD_POOL_SIZE,
+    WEREAD_READ_INFO_URL,
+    WEREAD_REVIEW_LIST_URL,
+    WEREAD_SHELF_SYNC_URL,
+    WEREAD_TIMEOUT,
+    WEREAD_URL,
+    WeReadApi,
+)
+
+logger = logging.getLogger(__name__)
+
+# 同时进行中的请求数
+WEREAD_CONCURRENCY = int(os.getenv("WEREAD_CONCURRENCY") or 8)
+# 每个域名每秒最多发起的请求数
+WEREAD_RATE_LIMIT = float(os.getenv("WEREAD_RATE_LIMIT") or 10)
+
+
+class AsyncRateLimiter:
+    """按域名限制请求速率，每个域名的请求之间至少间隔 1/rate 秒"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate and rate > 0 else 0
+        self.next_time = {}
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        async with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time.get(host, now))
+            self.next_time[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class AsyncWeReadApi:
+    """WeReadApi的异步版本，方法与WeReadApi一致，用于并发获取大量书籍的数据
+
+    Cookie和响应的格式转换都复用传入的WeReadApi，避免重复获取Cookie。
+    """
+
+    def __init__(self, weread_api=None, concurrency=None, rate_limit=None):
+        self.api = weread_api or WeReadApi()
+        self.concurrency = concurrency or WEREAD_CONCURRENCY
+        self.rate_limit = rate_limit if rate_limit is not None else WEREAD_RATE_LIMIT
+        self.client = None
+        self.semaphore = None
+        self.limiter = None
+        self.refresh_lock = None
+        self.cookie_version = 0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """在当前事件循环中创建连接池"""
+        if self.client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=max(self.concurrency, WEREAD_POOL_SIZE),
+            max_keepalive_connections=max(self.concurrency, WEREAD_POOL_SIZE),
+        )
+        connect_timeout, read_timeout = WEREAD_TIMEOUT
+        transport = httpx.AsyncHTTPTransport(limits=limits)
+        if cassette:
+            transport = AsyncCassetteTransport(cassette, transport)
+        self.client = httpx.AsyncClient(
+            headers=dict(self.api.session.headers),
+            cookies=dict_from_cookiejar(self.api.session.cookies),
+            transport=transport,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.limiter = AsyncRateLimiter(self.rate_limit)
+        self.refresh_lock = asyncio.Lock()
+        if not self.api.warmed_up:
+            await self.request("GET", WEREAD_URL, parse=False)
+            self.api.warmed_up = True
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def request(self, method, url, parse=True, **kwargs):
+        """发起请求并返回json，遇到登录超时刷新Cookie后重试一次"""
+        if self.client is None:
+            await self.open()
+        refresher = self.api.cookie_refresher
+        for attempt in range(2):
+            if refresher.max_age and refresher.age() > refresher.max_age:
+                await asyncio.to_thread(refresher.ensure_fresh)
+            self.sync_cookies()
+            version = refresher.version
+            try:
+                r = await retry_policy.async_call(self.send, method, url, **kwargs)
+            except RetryableResponseError as e:
+                r = e.response
+            if not parse:
+                return r
+            if r.status_code != 200:
+                logger.error(f"异步请求失败: {url} {r.status_code} - {r.text}")
+                self.api.handle_errcode(r.json().get("errcode", 0) if r.text else 0)
+                return None
+            data = r.json()
+            errcode = data.get("errCode")
+            if not errcode:
+                return data
+            if errcode == -2012 and attempt == 0 and await self.refresh_cookie(version):
+                continue
+            logger.warning(
+                f"异步请求 {url} 返回错误: {data.get('errMsg', '未知错误')} (错误码: {errcode})"
+            )
+            self.api.handle_errcode(errcode)
+            return None
+        return None
+
+    async def send(self, method, url, **kwargs):
+        async with self.semaphore:
+            await self.limiter.acquire(url)
+            self.api.request_count["api"] += 1
+            endpoint = weread_endpoint(url)
+            key = request_key(method, url, kwargs.get("params"), kwargs.get("json"))
+            start = time.perf_counter()
+            try:
+                r = await self.client.request(method, url, **kwargs)
+            except Exception:
+                metrics.observe(
+                    "weread", endpoint, key, time.perf_counter() - start, error=True
+                )
+                raise
+            elapsed = time.perf_counter() - start
+            metrics.observe(
+                "weread", endpoint, key, elapsed, response_size(r), r.status_code >= 400
+            )
+            tracer.complete_async(
+                f"weread {endpoint}", "weread", start, elapsed, status=r.status_code
+            )
+        if r.status_code in RETRYABLE_STATUS:
+            raise RetryableResponseError(r)
+        return r
+
+    async def refresh_cookie(self, version):
+        """由WeReadApi的CookieRefresher统一刷新，多个请求同时超时只会刷新一次"""
+        async with self.refresh_lock:
+            success = await asyncio.to_thread(
+                self.api.cookie_refresher.refresh, version
+            )
+            self.sync_cookies()
+            return success
+
+    def sync_cookies(self):
+        """Cookie被刷新过时同步到httpx的client中"""
+        if self.cookie_version != self.api.cookie_refresher.version:
+            self.client.cookies.update(dict_from_cookiejar(self.api.session.cookies))
+            self.cookie_version = self.api.cookie_refresher.version
+
+    async def get_bookshelf(self):
+        """获取书架信息，格式同WeReadApi.get_bookshelf"""
+        data = await self.request("GET", WEREAD_SHELF_SYNC_URL)
+        if not data:
+            return {"books": []}
+        books = data.get("books", [])
+        if not books and isinstance(data.get("info"), dict):
+            books = data.get("info").get("books", [])
+        return self.api.make_shelf(books, data)
+
+    async def get_notebooklist(self):
+        """获取笔记本列表"""
+        data = await self.request("GET", WEREAD_NOTEBOOKS_URL)
+        books = data.get("books") if data else None
+        if not books:
+            return []
+        books.sort(key=lambda x: x["sort"])
+        return self.api.format_notebooks(books)
+
+    async def get_bookinfo(self, bookId):
+        """获取书的详情，优先使用本地缓存"""
+        book_info = self.api.book_info_cache.get(bookId)
+        if book_info:
+            return book_info
+        data = await self.request("GET", WEREAD_BOOK_INFO, params=dict(bookId=bookId))
+        self.api.book_info_cache.put(bookId, data)
+        return data
+
+    async def get_bookmark_list(self, bookId):
+        synckey = self.api.sync_state.get_synckey("bookmarks", bookId)
+        params = dict(bookId=bookId)
+        if synckey:
+            params["synckey"] = synckey
+        data = await self.request("GET", WEREAD_BOOKMARKLIST_URL, params=params)
+        return self.api.merge_bookmarks(bookId, synckey, data) if data else []
+
+    async def get_read_info(self, bookId):
+        data = await self.request(
+            "GET", WEREAD_READ_INFO_URL, params=dict(bookId=bookId)
+        )
+        return self.api.parse_read_info(bookId, data) if data else None
+
+    async def get_review_list(self, bookId):
+        synckey = self.api.sync_state.get_synckey("reviews", bookId)
+        params = dict(bookId=bookId, listType=11, mine=1, synckey=synckey)
+        data = await self.request("GET", WEREAD_REVIEW_LIST_URL, params=params)
+        return self.api.merge_reviews(bookId, synckey, data) if data else []
+
+    async def get_api_data(self):
+        synckey = self.api.sync_state.get_synckey("history", "summary")
+        params = dict(synckey=synckey)
+        data = await self.request("GET", WEREAD_HISTORY_URL, params=params)
+        return self.api.merge_read_times(synckey, data) if data else None
+
+    async def get_chapter_info(self, bookId):
+        return (await self.get_chapter_infos([bookId])).get(bookId)
+
+    async def get_chapter_infos(self, bookIds, chunk_size=None):
+        """批量获取章节信息，各批次并发请求"""
+        chunk_size = chunk_size or WEREAD_CHAPTER_BATCH_SIZE
+        chunks = [
+            bookIds[i : i + chunk_size] for i in range(0, len(bookIds), chunk_size)
+        ]
+        synckeys = {x: self.api.sync_state.get_synckey("chapters", x) for x in bookIds}
+        responses = await asyncio.gather(
+            *[
+                self.request(
+                    "POST",
+                    WEREAD_CHAPTER_INFO,
+                    json={
+                        "bookIds": chunk,
+                        "synckeys": [synckeys.get(x) for x in chunk],
+                        "teenmode": 0,
+                    },
+                )
+                for chunk in chunks
+            ]
+        )
+        result = {}
+        for data in responses:
+            if data:
+                result.update(self.api.parse_chapter_infos(data, synckeys))
+        return result
+
+    def get_url(self, book_id):
+        return self.api.get_url(book_id)
+
+
+class BookPrefetcher:
+    """在后台线程的事件循环中提前并发获取书籍数据，主线程按顺序消费结果
+
+    fetch是一个接收AsyncWeReadApi和bookId的协程函数，最多提前ahead本书，
+    避免书很多的时候所有结果都堆积在内存里。
+    """
+
+    def __init__(self, async_api, fetch, ahead=None):
+        self.async_api = async_api
+        self.fetch = fetch
+        self.ahead = ahead or async_api.concurrency * 4
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.async_api.open(), self.loop).result()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        asyncio.run_coroutine_threadsafe(self.async_api.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def submit(self, bookId):
+        return asyncio.run_coroutine_threadsafe(
+            self.fetch(self.async_api, bookId), self.loop
+        )
+
+    def iter_results(self, bookIds):
+        """按bookIds的顺序返回(bookId, 结果)，获取失败的结果为None"""
+        pending = deque()
+        bookIds = iter(bookIds)
+        for bookId in bookIds:
+            pending.append((bookId, self.submit(bookId)))
+            if len(pending) >= self.ahead:
+                break
+        while pending:
+            bookId, future = pending.popleft()
+            next_bookId = next(bookIds, None)
+            if next_bookId is not None:
+                pending.append((next_bookId, self.submit(next_bookId)))
+            try:
+                yield bookId, future.result()
+            except Exception as e:
+                logger.error(f"并发获取书籍 {bookId} 的数据失败: {str(e)}")
+                yield bookId, None
+
+
+def prefetch_books(weread_api, bookIds, fetch):
+    """并发预取每本书的数据，按顺序返回(bookId, 结果)
+
+    WEREAD_CONCURRENCY为1时不预取，结果均为None，由调用方逐本同步获取。
+    """
+    if WEREAD_CONCURRENCY <= 1:
+        for bookId in bookIds:
+            yield bookId, None
+        return
+    with BookPrefetcher(AsyncWeReadApi(weread_api), fetch) as prefetcher:
+        yield from prefetcher.iter_results(bookIds)
@@ -1,11 +1,16 @@
+import itertools
 import logging
+import os
 
 import pendulum
 
 from weread2notionpro import utils
+from weread2notionpro.async_weread_api import prefetch_books
 from weread2notionpro.config import book_properties_type_dict, tz
-from weread2notionpro.notion_helper import NotionHelper
-from weread2notionpro.weread_api import WeReadApi
+from weread2notionpro.context import ClientProxy, get_context
+from weread2notionpro.log_config import preview, setup_logging
+from weread2notionpro.profiling import profiled
+from weread2notionpro.tracing import tracer
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
@@ -14,10 +19,49 @@ TAG_ICON_URL = "https://www.notion.so/icons/tag_gray.svg"
 USER_ICON_URL = "https://www.notion.so/icons/user-circle-filled_gray.svg"
 BOOK_ICON_URL = "https://www.notion.so/icons/book_gray.svg"
 rating = {"poor": "⭐️", "fair": "⭐️⭐️⭐️", "good": "⭐️⭐️⭐️⭐️⭐️"}
+# insert_book_to_notion中用到的书架字段，流式解析书架时只保留这些
+SHELF_BOOK_FIELDS = (
+    "bookId",
+    "title",
+    "author",
+    "cover",
+    "categories",
+    "intro",
+    "isbn",
+    "price",
+    "publishTime",
+    "translator",
+)
+# 每批书先一起解析日期关联再逐本写入，批次越大预先解析的效果越好，占用的内存也越多
+BOOK_BATCH_SIZE = int(os.getenv("BOOK_BATCH_SIZE") or 50)
+
+
+def get_book_time(book):
+    """书籍的时间字段，优先级：完成时间 > 最后阅读时间 > 更新时间 > 开始阅读时间
+
+    确保传递给Notion的是时间戳数字格式，而不是日期字符串，没有时返回None。
+    """
+    time_value = (
+        book.get("finishedDate")
+        or book.get("lastReadingDate")
+        or book.get("updateTime")
+        or book.get("startReadingTime")
+        or book.get("readingBookDate")
+    )
+    if time_value and isinstance(time_value, (int, float)) and time_value > 0:
+        return time_value
+    return None
+
+
+def get_book_date(book):
+    time_value = get_book_time(book)
+    if time_value:
+        return pendulum.from_timestamp(time_value, tz="Asia/Shanghai")
+    return None
 
 
-def insert_book_to_notion(books, index, bookId, all_books_dict=None):
-    """插入Book到Notion"""
+def insert_book_to_notion(books, index, bookId, all_books_dict=None, readInfo=None):
+    """插入Book到Notion，readInfo为预先并发获取的阅读信息"""
     book = {}
     if bookId in archive_dict:
         book["书架分类"] = archive_dict.get(bookId)
@@ -76,10 +120,12 @@ def insert_book_to_notion(books, index, bookId, all_books_dict=None):
     book_title = book.get("title", "未知书名")
     logger.info(f"   开始获取书籍《{book_title}》的阅读信息 (bookId: {bookId})")
 
-    readInfo = weread_api.get_read_info(bookId)
+    if readInfo is None:
+        with tracer.span("获取阅读信息", cat="book"):
+            readInfo = weread_api.get_read_info(bookId)
     if readInfo != None:
         logger.info(f"   成功获取阅读信息 (bookId: {bookId})")
-        logger.debug(f"   阅读信息原始数据键: {list(readInfo.keys())}")
+        logger.debug("   阅读信息原始数据键: %s", list(readInfo))
 
         # 研究了下这个状态不知道什么情况有的虽然读了状态还是1 markedStatus = 1 想读 4 读完 其他为在读
         readInfo.update(readInfo.get("readDetail", {}))
@@ -88,9 +134,8 @@ def insert_book_to_notion(books, index, bookId, all_books_dict=None):
 
         # 更新后重新获取书籍标题，因为阅读信息可能包含更准确的书籍信息
         updated_book_title = book.get("title", "未知书名")
-        logger.info(
-            f"   书籍《{updated_book_title}》阅读信息合并完成，当前book数据键: {list(book.keys())}"
-        )
+        logger.info(f"   书籍《{updated_book_title}》阅读信息合并完成")
+        logger.debug("   当前book数据键: %s", list(book))
     else:
         logger.warning(f"   警告：无法获取阅读信息 (bookId: {bookId})")
     book["阅读进度"] = (
@@ -131,52 +176,48 @@ def insert_book_to_notion(books, index, bookId, all_books_dict=None):
                 pass
         return None
 
-    # 记录原始时间戳用于调试
-    logger.info(f"   书籍《{book_title}》的时间戳字段处理:")
-    logger.info(f"     原始时间戳 - startReadingTime: {book.get('startReadingTime')}")
-    logger.info(f"     原始时间戳 - updateTime: {book.get('updateTime')}")
-    logger.info(f"     原始时间戳 - finishedDate: {book.get('finishedDate')}")
-    logger.info(f"     原始时间戳 - lastReadingDate: {book.get('lastReadingDate')}")
-    logger.info(f"     原始时间戳 - readingBookDate: {book.get('readingBookDate')}")
-    logger.info(f"     原始时间戳 - beginReadingDate: {book.get('beginReadingDate')}")
-
-    # 获取各种时间戳并转换为日期格式
-    start_reading_time = convert_timestamp_to_date(book.get("startReadingTime"))
-    update_time = convert_timestamp_to_date(book.get("updateTime"))
-    finished_date = convert_timestamp_to_date(book.get("finishedDate"))
-    last_reading_date = convert_timestamp_to_date(book.get("lastReadingDate"))
-    reading_book_date = convert_timestamp_to_date(book.get("readingBookDate"))
-
-    # 记录转换后的日期
-    logger.info(f"     转换后日期 - startReadingTime: {start_reading_time}")
-    logger.info(f"     转换后日期 - updateTime: {update_time}")
-    logger.info(f"     转换后日期 - finishedDate: {finished_date}")
-    logger.info(f"     转换后日期 - lastReadingDate: {last_reading_date}")
-    logger.info(f"     转换后日期 - readingBookDate: {reading_book_date}")
-    begin_reading_date = convert_timestamp_to_date(book.get("beginReadingDate"))
-
-    # 记录转换后的日期
-    logger.info("转换后的日期字段:")
-    logger.info(f"  开始阅读时间: {start_reading_time}")
-    logger.info(f"  更新时间: {update_time}")
-    logger.info(f"  完成时间: {finished_date}")
-    logger.info(f"  最后阅读时间: {last_reading_date}")
-
-    # 设置时间字段 - 优先级：完成时间 > 最后阅读时间 > 更新时间 > 开始阅读时间
-    # 确保传递给Notion的是时间戳数字格式，而不是日期字符串
-    time_value = (
-        book.get("finishedDate")
-        or book.get("lastReadingDate")
-        or book.get("updateTime")
-        or book.get("startReadingTime")
-        or book.get("readingBookDate")
-    )
+    # 时间戳转换只用于调试日志，没有开启DEBUG时跳过
+    if logger.isEnabledFor(logging.DEBUG):
+        # 记录原始时间戳用于调试
+        logger.debug("   书籍《%s》的时间戳字段处理:", book_title)
+        logger.debug(
+            "     原始时间戳 - startReadingTime: %s", book.get("startReadingTime")
+        )
+        logger.debug("     原始时间戳 - updateTime: %s", book.get("updateTime"))
+        logger.debug("     原始时间戳 - finishedDate: %s", book.get("finishedDate"))
+        logger.debug(
+            "     原始时间戳 - lastReadingDate: %s", book.get("lastReadingDate")
+        )
+        logger.debug(
+            "     原始时间戳 - readingBookDate: %s", book.get("readingBookDate")
+        )
+        logger.debug(
+            "     原始时间戳 - beginReadingDate: %s", book.get("beginReadingDate")
+        )
 
-    # 确保时间值是数字类型
-    if time_value and isinstance(time_value, (int, float)) and time_value > 0:
-        book["时间"] = time_value
-    else:
-        book["时间"] = None
+        # 获取各种时间戳并转换为日期格式
+        start_reading_time = convert_timestamp_to_date(book.get("startReadingTime"))
+        update_time = convert_timestamp_to_date(book.get("updateTime"))
+        finished_date = convert_timestamp_to_date(book.get("finishedDate"))
+        last_reading_date = convert_timestamp_to_date(book.get("lastReadingDate"))
+        reading_book_date = convert_timestamp_to_date(book.get("readingBookDate"))
+
+        # 记录转换后的日期
+        logger.debug("     转换后日期 - startReadingTime: %s", start_reading_time)
+        logger.debug("     转换后日期 - updateTime: %s", update_time)
+        logger.debug("     转换后日期 - finishedDate: %s", finished_date)
+        logger.debug("     转换后日期 - lastReadingDate: %s", last_reading_date)
+        logger.debug("     转换后日期 - readingBookDate: %s", reading_book_date)
+        begin_reading_date = convert_timestamp_to_date(book.get("beginReadingDate"))
+
+        # 记录转换后的日期
+        logger.debug("转换后的日期字段:")
+        logger.debug("  开始阅读时间: %s", start_reading_time)
+        logger.debug("  更新时间: %s", update_time)
+        logger.debug("  完成时间: %s", finished_date)
+        logger.debug("  最后阅读时间: %s", last_reading_date)
+
+    book["时间"] = get_book_time(book)
 
     # 设置开始阅读时间和最后阅读时间 - 确保传递数字格式
     start_time_value = book.get("startReadingTime") or book.get("beginReadingDate")
@@ -208,73 +249,71 @@ def insert_book_to_notion(books, index, bookId, all_books_dict=None):
         or not cover.startswith("http")
     ):
         cover = BOOK_ICON_URL
-    if bookId not in notion_books:
-        book["书名"] = book.get("title")
-        book["BookId"] = book.get("bookId")
-        book["ISBN"] = book.get("isbn")
-        book["链接"] = weread_api.get_url(bookId)
-        book["简介"] = book.get("intro")
-        author = book.get("author")
-        if author and isinstance(author, str):
-            book["作者"] = [
-                notion_helper.get_relation_id(
-                    x, notion_helper.author_database_id, USER_ICON_URL
-                )
-                for x in author.split(" ")
-                if x.strip()
-            ]
-        else:
-            book["作者"] = []
-        if book.get("categories"):
-            book["分类"] = [
-                notion_helper.get_relation_id(
-                    x.get("title"), notion_helper.category_database_id, TAG_ICON_URL
-                )
-                for x in book.get("categories")
-            ]
+    with tracer.span("解析关联", cat="book"):
+        if bookId not in notion_books:
+            book["书名"] = book.get("title")
+            book["BookId"] = book.get("bookId")
+            book["ISBN"] = book.get("isbn")
+            book["链接"] = weread_api.get_url(bookId)
+            book["简介"] = book.get("intro")
+            author = book.get("author")
+            if author and isinstance(author, str):
+                book["作者"] = [
+                    notion_helper.get_relation_id(
+                        x, notion_helper.author_database_id, USER_ICON_URL
+                    )
+                    for x in author.split(" ")
+                    if x.strip()
+                ]
+            else:
+                book["作者"] = []
+            if book.get("categories"):
+                book["分类"] = [
+                    notion_helper.get_relation_id(
+                        x.get("title"), notion_helper.category_database_id, TAG_ICON_URL
+                    )
+                    for x in book.get("categories")
+                ]
     properties = utils.get_properties(book, book_properties_type_dict)
-    if (
-        book.get("时间")
-        and isinstance(book.get("时间"), (int, float))
-        and book.get("时间") > 0
-    ):
-        notion_helper.get_date_relation(
-            properties,
-            pendulum.from_timestamp(book.get("时间"), tz="Asia/Shanghai"),
-        )
+    if book.get("时间"):
+        with tracer.span("解析日期关联", cat="book"):
+            notion_helper.get_date_relation(properties, get_book_date(book))
 
     logger.info(
         f"正在插入《{book.get('title')}》,一共{len(books)}本，当前是第{index + 1}本。"
     )
-    logger.info(f"传入Notion的完整参数 - properties: {properties}")
-    logger.info(f"传入Notion的完整参数 - cover/icon: {utils.get_icon(cover)}")
+    logger.debug("传入Notion的参数 - properties: %s", preview(properties))
+    logger.debug("传入Notion的参数 - cover: %s", cover)
 
     parent = {"database_id": notion_helper.book_database_id, "type": "database_id"}
     result = None
     try:
-        if bookId in notion_books:
-            logger.info(
-                f"更新现有页面 - page_id: {notion_books.get(bookId).get('pageId')}"
-            )
-            result = notion_helper.update_page(
-                page_id=notion_books.get(bookId).get("pageId"),
-                properties=properties,
-                cover=utils.get_icon(cover),
-            )
-        else:
-            logger.info(f"创建新页面 - parent: {parent}")
-            result = notion_helper.create_book_page(
-                parent=parent,
-                properties=properties,
-                icon=utils.get_icon(cover),
-            )
+        with tracer.span("写入页面", cat="book"):
+            if bookId in notion_books:
+                logger.info(
+                    f"更新现有页面 - page_id: {notion_books.get(bookId).get('pageId')}"
+                )
+                result = notion_helper.update_page(
+                    page_id=notion_books.get(bookId).get("pageId"),
+                    properties=properties,
+                    cover=utils.get_icon(cover),
+                )
+            else:
+                logger.info(f"创建新页面 - parent: {parent}")
+                result = notion_helper.create_book_page(
+                    parent=parent,
+                    properties=properties,
+                    icon=utils.get_icon(cover),
+                )
 
         if not result or not result.get("id"):
             logger.error("   错误：Notion API返回结果无效，无法获取页面ID")
             raise Exception("Notion API返回结果无效，无法获取页面ID")
 
         page_id = result.get("id")
-        logger.info(f"   成功创建/更新Notion页面，page_id: {page_id}")
+        # 新建的页面加入共用的书籍列表，同一进程内之后的笔记同步可以直接使用
+        notion_books.setdefault(bookId, {"pageId": page_id})
+        logger.debug("   成功创建/更新Notion页面，page_id: %s", page_id)
 
         # 插入阅读数据
         if book.get("readDetail") and book.get("readDetail").get("data"):
@@ -282,7 +321,8 @@ def insert_book_to_notion(books, index, bookId, all_books_dict=None):
                 data = book.get("readDetail").get("data")
                 data = {item.get("readDate"): item.get("readTime") for item in data}
                 logger.info(f"   开始插入阅读数据，共{len(data)}条记录")
-                insert_read_data(page_id, data)
+                with tracer.span("写入阅读数据", cat="book", records=len(data)):
+                    insert_read_data(page_id, data)
                 logger.info("   阅读数据插入完成")
             except Exception as e:
                 logger.error(f"   插入阅读数据失败: {str(e)}")
@@ -302,7 +342,7 @@ def insert_book_to_notion(books, index, bookId, all_books_dict=None):
 
 def insert_read_data(page_id, readTimes):
     try:
-        logger.info(f"     开始处理阅读数据，page_id: {page_id}")
+        logger.debug("     开始处理阅读数据，page_id: %s", page_id)
         readTimes = dict(sorted(readTimes.items()))
         filter = {"property": "书架", "relation": {"contains": page_id}}
 
@@ -412,36 +452,91 @@ def insert_to_notion(page_id, timestamp, duration, book_database_id):
         raise Exception(f"处理阅读记录失败: {str(e)}") from e
 
 
-weread_api = WeReadApi()
-notion_helper = NotionHelper()
-archive_dict = {}
-notion_books = {}
+async def fetch_read_info(async_api, bookId):
+    return await async_api.get_read_info(bookId)
 
 
-def main():
-    global notion_books
-    global archive_dict
-    # 在main函数中初始化API对象
+def preload_book_relations(books, all_books_dict):
+    """一次性解析所有新书的作者和分类，写入时直接从缓存中取得页面id
 
-    try:
-        logger.info("开始同步微信读书数据到Notion...")
+    和insert_book_to_notion一样只处理Notion中还没有的书，名字来自书架数据，
+    阅读信息中的名字如果不同，写入时仍会逐个解析。
+    """
+    authors = set()
+    categories = set()
+    for bookId in books:
+        shelf_book = all_books_dict.get(bookId)
+        if bookId in notion_books or not shelf_book:
+            continue
+        author = shelf_book.get("author")
+        if author and isinstance(author, str):
+            authors.update(x for x in author.split(" ") if x.strip())
+        categories.update(x.get("title") for x in shelf_book.get("categories") or [])
+    logger.info(f"   预先解析 {len(authors)} 个作者和 {len(categories)} 个分类")
+    notion_helper.preload_relations(
+        notion_helper.author_database_id, authors, USER_ICON_URL
+    )
+    notion_helper.preload_relations(
+        notion_helper.category_database_id, categories, TAG_ICON_URL
+    )
 
-        logger.info("1. 获取微信读书所有书籍信息（使用书架API）...")
-        bookshelf_data = weread_api.get_bookshelf()
-        if not bookshelf_data or not bookshelf_data.get("books"):
-            logger.error("错误：无法获取微信读书书架信息")
-            return
-        all_books = bookshelf_data.get("books", [])
-        logger.info(f"   获取到书架信息，包含 {len(all_books)} 本书")
 
-        logger.info("2. 处理完整的书架数据...")
-        # 使用真实的书架数据
-        bookshelf_books = bookshelf_data
+def preload_book_dates(read_infos):
+    """一次性解析一批书的年、月、周、日页面，时间和写入时一样从阅读信息中取得"""
+    dates = []
+    for readInfo in read_infos:
+        if readInfo is None:
+            continue
+        book = {**readInfo, **readInfo.get("readDetail", {})}
+        book.update(readInfo.get("bookInfo", {}))
+        date = get_book_date(book)
+        if date:
+            dates.append(date)
+    notion_helper.preload_dates(dates)
 
-        logger.info("3. 获取Notion中的书籍信息...")
-        notion_books = notion_helper.get_all_book()
-        logger.info(f"   Notion中已有 {len(notion_books)} 本书")
 
+# 客户端在第一次使用时才创建，导入模块时不会发出任何请求
+weread_api = ClientProxy("weread_api")
+notion_helper = ClientProxy("notion_helper")
+archive_dict = {}
+notion_books = {}
+
+
+@profiled("book")
+def main():
+    setup_logging()
+    with tracer.span("book", cat="run"):
+        try:
+            sync_books()
+        except Exception as e:
+            logger.error(f"同步过程中发生错误: {str(e)}")
+            raise
+
+
+def sync_books():
+    global notion_books
+    global archive_dict
+    logger.info("开始同步微信读书数据到Notion...")
+
+    logger.info("1. 获取微信读书所有书籍信息（使用书架API）...")
+    with tracer.span("1. 获取书架", cat="stage"):
+        bookshelf_data = weread_api.get_bookshelf(SHELF_BOOK_FIELDS)
+    if not bookshelf_data or not bookshelf_data.get("books"):
+        logger.error("错误：无法获取微信读书书架信息")
+        return
+    all_books = bookshelf_data.get("books", [])
+    logger.info(f"   获取到书架信息，包含 {len(all_books)} 本书")
+
+    logger.info("2. 处理完整的书架数据...")
+    # 使用真实的书架数据
+    bookshelf_books = bookshelf_data
+
+    logger.info("3. 获取Notion中的书籍信息...")
+    with tracer.span("3. 获取Notion中的书籍", cat="stage"):
+        notion_books = get_context().notion_books
+    logger.info(f"   Notion中已有 {len(notion_books)} 本书")
+
+    with tracer.span("4-7. 分析需要同步的书籍", cat="stage"):
         logger.info("4. 处理书籍进度信息...")
         bookProgress = bookshelf_books.get("bookProgress", [])
         if bookProgress is None:
@@ -463,6 +558,7 @@ def main():
             logger.info(f"   分类 '{name}' 包含 {len(bookIds)} 本书")
 
         logger.info("6. 分析需要同步的书籍...")
+        # 阅读时长和书架分类都没有变化的书不需要同步，也不会请求阅读信息
         not_need_sync = []
         for key, value in notion_books.items():
             if (
@@ -496,21 +592,34 @@ def main():
         books = list(set(all_book_ids) - set(not_need_sync))
         logger.info(f"   共需要同步 {len(books)} 本书")
 
-        logger.info("8. 开始同步书籍...")
-        for index, bookId in enumerate(books):
-            logger.info(f"   正在同步第 {index + 1}/{len(books)} 本书 (ID: {bookId})")
-            try:
-                insert_book_to_notion(books, index, bookId, all_books_dict)
-                logger.info(f"   ✓ 书籍 {bookId} 同步成功")
-            except Exception as e:
-                logger.error(f"   ✗ 书籍 {bookId} 同步失败: {str(e)}")
-                continue
-
-        logger.info("同步完成！")
-
-    except Exception as e:
-        logger.error(f"同步过程中发生错误: {str(e)}")
-        raise
+    logger.info("8. 开始同步书籍...")
+    with tracer.span("8. 同步书籍", cat="stage", books=len(books)):
+        # 先解析所有书需要的作者和分类，写入时不再逐个查询
+        with tracer.span("解析作者和分类", cat="stage"):
+            preload_book_relations(books, all_books_dict)
+        # 阅读信息在后台并发获取，每批书先解析日期关联，写入Notion仍按顺序进行
+        read_infos = prefetch_books(weread_api, books, fetch_read_info)
+        for start in range(0, len(books), BOOK_BATCH_SIZE):
+            batch = list(itertools.islice(read_infos, BOOK_BATCH_SIZE))
+            with tracer.span("解析日期", cat="stage", books=len(batch)):
+                preload_book_dates(readInfo for _, readInfo in batch)
+            for index, (bookId, readInfo) in enumerate(batch, start):
+                logger.info(
+                    f"   正在同步第 {index + 1}/{len(books)} 本书 (ID: {bookId})"
+                )
+                try:
+                    with tracer.span(f"书籍 {bookId}", cat="book", bookId=bookId):
+                        insert_book_to_notion(
+                            books, index, bookId, all_books_dict, readInfo
+                        )
+                    logger.info(f"   ✓ 书籍 {bookId} 同步成功")
+                except Exception as e:
+                    logger.error(f"   ✗ 书籍 {bookId} 同步失败: {str(e)}")
+                    continue
+
+    logger.info("同步完成！")
+    weread_api.log_request_stats()
+    notion_helper.log_stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+from weread2notionpro.sync_state import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 书籍信息缓存有效期，单位秒，默认30天
+BOOK_INFO_TTL = int(os.getenv("WEREAD_BOOK_INFO_TTL") or 30 * 24 * 3600)
+# 最多缓存的书籍数量，超过后淘汰最久没有使用的
+BOOK_INFO_CACHE_SIZE = int(os.getenv("WEREAD_BOOK_INFO_CACHE_SIZE") or 5000)
+# 只缓存同步时用到的字段
+BOOK_INFO_FIELDS = (
+    "bookId",
+    "title",
+    "author",
+    "cover",
+    "categories",
+    "intro",
+    "isbn",
+    "price",
+    "publishTime",
+    "translator",
+)
+
+
+class BookInfoCache:
+    """书籍基本信息的本地缓存，书名、作者、ISBN、简介、分类和封面几乎不会变化
+
+    以bookId为键保存在一个json文件中，超过有效期的数据视为未命中，
+    超过数量上限时淘汰最久没有使用的数据，进程退出时写回磁盘。
+    """
+
+    def __init__(self, path=None, ttl=BOOK_INFO_TTL, max_size=BOOK_INFO_CACHE_SIZE):
+        self.path = path or os.path.join(STATE_DIR, "book_info.json")
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = None
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取书籍信息缓存失败: {str(e)}")
+
+    def get(self, bookId):
+        """返回缓存的书籍信息，没有或者已过期返回None"""
+        with self.lock:
+            self.load()
+            entry = self.entries.get(bookId)
+            now = time.time()
+            if entry is None or now - entry.get("time", 0) > self.ttl:
+                self.misses += 1
+                return None
+            entry["last_used"] = now
+            self.dirty = True
+            self.hits += 1
+            return dict(entry.get("data"))
+
+    def put(self, bookId, data):
+        if not data:
+            return
+        with self.lock:
+            self.load()
+            now = time.time()
+            self.entries[bookId] = {
+                "time": now,
+                "last_used": now,
+                "data": {k: data.get(k) for k in BOOK_INFO_FIELDS if k in data},
+            }
+            self.dirty = True
+            if len(self.entries) > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """淘汰最久没有使用的数据，同时清理过期数据"""
+        now = time.time()
+        entries = {
+            k: v for k, v in self.entries.items() if now - v.get("time", 0) <= self.ttl
+        }
+        if len(entries) > self.max_size:
+            keys = sorted(entries, key=lambda k: entries[k].get("last_used", 0))
+            for key in keys[: len(entries) - self.max_size]:
+                entries.pop(key)
+        self.entries = entries
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty or self.entries is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    def report(self):
+        """命中情况的统计文本"""
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "-"
+        return (
+            f"书籍信息缓存: 命中 {self.hits} 次, 未命中 {self.misses} 次, 命中率 {rate}"
+        )
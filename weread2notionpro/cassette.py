@@ -0,0 +1,274 @@
+import asyncio
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+
+# 录制/回放文件路径，不设置时不启用
+HTTP_CASSETTE = os.getenv("HTTP_CASSETTE")
+# record为录制，replay为回放，不设置时文件存在则回放，否则录制
+HTTP_CASSETTE_MODE = os.getenv("HTTP_CASSETTE_MODE")
+# 回放时每个请求的延迟秒数，recorded表示使用录制时的实际耗时
+HTTP_CASSETTE_LATENCY = os.getenv("HTTP_CASSETTE_LATENCY") or "0"
+# 只保存这些响应头，Set-Cookie只保留是否存在，录制文件里不保存任何Cookie
+KEPT_HEADERS = ("content-type", "retry-after", "set-cookie")
+
+
+class CassetteError(Exception):
+    """回放时找不到匹配的录制请求"""
+
+
+class Cassette:
+    """把HTTP请求和响应录制到gzip压缩的jsonl文件中，之后可以离线回放
+
+    请求按方法、去掉无关参数后的URL和请求体的哈希匹配，同一个请求出现多次时按录制顺序返回；
+    完全匹配失败时退回到只按方法和路径匹配，避免synckey之类的参数变化导致回放失败。
+    """
+
+    def __init__(self, path, mode=None, latency=HTTP_CASSETTE_LATENCY):
+        self.path = path
+        self.mode = mode or ("replay" if os.path.exists(path) else "record")
+        if self.mode not in ("record", "replay"):
+            raise ValueError(f"不支持的HTTP_CASSETTE_MODE: {self.mode}")
+        self.latency = latency
+        self.entries = []
+        self.by_key = defaultdict(deque)
+        self.by_path = defaultdict(deque)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.fallbacks = 0
+        if self.replaying:
+            self.load()
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    @property
+    def recording(self):
+        return self.mode == "record"
+
+    def make_key(self, method, url, body):
+        parts = urlsplit(str(url))
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        url = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        digest = hashlib.sha1(body or b"").hexdigest()[:16]
+        return f"{method.upper()} {url} {digest}"
+
+    def make_path(self, method, url):
+        parts = urlsplit(str(url))
+        return f"{method.upper()} {parts.netloc}{parts.path}"
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                self.add(json.loads(line))
+        logger.info(f"从 {self.path} 加载了 {len(self.entries)} 条录制的请求")
+
+    def add(self, entry):
+        self.entries.append(entry)
+        self.by_key[entry["key"]].append(entry)
+        self.by_path[entry["path"]].append(entry)
+
+    def play(self, method, url, body=None):
+        """返回匹配的录制记录，找不到时抛出CassetteError"""
+        key = self.make_key(method, url, body)
+        path = self.make_path(method, url)
+        with self.lock:
+            queue = self.by_key.get(key)
+            if not queue:
+                queue = self.by_path.get(path)
+                if not queue:
+                    raise CassetteError(f"录制文件中没有请求: {method} {url}")
+                self.fallbacks += 1
+            # 最后一条保留下来，之后同样的请求都返回它
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.hits += 1
+        return entry
+
+    def delay(self, entry):
+        if self.latency == "recorded":
+            return entry.get("elapsed", 0)
+        return float(self.latency)
+
+    def record(self, method, url, body, status, headers, content, elapsed):
+        headers = {
+            k.lower(): v for k, v in headers.items() if k.lower() in KEPT_HEADERS
+        }
+        if "set-cookie" in headers:
+            headers["set-cookie"] = "redacted=1"
+        try:
+            text, encoding = content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(content).decode("ascii"), "base64"
+        entry = {
+            "key": self.make_key(method, url, body),
+            "path": self.make_path(method, url),
+            "status": status,
+            "headers": headers,
+            "content": text,
+            "encoding": encoding,
+            "elapsed": round(elapsed, 4),
+        }
+        with self.lock:
+            self.add(entry)
+
+    def content(self, entry):
+        if entry.get("encoding") == "base64":
+            return base64.b64decode(entry["content"])
+        return entry["content"].encode("utf-8")
+
+    def save(self):
+        if not self.recording or not self.entries:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self.lock, gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        logger.info(f"录制了 {len(self.entries)} 条请求到 {self.path}")
+
+    def report(self):
+        if self.recording:
+            return f"HTTP录制: 已录制 {len(self.entries)} 条请求"
+        return (
+            f"HTTP回放: 回放 {self.hits} 次请求, 其中 {self.fallbacks} 次按路径模糊匹配"
+        )
+
+
+class CassetteAdapter(HTTPAdapter):
+    """requests的传输层，录制时转发真实请求并保存响应，回放时直接构造响应"""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, stream=False, **kwargs):
+        if self.cassette.replaying:
+            entry = self.cassette.play(request.method, request.url, request.body)
+            time.sleep(self.cassette.delay(entry))
+            return self.build_replay_response(request, entry)
+        start = time.monotonic()
+        # 录制时需要完整的响应体，不使用流式读取
+        r = super().send(request, stream=False, **kwargs)
+        self.cassette.record(
+            request.method,
+            request.url,
+            request.body,
+            r.status_code,
+            r.headers,
+            r.content,
+            time.monotonic() - start,
+        )
+        return r
+
+    def build_replay_response(self, request, entry):
+        r = requests.Response()
+        r.status_code = entry["status"]
+        r.headers = CaseInsensitiveDict(entry["headers"])
+        r.encoding = get_encoding_from_headers(r.headers)
+        r._content = self.cassette.content(entry)
+        r._content_consumed = True
+        r.url = request.url
+        r.request = request
+        r.connection = self
+        return r
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx的同步传输层，用法同CassetteAdapter"""
+
+    def __init__(self, cassette, transport=None):
+        self.cassette = cassette
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        if self.cassette.replaying:
+            entry = self.cassette.play(request.method, request.url, request.read())
+            time.sleep(self.cassette.delay(entry))
+            return build_httpx_response(self.cassette, request, entry)
+        start = time.monotonic()
+        response = self.transport.handle_request(request)
+        content = response.read()
+        record_httpx_response(self.cassette, request, response, content, start)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """httpx的异步传输层，用法同CassetteAdapter"""
+
+    def __init__(self, cassette, transport=None):
+        self.cassette = cassette
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        if self.cassette.replaying:
+            entry = self.cassette.play(request.method, request.url, request.read())
+            await asyncio.sleep(self.cassette.delay(entry))
+            return build_httpx_response(self.cassette, request, entry)
+        start = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        content = await response.aread()
+        record_httpx_response(self.cassette, request, response, content, start)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def build_httpx_response(cassette, request, entry):
+    return httpx.Response(
+        entry["status"],
+        headers=entry["headers"],
+        content=cassette.content(entry),
+        request=request,
+    )
+
+
+def record_httpx_response(cassette, request, response, content, start):
+    cassette.record(
+        request.method,
+        request.url,
+        request.read(),
+        response.status_code,
+        response.headers,
+        content,
+        time.monotonic() - start,
+    )
+
+
+def load_cassette():
+    """根据环境变量创建录制/回放文件，没有设置HTTP_CASSETTE时返回None"""
+    if not HTTP_CASSETTE:
+        return None
+    cassette = Cassette(HTTP_CASSETTE, HTTP_CASSETTE_MODE)
+    if cassette.recording:
+        atexit.register(cassette.save)
+    logger.info(
+        f"HTTP{'回放' if cassette.replaying else '录制'}已启用: {HTTP_CASSETTE}"
+    )
+    return cassette
+
+
+cassette = load_cassette()
@@ -0,0 +1,71 @@
+import threading
+
+
+class SyncContext:
+    """一次同步共用的微信读书和Notion客户端，第一次使用时才创建
+
+    创建WeReadApi会获取Cookie，创建NotionHelper会查找数据库并写入设置，
+    所以不在导入模块时创建。需要使用已有的客户端时可以直接传入。
+    """
+
+    def __init__(self, weread_api=None, notion_helper=None):
+        self._weread_api = weread_api
+        self._notion_helper = notion_helper
+        self._notion_books = None
+        self.lock = threading.RLock()
+
+    @property
+    def weread_api(self):
+        if self._weread_api is None:
+            with self.lock:
+                if self._weread_api is None:
+                    from weread2notionpro.weread_api import WeReadApi
+
+                    self._weread_api = WeReadApi()
+        return self._weread_api
+
+    @property
+    def notion_helper(self):
+        if self._notion_helper is None:
+            with self.lock:
+                if self._notion_helper is None:
+                    from weread2notionpro.notion_helper import NotionHelper
+
+                    self._notion_helper = NotionHelper()
+        return self._notion_helper
+
+    @property
+    def notion_books(self):
+        """Notion书架中已有的书籍，同一进程内的各个阶段共用一份
+
+        book阶段新建的页面会加进来，之后的weread阶段不需要重新查询。
+        """
+        if self._notion_books is None:
+            with self.lock:
+                if self._notion_books is None:
+                    self._notion_books = self.notion_helper.get_all_book()
+        return self._notion_books
+
+
+class ClientProxy:
+    """模块级别的weread_api、notion_helper，访问属性时才从当前的SyncContext取出客户端"""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(getattr(sync_context, self._name), attr)
+
+
+sync_context = SyncContext()
+
+
+def get_context():
+    return sync_context
+
+
+def use_context(context):
+    """替换当前的SyncContext，之后所有模块都使用其中的客户端"""
+    global sync_context
+    sync_context = context
+    return context
@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from weread2notionpro.sync_state import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 没有过期时间的Cookie最多缓存多久，单位秒
+COOKIE_CACHE_TTL = int(os.getenv("WEREAD_COOKIE_CACHE_TTL") or 24 * 3600)
+KDF_ITERATIONS = 100_000
+
+
+class CookieCache:
+    """把从CookieCloud获取的Cookie加密保存到本地，避免每个进程启动时都请求CookieCloud
+
+    密钥由CookieCloud的密码经PBKDF2派生，每次保存使用新的salt和nonce，
+    用AES-GCM加密并校验完整性，CookieCloud的id作为附加数据，换了id的缓存无法解密。
+    """
+
+    def __init__(self, id, password, path=None, ttl=COOKIE_CACHE_TTL):
+        self.id = id
+        self.password = password
+        self.path = path or os.path.join(STATE_DIR, "cookie.enc")
+        self.ttl = ttl
+
+    def derive_key(self, salt):
+        return hashlib.pbkdf2_hmac(
+            "sha256",
+            self.password.encode("utf-8"),
+            salt + self.id.encode("utf-8"),
+            KDF_ITERATIONS,
+            dklen=32,
+        )
+
+    def encrypt(self, plaintext):
+        salt = os.urandom(16)
+        nonce = os.urandom(12)
+        aesgcm = AESGCM(self.derive_key(salt))
+        ciphertext = aesgcm.encrypt(nonce, plaintext, self.id.encode("utf-8"))
+        return {
+            k: base64.b64encode(v).decode("ascii")
+            for k, v in dict(salt=salt, nonce=nonce, data=ciphertext).items()
+        }
+
+    def decrypt(self, payload):
+        salt, nonce, ciphertext = (
+            base64.b64decode(payload[k]) for k in ("salt", "nonce", "data")
+        )
+        aesgcm = AESGCM(self.derive_key(salt))
+        try:
+            return aesgcm.decrypt(nonce, ciphertext, self.id.encode("utf-8"))
+        except InvalidTag:
+            raise ValueError("Cookie缓存校验失败")
+
+    def load(self):
+        """返回缓存中仍然有效的Cookie，没有缓存、无法解密或者已过期返回None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.loads(self.decrypt(json.load(f)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取Cookie缓存失败: {str(e)}")
+            return None
+        if time.time() >= data.get("expires", 0):
+            logger.info("Cookie缓存已过期")
+            return None
+        return data.get("cookie")
+
+    def save(self, cookie, expires=None):
+        """保存Cookie，expires为Cookie中最早的过期时间戳"""
+        now = time.time()
+        expires = min(expires or now + self.ttl, now + self.ttl)
+        plaintext = json.dumps({"cookie": cookie, "expires": expires}).encode("utf-8")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.encrypt(plaintext), f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
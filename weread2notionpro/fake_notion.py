@@ -0,0 +1,630 @@
+"""本地模拟的Notion API服务器，用于在不接触真实工作区的情况下测试写入性能
+
+实现NotionHelper用到的接口：databases的query/create/update/retrieve，pages的create/update，
+blocks的children list/append、retrieve、update和delete。和真实的API一样限制平均每秒3个请求，
+每次最多追加100个block，列表接口每页最多100条。启动后设置NOTION_BASE_URL为服务器地址：
+
+    python -m weread2notionpro.fake_notion
+    NOTION_BASE_URL=http://127.0.0.1:8200 NOTION_TOKEN=fake NOTION_PAGE=<输出的page id> weread
+"""
+
+import argparse
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from weread2notionpro.config import book_properties_type_dict
+
+MAX_PAGE_SIZE = 100
+MAX_CHILDREN = 100
+TITLE_SCHEMA = {"标题": "title"}
+# 模板中的数据库和它们的主要属性，NotionHelper不会校验其他属性
+DATABASE_SCHEMAS = {
+    "书架": {**book_properties_type_dict, "豆瓣短评": "rich_text"},
+    "笔记": {"Name": "title", "书籍": "relation", "blockId": "rich_text"},
+    "划线": {"Name": "title", "书籍": "relation", "blockId": "rich_text"},
+    "章节": {"Name": "title", "书籍": "relation", "blockId": "rich_text"},
+    "日": {**TITLE_SCHEMA, "时长": "number", "时间戳": "number", "日期": "date"},
+    "周": {**TITLE_SCHEMA, "日期": "date"},
+    "月": {**TITLE_SCHEMA, "日期": "date"},
+    "年": {**TITLE_SCHEMA, "日期": "date"},
+    "分类": TITLE_SCHEMA,
+    "作者": TITLE_SCHEMA,
+}
+ROUTES = [
+    ("POST", r"/v1/databases", "create_database"),
+    ("GET", r"/v1/databases/(?P<id>[\w-]+)", "retrieve_database"),
+    ("PATCH", r"/v1/databases/(?P<id>[\w-]+)", "update_database"),
+    ("POST", r"/v1/databases/(?P<id>[\w-]+)/query", "query_database"),
+    ("POST", r"/v1/pages", "create_page"),
+    ("GET", r"/v1/pages/(?P<id>[\w-]+)", "retrieve_page"),
+    ("PATCH", r"/v1/pages/(?P<id>[\w-]+)", "update_page"),
+    ("GET", r"/v1/blocks/(?P<id>[\w-]+)", "retrieve_block"),
+    ("PATCH", r"/v1/blocks/(?P<id>[\w-]+)", "update_block"),
+    ("DELETE", r"/v1/blocks/(?P<id>[\w-]+)", "delete_block"),
+    ("GET", r"/v1/blocks/(?P<id>[\w-]+)/children", "list_children"),
+    ("PATCH", r"/v1/blocks/(?P<id>[\w-]+)/children", "append_children"),
+]
+ROUTES = [(method, re.compile(f"^{path}$"), name) for method, path, name in ROUTES]
+
+
+class NotionError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def to_dict(self):
+        return {
+            "object": "error",
+            "status": self.status,
+            "code": self.code,
+            "message": self.message,
+        }
+
+
+def validation_error(message):
+    return NotionError(400, "validation_error", message)
+
+
+def now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def key(id):
+    """Notion的id带不带-都可以，统一去掉-后作为键"""
+    return str(id).replace("-", "")
+
+
+def normalize_text(item):
+    content = (item.get("text") or {}).get("content", "")
+    return {
+        "type": "text",
+        "text": {"content": content, "link": (item.get("text") or {}).get("link")},
+        "annotations": {
+            "bold": False,
+            "italic": False,
+            "strikethrough": False,
+            "underline": False,
+            "code": False,
+            "color": "default",
+            **(item.get("annotations") or {}),
+        },
+        "plain_text": content,
+        "href": None,
+    }
+
+
+def normalize_property(name, value):
+    """把请求中的属性值转换为接口返回的格式"""
+    type = value.get("type") or next(k for k in value if k not in ("id", "name"))
+    content = value.get(type)
+    if type in ("title", "rich_text"):
+        content = [normalize_text(x) for x in content or []]
+    elif type in ("select", "status") and content:
+        content = {"id": content.get("name"), "color": "default", **content}
+    elif type == "relation":
+        content = [{"id": x.get("id")} for x in content or []]
+    return {"id": name, "type": type, type: content}
+
+
+def empty_property(name, type):
+    """页面中没有设置的属性，和真实的API一样也会返回空值"""
+    empty = {"title": [], "rich_text": [], "relation": [], "files": []}
+    empty.update(multi_select=[], checkbox=False)
+    return {"id": name, "type": type, type: empty.get(type)}
+
+
+def plain_value(property):
+    """用于过滤和排序的属性值"""
+    if property is None:
+        return None
+    type = property.get("type")
+    content = property.get(type)
+    if type in ("title", "rich_text"):
+        text = "".join(x.get("plain_text", "") for x in content or [])
+        return text or None
+    if type in ("select", "status"):
+        return content.get("name") if content else None
+    if type == "relation":
+        return [key(x.get("id")) for x in content or []]
+    if type == "date":
+        return content.get("start") if content else None
+    return content
+
+
+def match_condition(value, condition):
+    for op, expected in condition.items():
+        if op == "is_empty":
+            return value in (None, [], "")
+        if op == "is_not_empty":
+            return value not in (None, [], "")
+        if isinstance(value, list):
+            # relation
+            if op == "contains":
+                return key(expected) in value
+            if op == "does_not_contain":
+                return key(expected) not in value
+        elif op == "equals":
+            return value == expected
+        elif op == "does_not_equal":
+            return value != expected
+        elif value is None:
+            return False
+        elif op == "contains":
+            return expected in value
+        elif op == "does_not_contain":
+            return expected not in value
+        elif op == "starts_with":
+            return value.startswith(expected)
+        elif op == "ends_with":
+            return value.endswith(expected)
+        elif op in ("greater_than", "after"):
+            return value > expected
+        elif op in ("less_than", "before"):
+            return value < expected
+        elif op in ("greater_than_or_equal_to", "on_or_after"):
+            return value >= expected
+        elif op in ("less_than_or_equal_to", "on_or_before"):
+            return value <= expected
+        raise validation_error(f"不支持的过滤条件: {op}")
+    return True
+
+
+def match_filter(page, filter):
+    if not filter:
+        return True
+    if "and" in filter:
+        return all(match_filter(page, f) for f in filter["and"])
+    if "or" in filter:
+        return any(match_filter(page, f) for f in filter["or"])
+    property = page["properties"].get(filter.get("property"))
+    conditions = [v for k, v in filter.items() if k != "property"]
+    if len(conditions) != 1:
+        raise validation_error(f"无法解析的过滤条件: {filter}")
+    return match_condition(plain_value(property), conditions[0])
+
+
+def paginate(items, start_cursor, page_size):
+    page_size = int(page_size or MAX_PAGE_SIZE)
+    if page_size > MAX_PAGE_SIZE:
+        raise validation_error(f"page_size should be ≤ {MAX_PAGE_SIZE}")
+    start = int(start_cursor or 0)
+    end = start + page_size
+    has_more = end < len(items)
+    return {
+        "object": "list",
+        "results": items[start:end],
+        "next_cursor": str(end) if has_more else None,
+        "has_more": has_more,
+    }
+
+
+class FakeNotionWorkspace:
+    """内存中的工作区，所有的页面、数据库和block都以去掉-的id为键保存"""
+
+    def __init__(self):
+        self.objects = {}
+        self.children = {}
+        self.rows = {}
+        self.lock = threading.RLock()
+        self.root_page_id = self.create_root_page()
+        for title, schema in DATABASE_SCHEMAS.items():
+            self.create_database(
+                {
+                    "parent": {"type": "page_id", "page_id": self.root_page_id},
+                    "title": [{"type": "text", "text": {"content": title}}],
+                    "properties": {name: {type: {}} for name, type in schema.items()},
+                }
+            )
+
+    def add(self, obj):
+        self.objects[key(obj["id"])] = obj
+        self.children.setdefault(key(obj["id"]), [])
+        return obj
+
+    def get(self, id, object=None):
+        obj = self.objects.get(key(id))
+        if obj is None or (object and obj["object"] != object):
+            raise NotionError(
+                404, "object_not_found", f"Could not find {object or 'block'}: {id}"
+            )
+        return obj
+
+    def new_object(self, object, parent, **fields):
+        return self.add(
+            {
+                "object": object,
+                "id": str(uuid.uuid4()),
+                "parent": parent,
+                "created_time": now(),
+                "last_edited_time": now(),
+                "archived": False,
+                **fields,
+            }
+        )
+
+    def create_root_page(self):
+        page = self.new_object(
+            "page",
+            {"type": "workspace", "workspace": True},
+            properties={"title": normalize_property("title", {"title": []})},
+        )
+        return page["id"]
+
+    def create_database(self, body):
+        parent = body.get("parent") or {}
+        page = self.get(parent.get("page_id"), "page")
+        title = [normalize_text(x) for x in body.get("title") or []]
+        properties = {
+            name: {"id": name, "name": name, **normalize_schema(value)}
+            for name, value in (body.get("properties") or {}).items()
+        }
+        database = self.new_object(
+            "database",
+            {"type": "page_id", "page_id": page["id"]},
+            title=title,
+            properties=properties,
+            icon=body.get("icon"),
+        )
+        self.rows[key(database["id"])] = []
+        # 和真实的工作区一样，数据库同时是父页面中的一个child_database
+        self.children[key(page["id"])].append(key(database["id"]))
+        return database
+
+    def retrieve_database(self, id, body, params):
+        return self.get(id, "database")
+
+    def update_database(self, id, body, params):
+        database = self.get(id, "database")
+        for name, value in (body.get("properties") or {}).items():
+            if value is None:
+                database["properties"].pop(name, None)
+            else:
+                database["properties"][name] = {
+                    "id": name,
+                    "name": name,
+                    **normalize_schema(value),
+                }
+        if body.get("title"):
+            database["title"] = [normalize_text(x) for x in body["title"]]
+        database["last_edited_time"] = now()
+        return database
+
+    def query_database(self, id, body, params):
+        self.get(id, "database")
+        pages = [self.objects[x] for x in self.rows[key(id)]]
+        pages = [
+            x
+            for x in pages
+            if not x["archived"] and match_filter(x, body.get("filter"))
+        ]
+        for sort in reversed(body.get("sorts") or []):
+            reverse = sort.get("direction") == "descending"
+            if "timestamp" in sort:
+                pages.sort(key=lambda x: x[sort["timestamp"]], reverse=reverse)
+                continue
+            name = sort.get("property")
+            # 和Notion一样，空值总是排在最后
+            filled = [x for x in pages if plain_value(x["properties"].get(name))]
+            empty = [x for x in pages if not plain_value(x["properties"].get(name))]
+            filled.sort(
+                key=lambda x: plain_value(x["properties"].get(name)), reverse=reverse
+            )
+            pages = filled + empty
+        return paginate(pages, body.get("start_cursor"), body.get("page_size"))
+
+    def create_page(self, id, body, params):
+        parent = body.get("parent") or {}
+        properties = {
+            name: normalize_property(name, value)
+            for name, value in (body.get("properties") or {}).items()
+        }
+        if "database_id" in parent:
+            database = self.get(parent["database_id"], "database")
+            parent = {"type": "database_id", "database_id": database["id"]}
+            properties = {
+                **{
+                    name: empty_property(name, value["type"])
+                    for name, value in database["properties"].items()
+                },
+                **properties,
+            }
+        else:
+            page = self.get(parent.get("page_id"), "page")
+            parent = {"type": "page_id", "page_id": page["id"]}
+        page = self.new_object(
+            "page",
+            parent,
+            properties=properties,
+            icon=body.get("icon"),
+            cover=body.get("cover"),
+        )
+        if parent["type"] == "database_id":
+            self.rows[key(parent["database_id"])].append(key(page["id"]))
+        else:
+            self.children[key(parent["page_id"])].append(key(page["id"]))
+        if body.get("children"):
+            self.append_children(page["id"], {"children": body["children"]}, {})
+        return page
+
+    def retrieve_page(self, id, body, params):
+        return self.get(id, "page")
+
+    def update_page(self, id, body, params):
+        page = self.get(id, "page")
+        for name, value in (body.get("properties") or {}).items():
+            page["properties"][name] = normalize_property(name, value)
+        for field in ("icon", "cover", "archived"):
+            if field in body:
+                page[field] = body[field]
+        page["last_edited_time"] = now()
+        return page
+
+    def as_block(self, obj):
+        """页面和数据库作为block返回时的格式"""
+        if obj["object"] == "block":
+            return obj
+        if obj["object"] == "database":
+            type, title = "child_database", obj["title"]
+        else:
+            type, title = "child_page", obj["properties"].get("title", {}).get("title")
+        block = {k: obj[k] for k in ("id", "parent", "created_time", "archived")}
+        return {
+            **block,
+            "object": "block",
+            "type": type,
+            type: {"title": "".join(x["plain_text"] for x in title or [])},
+            "has_children": bool(self.children[key(obj["id"])]),
+        }
+
+    def retrieve_block(self, id, body, params):
+        return self.as_block(self.get(id))
+
+    def update_block(self, id, body, params):
+        block = self.get(id, "block")
+        type = block["type"]
+        if type in body:
+            block[type].update(body[type])
+        if "archived" in body:
+            block["archived"] = body["archived"]
+        block["last_edited_time"] = now()
+        return block
+
+    def delete_block(self, id, body, params):
+        obj = self.get(id)
+        obj["archived"] = True
+        return obj
+
+    def list_children(self, id, body, params):
+        self.get(id)
+        blocks = [self.as_block(self.objects[x]) for x in self.children[key(id)]]
+        blocks = [x for x in blocks if not x["archived"]]
+        return paginate(blocks, params.get("start_cursor"), params.get("page_size"))
+
+    def append_children(self, id, body, params):
+        parent = self.get(id)
+        children = body.get("children") or []
+        if len(children) > MAX_CHILDREN:
+            raise validation_error(
+                f"body failed validation: body.children.length should be ≤ "
+                f"`{MAX_CHILDREN}`, instead was `{len(children)}`."
+            )
+        siblings = self.children[key(id)]
+        position = len(siblings)
+        if body.get("after"):
+            if key(body["after"]) not in siblings:
+                raise validation_error(f"after {body['after']} 不是 {id} 的子block")
+            position = siblings.index(key(body["after"])) + 1
+        if parent["object"] == "page":
+            parent_ref = {"type": "page_id", "page_id": parent["id"]}
+        else:
+            parent_ref = {"type": "block_id", "block_id": parent["id"]}
+            parent["has_children"] = True
+        results = []
+        for child in children:
+            type = child.get("type") or next(k for k in child if k != "object")
+            content = dict(child.get(type) or {})
+            grandchildren = content.pop("children", None)
+            block = self.new_object(
+                "block", parent_ref, type=type, has_children=False, **{type: content}
+            )
+            siblings.insert(position, key(block["id"]))
+            position += 1
+            if grandchildren:
+                self.append_children(block["id"], {"children": grandchildren}, {})
+            results.append(block)
+        return {"object": "list", "results": results, "next_cursor": None}
+
+    def handle(self, name, id, body, params):
+        with self.lock:
+            if name == "create_database":
+                return self.create_database(body)
+            return getattr(self, name)(id, body, params)
+
+    def count(self):
+        """各数据库中的页面数，用于测试结束后检查"""
+        with self.lock:
+            result = {}
+            for database_id, rows in self.rows.items():
+                database = self.objects[database_id]
+                title = "".join(x["plain_text"] for x in database["title"])
+                result[title] = sum(1 for x in rows if not self.objects[x]["archived"])
+            return result
+
+
+def normalize_schema(value):
+    type = value.get("type") or next(k for k in value if k not in ("id", "name"))
+    return {"type": type, type: value.get(type) or {}}
+
+
+class FakeNotionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分开写入，不关闭Nagle算法时每个请求会多等待几十毫秒
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+    def dispatch(self, method):
+        parts = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.server.count_bytes("received", length)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        retry_after = self.server.acquire()
+        if retry_after:
+            self.server.count("429")
+            return self.send_json(
+                NotionError(429, "rate_limited", "Rate limited").to_dict(),
+                429,
+                {"Retry-After": str(retry_after)},
+            )
+        for route_method, pattern, name in ROUTES:
+            match = pattern.match(parts.path)
+            if route_method == method and match:
+                self.server.count(name)
+                try:
+                    result = self.server.workspace.handle(
+                        name, match.groupdict().get("id"), body, params
+                    )
+                except NotionError as e:
+                    return self.send_json(e.to_dict(), e.status)
+                except Exception as e:
+                    error = NotionError(500, "internal_server_error", str(e))
+                    return self.send_json(error.to_dict(), 500)
+                return self.send_json(result)
+        self.send_json(
+            NotionError(400, "invalid_request_url", "Invalid request URL.").to_dict(),
+            400,
+        )
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.server.count_bytes("sent", len(body))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeNotionServer(ThreadingHTTPServer):
+    """模拟服务器，rate_limit为每秒平均请求数，burst为允许突发的请求数，超过时返回429"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        workspace=None,
+        host="127.0.0.1",
+        port=0,
+        rate_limit=3,
+        burst=10,
+        latency=0,
+    ):
+        super().__init__((host, port), FakeNotionHandler)
+        self.workspace = workspace or FakeNotionWorkspace()
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.latency = latency
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.request_count = Counter()
+        # 请求体和响应体的字节数
+        self.bytes = Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def page_id(self):
+        return self.workspace.root_page_id
+
+    def count_bytes(self, direction, size):
+        with self.lock:
+            self.bytes[direction] += size
+
+    def count(self, name):
+        with self.lock:
+            self.request_count[name] += 1
+
+    def acquire(self):
+        """令牌桶限流，允许时返回0，否则返回Retry-After秒数"""
+        if not self.rate_limit:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate_limit
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(1, math.ceil((1 - self.tokens) / self.rate_limit))
+
+    def start(self):
+        """在后台线程中运行"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的Notion API服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument(
+        "--rate-limit", type=float, default=3, help="每秒平均请求数，0为不限制"
+    )
+    parser.add_argument("--burst", type=int, default=10, help="允许突发的请求数")
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的延迟秒数")
+    args = parser.parse_args()
+    server = FakeNotionServer(
+        None, args.host, args.port, args.rate_limit, args.burst, args.latency
+    )
+    print(f"模拟Notion服务器已启动: NOTION_BASE_URL={server.url}")
+    print(f"NOTION_PAGE={server.page_id}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
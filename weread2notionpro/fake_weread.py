@@ -0,0 +1,478 @@
+"""本地模拟的微信读书服务器，用于压力测试和性能测试
+
+生成指定规模的书库，实现weread_api.py用到的接口，并可以注入延迟、登录超时和限流。
+启动后设置WEREAD_BASE_URL为服务器地址即可，例如：
+
+    python -m weread2notionpro.fake_weread --books 10000 --highlights 100
+    WEREAD_BASE_URL=http://127.0.0.1:8100 WEREAD_COOKIE=wr_vid=1 weread
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+CATEGORIES = ["文学", "历史", "哲学", "经济", "计算机", "心理学", "科幻", "传记"]
+# 接口返回的synckey，客户端带着它请求时说明没有更新
+SYNCKEY = 1700000000
+DAY = 86400
+
+
+class FakeLibrary:
+    """按需生成的模拟书库，同样的参数每次生成的数据相同
+
+    划线等数据在请求时才按书生成，不会把上百万条划线都放在内存里。
+    """
+
+    def __init__(
+        self, books=100, highlights=20, reviews=5, chapters=30, read_days=365, seed=0
+    ):
+        self.books = books
+        self.highlights = highlights
+        self.reviews = reviews
+        self.chapters = chapters
+        self.read_days = read_days
+        self.seed = seed
+        self.start_time = SYNCKEY - read_days * DAY
+
+    def book_id(self, i):
+        return str(1000000 + i)
+
+    def index(self, bookId):
+        """bookId对应的序号，不存在时返回None"""
+        try:
+            i = int(bookId) - 1000000
+        except (TypeError, ValueError):
+            return None
+        return i if 0 <= i < self.books else None
+
+    def random(self, i, kind):
+        return random.Random(f"{self.seed}-{kind}-{i}")
+
+    def book(self, i):
+        rnd = self.random(i, "book")
+        return {
+            "bookId": self.book_id(i),
+            "title": f"模拟书籍{i}",
+            "author": f"作者{i % 500}",
+            "translator": f"译者{i % 50}" if i % 4 == 0 else "",
+            "cover": f"https://cdn.weread.qq.com/weread/cover/{i}/s_{i}.jpg",
+            "intro": f"这是模拟书籍{i}的简介。",
+            "categories": [
+                {
+                    "categoryId": i % len(CATEGORIES),
+                    "title": CATEGORIES[i % len(CATEGORIES)],
+                }
+            ],
+            "isbn": f"978{i:010d}",
+            "price": round(rnd.uniform(10, 100), 2),
+            "publishTime": "2020-01-01 00:00:00",
+        }
+
+    def notebooks(self):
+        return [
+            {
+                "bookId": self.book_id(i),
+                "book": self.book(i),
+                "noteCount": self.highlights,
+                "reviewCount": self.reviews,
+                "sort": SYNCKEY + i,
+            }
+            for i in range(self.books)
+        ]
+
+    def shelf(self):
+        progress = []
+        for i in range(self.books):
+            rnd = self.random(i, "progress")
+            progress.append(
+                {
+                    "bookId": self.book_id(i),
+                    "progress": rnd.randint(0, 100),
+                    "readingTime": rnd.randint(0, 100000),
+                    "updateTime": SYNCKEY - rnd.randint(0, self.read_days) * DAY,
+                }
+            )
+        archive = [
+            {
+                "name": category,
+                "bookIds": [
+                    self.book_id(i) for i in range(k, self.books, len(CATEGORIES))
+                ],
+            }
+            for k, category in enumerate(CATEGORIES)
+        ]
+        return {
+            "synckey": SYNCKEY,
+            "books": [self.book(i) for i in range(self.books)],
+            "bookProgress": progress,
+            "archive": archive,
+        }
+
+    def chapter_list(self, i):
+        return [
+            {
+                "chapterUid": uid,
+                "chapterIdx": uid,
+                "title": f"第{uid}章",
+                "level": 1,
+                "updateTime": SYNCKEY,
+                "readAhead": 0,
+            }
+            for uid in range(1, self.chapters + 1)
+        ]
+
+    def bookmarks(self, i):
+        rnd = self.random(i, "bookmarks")
+        bookId = self.book_id(i)
+        result = []
+        for j in range(self.highlights):
+            chapterUid = rnd.randint(1, self.chapters)
+            start = j * 100
+            result.append(
+                {
+                    "bookmarkId": f"{bookId}_{chapterUid}_{start}-{start + 50}",
+                    "bookId": bookId,
+                    "chapterUid": chapterUid,
+                    "range": f"{start}-{start + 50}",
+                    "markText": f"模拟书籍{i}的第{j}条划线。",
+                    "style": rnd.randint(0, 2),
+                    "colorStyle": rnd.randint(1, 5),
+                    "type": 1,
+                    "createTime": SYNCKEY - rnd.randint(0, self.read_days) * DAY,
+                }
+            )
+        return result
+
+    def review_list(self, i):
+        rnd = self.random(i, "reviews")
+        bookId = self.book_id(i)
+        result = []
+        for j in range(self.reviews):
+            chapterUid = rnd.randint(1, self.chapters)
+            start = j * 100 + 10
+            result.append(
+                {
+                    "review": {
+                        "reviewId": f"R_{bookId}_{j}",
+                        "bookId": bookId,
+                        "chapterUid": chapterUid,
+                        "range": f"{start}-{start + 20}",
+                        "abstract": f"模拟书籍{i}的第{j}条想法对应的原文。",
+                        "content": f"模拟书籍{i}的第{j}条想法。",
+                        "type": 1,
+                        "createTime": SYNCKEY - rnd.randint(0, self.read_days) * DAY,
+                    }
+                }
+            )
+        return result
+
+    def read_info(self, i):
+        rnd = self.random(i, "progress")
+        progress = rnd.randint(0, 100)
+        reading_time = rnd.randint(0, 100000)
+        update_time = SYNCKEY - rnd.randint(0, self.read_days) * DAY
+        days = min(3, self.read_days)
+        return {
+            "bookId": self.book_id(i),
+            "canFreeRead": False,
+            "timestamp": SYNCKEY,
+            "book": {
+                "progress": progress,
+                "readingTime": reading_time,
+                "chapterUid": rnd.randint(1, self.chapters),
+                "chapterOffset": 0,
+                "chapterIdx": 1,
+                "isStartReading": 1,
+                "updateTime": update_time,
+                "startReadingTime": update_time - 30 * DAY,
+                "finishTime": update_time if progress == 100 else None,
+            },
+            "readDetail": {
+                "data": [
+                    {"readDate": update_time - d * DAY, "readTime": 600}
+                    for d in range(days)
+                ]
+            },
+        }
+
+    def read_times(self):
+        rnd = self.random(0, "history")
+        return {
+            str(self.start_time + d * DAY): rnd.randint(0, 7200)
+            for d in range(self.read_days)
+        }
+
+
+class FakeWeReadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头和响应体分开写入，不关闭Nagle算法时每个请求会多等待几十毫秒
+    disable_nagle_algorithm = True
+
+    routes = {
+        ("GET", "/"): "handle_home",
+        ("HEAD", "/"): "handle_home",
+        ("GET", "/web/shelf/sync"): "handle_shelf",
+        ("GET", "/api/user/notebook"): "handle_notebooks",
+        ("GET", "/web/book/info"): "handle_book_info",
+        ("GET", "/web/book/bookmarklist"): "handle_bookmarks",
+        ("GET", "/web/review/list"): "handle_reviews",
+        ("POST", "/web/book/chapterInfos"): "handle_chapters",
+        ("GET", "/web/book/getProgress"): "handle_progress",
+        ("GET", "/web/readdata/summary"): "handle_summary",
+    }
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_HEAD(self):
+        self.dispatch("HEAD")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def library(self):
+        return self.server.library
+
+    def dispatch(self, method):
+        parts = urlsplit(self.path)
+        self.params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        self.server.count_bytes("received", length)
+        self.body = json.loads(self.rfile.read(length)) if length else {}
+        name = self.routes.get((method, parts.path.rstrip("/") or "/"))
+        self.server.count(parts.path)
+        if name is None:
+            return self.send_json({"errCode": -1, "errMsg": "not found"}, 404)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if name != "handle_home":
+            if not self.server.acquire():
+                self.server.count("429")
+                return self.send_json(
+                    {"errCode": -1, "errMsg": "too many requests"},
+                    429,
+                    {"Retry-After": "1"},
+                )
+            if self.server.login_timeout():
+                self.server.count("-2012")
+                return self.send_json({"errCode": -2012, "errMsg": "登录超时"})
+        getattr(self, name)()
+
+    def send_json(self, data, status=200, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.server.count_bytes("sent", len(body))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def get_book_index(self):
+        i = self.library.index(self.params.get("bookId"))
+        if i is None:
+            self.send_json({"errCode": -2003, "errMsg": "参数格式错误"})
+        return i
+
+    def is_synced(self):
+        """客户端带着最新的synckey请求时只返回空的增量"""
+        return int(self.params.get("synckey") or 0) >= SYNCKEY
+
+    def handle_home(self):
+        self.send_json(
+            {}, headers={"Set-Cookie": f"wr_skey=fake{time.time_ns()}; Path=/"}
+        )
+
+    def handle_shelf(self):
+        self.send_json(self.library.shelf())
+
+    def handle_notebooks(self):
+        self.send_json({"synckey": SYNCKEY, "books": self.library.notebooks()})
+
+    def handle_book_info(self):
+        i = self.get_book_index()
+        if i is not None:
+            self.send_json(self.library.book(i))
+
+    def handle_bookmarks(self):
+        i = self.get_book_index()
+        if i is None:
+            return
+        updated = [] if self.is_synced() else self.library.bookmarks(i)
+        self.send_json(
+            {
+                "synckey": SYNCKEY,
+                "updated": updated,
+                "removed": [],
+                "chapters": [],
+                "book": self.library.book(i),
+            }
+        )
+
+    def handle_reviews(self):
+        i = self.get_book_index()
+        if i is None:
+            return
+        reviews = [] if self.is_synced() else self.library.review_list(i)
+        self.send_json(
+            {"synckey": SYNCKEY, "reviews": reviews, "removed": [], "hasMore": 0}
+        )
+
+    def handle_chapters(self):
+        bookIds = self.body.get("bookIds") or []
+        synckeys = self.body.get("synckeys") or []
+        data = []
+        for index, bookId in enumerate(bookIds):
+            i = self.library.index(bookId)
+            if i is None:
+                continue
+            synckey = synckeys[index] if index < len(synckeys) else 0
+            updated = [] if (synckey or 0) >= SYNCKEY else self.library.chapter_list(i)
+            data.append(
+                {
+                    "bookId": bookId,
+                    "synckey": SYNCKEY,
+                    "updated": updated,
+                    "removed": [],
+                }
+            )
+        self.send_json({"data": data})
+
+    def handle_progress(self):
+        i = self.get_book_index()
+        if i is not None:
+            self.send_json(self.library.read_info(i))
+
+    def handle_summary(self):
+        read_times = {} if self.is_synced() else self.library.read_times()
+        self.send_json({"synckey": SYNCKEY, "readTimes": read_times})
+
+
+class FakeWeReadServer(ThreadingHTTPServer):
+    """模拟服务器，latency为每个请求的延迟秒数，login_timeout_rate为返回-2012的概率，
+    rate_limit为每秒最多处理的请求数，超过时返回429
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        library=None,
+        host="127.0.0.1",
+        port=0,
+        latency=0,
+        login_timeout_rate=0,
+        rate_limit=0,
+        seed=0,
+    ):
+        super().__init__((host, port), FakeWeReadHandler)
+        self.library = library or FakeLibrary()
+        self.latency = latency
+        self.login_timeout_rate = login_timeout_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.request_count = Counter()
+        # 请求体和响应体的字节数
+        self.bytes = Counter()
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_bytes(self, direction, size):
+        with self.lock:
+            self.bytes[direction] += size
+
+    def count(self, key):
+        with self.lock:
+            self.request_count[key] += 1
+
+    def acquire(self):
+        """按1秒的固定窗口限流，返回是否允许处理请求"""
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 1:
+                self.window_start = now
+                self.window_count = 0
+            self.window_count += 1
+            return self.window_count <= self.rate_limit
+
+    def login_timeout(self):
+        with self.lock:
+            return self.random.random() < self.login_timeout_rate
+
+    def start(self):
+        """在后台线程中运行"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的微信读书服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--books", type=int, default=100, help="书籍数量")
+    parser.add_argument("--highlights", type=int, default=20, help="每本书的划线数")
+    parser.add_argument("--reviews", type=int, default=5, help="每本书的想法数")
+    parser.add_argument("--chapters", type=int, default=30, help="每本书的章节数")
+    parser.add_argument("--read-days", type=int, default=365, help="有阅读记录的天数")
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的延迟秒数")
+    parser.add_argument(
+        "--login-timeout-rate", type=float, default=0, help="返回-2012的概率"
+    )
+    parser.add_argument(
+        "--rate-limit", type=int, default=0, help="每秒最多处理的请求数，0为不限制"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    library = FakeLibrary(
+        args.books,
+        args.highlights,
+        args.reviews,
+        args.chapters,
+        args.read_days,
+        args.seed,
+    )
+    server = FakeWeReadServer(
+        library,
+        args.host,
+        args.port,
+        args.latency,
+        args.login_timeout_rate,
+        args.rate_limit,
+        args.seed,
+    )
+    print(f"模拟微信读书服务器已启动: WEREAD_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
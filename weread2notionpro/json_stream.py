@@ -0,0 +1,119 @@
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+# 可能出现在数字中的字符
+NUMBER_CHARS = "0123456789.eE+-"
+
+
+class JsonStreamError(ValueError):
+    pass
+
+
+class JsonArrayStream:
+    """增量解析顶层是对象的json，逐个返回其中某个数组字段的元素
+
+    chunks为按顺序返回bytes或str片段的迭代器（例如requests的iter_content），
+    其他顶层字段解析完成后保存在fields中，等迭代结束后再读取。
+    同一时间内存中只保留当前未解析完的片段和一个数组元素。
+    """
+
+    def __init__(self, chunks, key):
+        self.chunks = iter(chunks)
+        self.key = key
+        self.fields = {}
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+        # 多字节字符可能被拆到两个片段中，使用增量解码
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def read_more(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            raise JsonStreamError("json数据不完整")
+        if isinstance(chunk, bytes):
+            chunk = self.text_decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+
+    def read_at_least(self, size):
+        """至少读取一个片段，并尽量让未解析的数据达到size
+
+        解析失败后把未解析的数据至少读到原来的两倍再重新解析，
+        一个跨越k个片段的元素只需要解析O(log k)次，总的解析量和元素大小成正比，
+        而不是每读一个片段就从头解析一次的O(k²)。
+        """
+        self.read_more()
+        while len(self.buffer) - self.pos < size:
+            try:
+                self.read_more()
+            except JsonStreamError:
+                # 已经读到了结尾，用现有的数据再解析一次
+                break
+
+    def peek(self):
+        """跳过空白并返回下一个字符"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.read_more()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise JsonStreamError(f"期望 {char!r}，实际为 {self.buffer[self.pos]!r}")
+        self.pos += 1
+
+    def decode(self):
+        """解析下一个完整的json值，数据不够时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                self.read_at_least(2 * (len(self.buffer) - self.pos))
+                continue
+            # 数字在片段末尾时可能还没读完，例如片段以"6."结尾时只解析出了6
+            if (
+                isinstance(value, (int, float))
+                and not self.buffer[end:].lstrip(NUMBER_CHARS)
+                and not self.exhausted
+            ):
+                try:
+                    self.read_more()
+                except JsonStreamError:
+                    pass
+                else:
+                    continue
+            self.pos = end
+            return value
+
+    def __iter__(self):
+        self.expect("{")
+        while True:
+            char = self.peek()
+            if char == "}":
+                self.pos += 1
+                return
+            if char == ",":
+                self.pos += 1
+                continue
+            key = self.decode()
+            self.expect(":")
+            if key == self.key and self.peek() == "[":
+                self.pos += 1
+                while True:
+                    char = self.peek()
+                    if char == "]":
+                        self.pos += 1
+                        break
+                    if char == ",":
+                        self.pos += 1
+                        continue
+                    yield self.decode()
+            else:
+                self.fields[key] = self.decode()
@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# 日志级别，排查问题时设置为DEBUG可以看到接口响应的预览
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# text为普通文本，json为每行一个JSON对象，便于用jq之类的工具分析
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_DIR = os.getenv("LOG_DIR") or "logs"
+# 日志中输出接口响应、Notion参数等大对象时最多保留的字符数
+LOG_PREVIEW_LIMIT = int(os.getenv("LOG_PREVIEW_LIMIT") or 2000)
+
+# 项目内所有模块的logger都在这个logger下面
+PACKAGE_LOGGER = "weread2notionpro"
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+# LogRecord自带的属性，JSON格式中只额外输出通过extra传入的字段
+RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class Preview:
+    """日志参数中的大对象，只有日志真正输出时才转换成字符串，并且截断到limit个字符"""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value, limit):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        value = self.value
+        if isinstance(value, (dict, list)):
+            text = json.dumps(value, ensure_ascii=False, default=str)
+        else:
+            text = str(value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[: self.limit]}...(共{len(text)}字符)"
+
+
+def preview(value, limit=None):
+    """用法: logger.debug("响应: %s", preview(data))"""
+    return Preview(value, limit or LOG_PREVIEW_LIMIT)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in RECORD_ATTRS)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """只在调用线程中生成消息，时间格式化和写文件都在后台线程完成
+
+    默认的QueueHandler会在调用线程中按完整格式输出一遍，这里只合并消息参数，
+    参数中的对象可能在之后被修改，所以不能推迟到后台线程。
+    """
+
+    def __init__(self, queue, on_close=None):
+        super().__init__(queue)
+        self.on_close = on_close
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        # logging.shutdown在logging导入时注册到atexit，晚于其他atexit函数执行，
+        # 在这里才停止后台线程，追踪文件、缓存等退出时写的日志也不会丢
+        if self.on_close is not None:
+            self.on_close()
+        super().close()
+
+
+class LogSetup:
+    def __init__(self):
+        self.listener = None
+        self.handler = None
+        self.filename = None
+
+    def setup(self, level=LOG_LEVEL, fmt=LOG_FORMAT, log_dir=LOG_DIR):
+        """配置项目的日志，同时输出到控制台和logs目录下的文件，重复调用时直接返回"""
+        if self.listener is not None:
+            return self.filename
+        os.makedirs(log_dir, exist_ok=True)
+        suffix = "jsonl" if fmt == "json" else "log"
+        self.filename = os.path.join(
+            log_dir, f"weread_sync_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{suffix}"
+        )
+        formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+        console_handler = logging.StreamHandler()
+        file_handler = logging.FileHandler(self.filename, encoding="utf-8")
+        for handler in (console_handler, file_handler):
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        self.listener = QueueListener(log_queue, console_handler, file_handler)
+        self.listener.start()
+
+        logger = logging.getLogger(PACKAGE_LOGGER)
+        logger.setLevel(level)
+        self.handler = DeferredQueueHandler(log_queue, self.stop)
+        logger.addHandler(self.handler)
+        # 避免重复日志
+        logger.propagate = False
+        logger.info(f"日志文件已创建: {self.filename}")
+        return self.filename
+
+    def stop(self):
+        """等待后台线程写完剩余的日志"""
+        if self.listener is not None:
+            logging.getLogger(PACKAGE_LOGGER).removeHandler(self.handler)
+            self.listener.stop()
+            self.listener = None
+
+
+log_setup = LogSetup()
+setup_logging = log_setup.setup
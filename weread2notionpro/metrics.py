@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+# 运行结束时把指标写入这个文件，.prom结尾为Prometheus textfile格式，其他为JSON
+METRICS_FILE = os.getenv("METRICS_FILE")
+# 延迟直方图的上界，单位秒
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Notion接口路径中的id替换为{id}，同一种操作汇总在一起
+NOTION_ID_PATTERN = re.compile(
+    r"/[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}"
+)
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # 最后一个桶为超过最大上界的请求
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, elapsed, size, error):
+        self.count += 1
+        self.errors += bool(error)
+        self.bytes += size or 0
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.buckets[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def percentile(self, p):
+        """根据直方图估算的分位数，返回所在桶的上界"""
+        if not self.count:
+            return 0
+        target = self.count * p
+        total = 0
+        for bound, n in zip(LATENCY_BUCKETS, self.buckets):
+            total += n
+            if total >= target:
+                return bound
+        return self.max_time
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "total_time": round(self.total_time, 3),
+            "max_time": round(self.max_time, 3),
+            "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)),
+        }
+
+
+class MetricsRegistry:
+    """按服务和接口统计请求次数、错误、重试、流量和延迟
+
+    重试不依赖具体的重试实现：同一个请求上次失败后又发出时记为一次重试。
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def get(self, service, endpoint):
+        key = (service, endpoint)
+        if key not in self.endpoints:
+            self.endpoints[key] = EndpointMetrics()
+        return self.endpoints[key]
+
+    def observe(self, service, endpoint, request_key, elapsed, size=0, error=False):
+        """记录一次请求，request_key用于识别重试，error表示请求失败"""
+        with self.lock:
+            metrics = self.get(service, endpoint)
+            if request_key in self.failed:
+                metrics.retries += 1
+            metrics.observe(elapsed, size, error)
+            if error:
+                self.failed.add(request_key)
+            else:
+                self.failed.discard(request_key)
+
+    def summary(self):
+        """按总耗时从高到低排列的汇总表"""
+        header = (
+            f"{'服务':<8}{'接口':<36}{'请求':>7}{'错误':>6}{'重试':>6}"
+            f"{'流量KB':>10}{'平均ms':>9}{'P95ms':>8}{'总耗时s':>9}"
+        )
+        lines = ["请求指标汇总:", header]
+        with self.lock:
+            items = sorted(self.endpoints.items(), key=lambda x: -x[1].total_time)
+            for (service, endpoint), m in items:
+                lines.append(
+                    f"{service:<8}{endpoint:<36}{m.count:>7}{m.errors:>6}"
+                    f"{m.retries:>6}{m.bytes / 1024:>10.1f}"
+                    f"{m.total_time / m.count * 1000:>9.0f}"
+                    f"{m.percentile(0.95) * 1000:>8.0f}{m.total_time:>9.1f}"
+                )
+        return "\n".join(lines)
+
+    def to_json(self):
+        with self.lock:
+            return {
+                f"{service} {endpoint}": m.to_dict()
+                for (service, endpoint), m in self.endpoints.items()
+            }
+
+    def to_prometheus(self):
+        lines = []
+        counters = (
+            ("requests_total", "请求次数", "count"),
+            ("request_errors_total", "失败的请求次数", "errors"),
+            ("request_retries_total", "重试次数", "retries"),
+            ("response_bytes_total", "响应体字节数", "bytes"),
+        )
+        with self.lock:
+            items = sorted(self.endpoints.items())
+            for name, help, field in counters:
+                lines.append(f"# HELP weread2notion_{name} {help}")
+                lines.append(f"# TYPE weread2notion_{name} counter")
+                for (service, endpoint), m in items:
+                    labels = f'service="{service}",endpoint="{endpoint}"'
+                    lines.append(
+                        f"weread2notion_{name}{{{labels}}} {getattr(m, field)}"
+                    )
+            name = "weread2notion_request_duration_seconds"
+            lines.append(f"# HELP {name} 请求耗时")
+            lines.append(f"# TYPE {name} histogram")
+            for (service, endpoint), m in items:
+                labels = f'service="{service}",endpoint="{endpoint}"'
+                total = 0
+                for bound, n in zip([*map(str, LATENCY_BUCKETS), "+Inf"], m.buckets):
+                    total += n
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+                lines.append(f"{name}_sum{{{labels}}} {m.total_time:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {m.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=METRICS_FILE):
+        """写入指标文件，没有设置METRICS_FILE时不写入"""
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def request_key(method, url, *parts):
+    """同一个请求再次发出时得到相同的key，用于识别重试"""
+    body = "".join(map(repr, parts)).encode("utf-8")
+    return f"{method.upper()} {url} {hashlib.sha1(body).hexdigest()[:16]}"
+
+
+def response_size(r, stream=False):
+    """响应体的字节数，流式响应没有Content-Length时无法提前得知，记为0"""
+    length = r.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length)
+    return 0 if stream else len(r.content)
+
+
+def weread_endpoint(url):
+    """微信读书请求的操作名，只保留路径，例如 /web/book/info"""
+    return urlsplit(str(url)).path or "/"
+
+
+def notion_endpoint(method, path):
+    """Notion请求的操作名，例如 POST /v1/databases/{id}/query"""
+    return f"{method} {NOTION_ID_PATTERN.sub('/{id}', path)}"
+
+
+metrics = MetricsRegistry()
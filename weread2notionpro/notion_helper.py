@@ -1,15 +1,19 @@
 import logging
 import os
 import re
-import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 
+import httpx
 import pendulum
 from dotenv import load_dotenv
-from notion_client import Client
-from retrying import retry
+from notion_client import APIErrorCode, APIResponseError, Client
 
 load_dotenv()
+from weread2notionpro.rate_limiter import notion_rate_limiter
+from weread2notionpro.relation_index import NOTION_RELATION_INDEX, RelationIndex
+from weread2notionpro.retry_policy import retry_policy
+from weread2notionpro.transport import NotionTransport
 from weread2notionpro.utils import (
     format_date,
     get_date,
@@ -30,6 +34,11 @@ USER_ICON_URL = "https://www.notion.so/icons/user-circle-filled_gray.svg"
 TARGET_ICON_URL = "https://www.notion.so/icons/target_red.svg"
 BOOKMARK_ICON_URL = "https://www.notion.so/icons/bookmark_gray.svg"
 
+logger = logging.getLogger(__name__)
+
+# 批量创建关联页面时的并发数，请求仍然经过共享的限流器
+NOTION_CONCURRENCY = int(os.getenv("NOTION_CONCURRENCY") or 4)
+
 
 class NotionHelper:
     database_name_dict = {
@@ -46,16 +55,31 @@ class NotionHelper:
         "READ_DATABASE_NAME": "阅读记录",
         "SETTING_DATABASE_NAME": "设置",
     }
-    database_id_dict = {}
     heatmap_block_id = None
     show_color = True
     block_type = "callout"
     sync_bookmark = True
 
     def __init__(self):
-        self.client = Client(auth=os.getenv("NOTION_TOKEN"), log_level=logging.ERROR)
+        # 所有请求都经过共享的限流器，不再在写入前固定sleep
+        self.client = Client(
+            auth=os.getenv("NOTION_TOKEN"),
+            log_level=logging.ERROR,
+            client=httpx.Client(transport=NotionTransport()),
+            # 可以指向本地的模拟服务器（python -m weread2notionpro.fake_notion）
+            base_url=os.getenv("NOTION_BASE_URL") or "https://api.notion.com",
+        )
         self.__cache = {}
+        # 关联页面的本地索引，多次运行之间保留，见RelationIndex
+        self.relation_index = RelationIndex() if NOTION_RELATION_INDEX else None
+        self.warmed_databases = set()
+        # 本次运行中已经完整读取过的关联数据库，缓存中没有的标题可以直接创建
+        self.loaded_databases = set()
+        # 本次运行中解析过的关联页面id对应的参数，页面失效时用于重新查找
+        self.relation_args = {}
         self.page_id = self.extract_page_id(os.getenv("NOTION_PAGE"))
+        # 每个实例单独保存，同一进程中连接另一个页面时不会用到之前找到的数据库
+        self.database_id_dict = {}
         self.search_database(self.page_id)
         for key in self.database_name_dict.keys():
             if os.getenv(key) != None and os.getenv(key) != "":
@@ -288,6 +312,13 @@ class NotionHelper:
                 properties=properties,
             )
 
+    def log_stats(self):
+        """输出限流等待的统计"""
+        logger.info(notion_rate_limiter.report())
+        if self.relation_index:
+            logger.info(self.relation_index.report())
+        logger.info(f"Notion和微信读书请求共重试 {retry_policy.retries} 次")
+
     def update_heatmap(self, block_id, url):
         # 更新 image block 的链接
         return self.client.blocks.update(block_id=block_id, embed={"url": url})
@@ -347,23 +378,208 @@ class NotionHelper:
             day, self.day_database_id, TARGET_ICON_URL, properties
         )
 
-    def get_relation_id(self, name, id, icon, properties={}):
+    def get_relation_id(self, name, id, icon, properties=None):
         key = f"{id}{name}"
+        # 复制一份，会被多个线程同时调用，也会保存到relation_args中
+        properties = dict(properties or {})
         if key in self.__cache:
             return self.__cache.get(key)
-        filter = {"property": "标题", "title": {"equals": name}}
-        response = self.client.databases.query(database_id=id, filter=filter)
-        if len(response.get("results")) == 0:
-            parent = {"database_id": id, "type": "database_id"}
-            properties["标题"] = get_title(name)
-            page_id = self.client.pages.create(
-                parent=parent, properties=properties, icon=get_icon(icon)
-            ).get("id")
-        else:
-            page_id = response.get("results")[0].get("id")
+        page_id = self.find_in_relation_index(name, id)
+        if page_id is None:
+            if id not in self.loaded_databases:
+                page_id = self.find_relation_page(name, id)
+            if page_id is None:
+                parent = {"database_id": id, "type": "database_id"}
+                properties["标题"] = get_title(name)
+                page_id = self.create_page(parent, properties, get_icon(icon)).get("id")
+            if self.relation_index:
+                self.relation_index.put(id, name, page_id)
         self.__cache[key] = page_id
+        self.relation_args[page_id] = (name, id, icon, properties)
         return page_id
 
+    def find_relation_page(self, name, database_id):
+        """按标题查询关联页面，不存在时返回None"""
+        filter = {"property": "标题", "title": {"equals": name}}
+        results = self.query(database_id=database_id, filter=filter).get("results")
+        return results[0].get("id") if results else None
+
+    def find_in_relation_index(self, name, database_id):
+        """从本地索引中查找，数据库第一次使用时先整体读取一遍"""
+        if self.relation_index is None:
+            return None
+        if database_id not in self.warmed_databases:
+            if not self.relation_index.is_warmed(database_id):
+                self.warm_up_relation(database_id)
+            self.warmed_databases.add(database_id)
+        return self.relation_index.get(database_id, name)
+
+    def warm_up_relation(self, database_id):
+        """分页读取整个数据库，把所有页面的标题和id写入缓存和索引"""
+        results = self.query_all(database_id)
+        # 标题重复时和按标题查询一样使用第一个页面
+        items = [
+            (get_property_value(result.get("properties").get("标题")), result["id"])
+            for result in reversed(results)
+        ]
+        items = [x for x in items if x[0]]
+        for title, page_id in items:
+            self.__cache[f"{database_id}{title}"] = page_id
+        self.loaded_databases.add(database_id)
+        if self.relation_index:
+            self.relation_index.warm(database_id, items)
+        logger.info(f"关联页面: 从数据库 {database_id} 读取了 {len(results)} 个页面")
+
+    def preload_dates(self, dates, days=True):
+        """预先解析一批日期需要的年、月、周、日页面
+
+        每个日期数据库最多分页读取一次，缺少的页面按年、月、周、日的顺序并发创建，
+        之后get_date_relation等直接从缓存或索引中取得页面id。
+        read_time只关联年、月、周，这时days为False。
+        """
+        dates = list(dates)
+        if not dates:
+            return
+        levels = [
+            (self.year_database_id, self.get_year_relation_id, lambda x: x.year),
+            (
+                self.month_database_id,
+                self.get_month_relation_id,
+                lambda x: (x.year, x.month),
+            ),
+            (
+                self.week_database_id,
+                self.get_week_relation_id,
+                lambda x: tuple(x.isocalendar())[:2],
+            ),
+        ]
+        if days:
+            levels.append(
+                (self.day_database_id, self.get_day_relation_id, lambda x: x.date())
+            )
+        try:
+            for database_id, resolve, period in levels:
+                periods = {period(date): date for date in dates}
+                self.resolve_relations(database_id, resolve, periods.values())
+            logger.info(f"预先解析了 {len(dates)} 个日期的年、月、周、日页面")
+        except Exception as e:
+            # 预加载只是优化，失败时写入每一项时仍会逐个解析
+            logger.warning(f"预先解析日期页面失败: {str(e)}")
+
+    def preload_relations(self, database_id, names, icon):
+        """预先解析一批标题的关联页面，例如所有待同步书籍的作者和分类"""
+        names = {name for name in names if name}
+        if not names:
+            return
+        try:
+            self.resolve_relations(
+                database_id,
+                lambda name: self.get_relation_id(name, database_id, icon),
+                names,
+            )
+            logger.info(f"预先解析了数据库 {database_id} 的 {len(names)} 个关联页面")
+        except Exception as e:
+            logger.warning(f"预先解析关联页面失败: {str(e)}")
+
+    def resolve_relations(self, database_id, resolve, items):
+        """读取一次整个数据库后并发解析items，缓存中没有的页面会被创建
+
+        本地索引已经预热过时也在本次运行中读取一次，否则索引中没有的标题
+        会在get_relation_id中逐个查询Notion，同时也更新了索引。
+        """
+        if database_id not in self.loaded_databases:
+            self.warm_up_relation(database_id)
+            self.warmed_databases.add(database_id)
+        with ThreadPoolExecutor(max_workers=NOTION_CONCURRENCY) as executor:
+            list(executor.map(resolve, items))
+
+    def warm_up_relations(self, force=False):
+        """预热所有关联数据库的索引，force为True时重新读取已经预热过的数据库"""
+        if self.relation_index is None:
+            return
+        database_ids = (
+            self.author_database_id,
+            self.category_database_id,
+            self.year_database_id,
+            self.month_database_id,
+            self.week_database_id,
+            self.day_database_id,
+        )
+        for database_id in filter(None, database_ids):
+            if force or not self.relation_index.is_warmed(database_id):
+                self.warm_up_relation(database_id)
+            self.warmed_databases.add(database_id)
+
+    def stale_relations(self, properties, error):
+        """找出写入失败可能是由哪些来自缓存或索引的关联页面引起的
+
+        object_not_found且错误信息中没有提到具体页面时，properties中的所有关联页面都可能失效；
+        validation_error只处理错误信息中提到的页面，其他原因（例如选项、数字的值不合法）
+        和关联页面无关，不能清除索引。
+        """
+        relations = {
+            relation.get("id")
+            for value in properties.values()
+            if isinstance(value, dict)
+            for relation in value.get("relation") or []
+            if relation.get("id") in self.relation_args
+        }
+        message = str(error).replace("-", "")
+        named = {x for x in relations if x.replace("-", "") in message}
+        if error.code == APIErrorCode.ObjectNotFound:
+            return named or relations
+        if error.code == APIErrorCode.ValidationError:
+            return named
+        return set()
+
+    def refresh_relations(self, properties, stale):
+        """按标题重新查询失效的关联页面并替换properties中的id
+
+        只查询不创建：页面确实不存在时不替换，由调用方抛出原来的错误。
+        返回是否有关联页面被替换。
+        """
+        logger.warning(f"写入失败，重新查找 {len(stale)} 个关联页面")
+        self.relation_index.remove_pages(stale)
+        replaced = {}
+        for page_id in stale:
+            name, database_id, icon, relation_properties = self.relation_args.pop(
+                page_id
+            )
+            key = f"{database_id}{name}"
+            self.__cache.pop(key, None)
+            # 缓存中的数据库内容已经过期，之后缺少的标题需要重新查询
+            self.loaded_databases.discard(database_id)
+            new_page_id = self.find_relation_page(name, database_id)
+            if new_page_id is None or new_page_id == page_id:
+                continue
+            self.__cache[key] = new_page_id
+            self.relation_index.put(database_id, name, new_page_id)
+            self.relation_args[new_page_id] = (
+                name,
+                database_id,
+                icon,
+                relation_properties,
+            )
+            replaced[page_id] = new_page_id
+        for value in properties.values():
+            if isinstance(value, dict):
+                for relation in value.get("relation") or []:
+                    relation["id"] = replaced.get(relation.get("id"), relation["id"])
+        return bool(replaced)
+
+    def write_page(self, write, **kwargs):
+        """创建或更新页面，关联的页面已经被删除时刷新索引后再写一次"""
+        try:
+            return retry_policy.call(write, **kwargs)
+        except APIResponseError as e:
+            if self.relation_index is None:
+                raise
+            properties = kwargs.get("properties") or {}
+            stale = self.stale_relations(properties, e)
+            if not stale or not self.refresh_relations(properties, stale):
+                raise
+            return retry_policy.call(write, **kwargs)
+
     def insert_bookmark(self, id, bookmark):
         icon = get_icon(BOOKMARK_ICON_URL)
         properties = {
@@ -387,7 +603,6 @@ class NotionHelper:
         self.create_page(parent, properties, icon)
 
     def insert_review(self, id, review):
-        time.sleep(0.1)
         icon = get_icon(TAG_ICON_URL)
         properties = {
             "Name": get_title(review.get("content", "")),
@@ -413,7 +628,6 @@ class NotionHelper:
         self.create_page(parent, properties, icon)
 
     def insert_chapter(self, id, chapter):
-        time.sleep(0.1)
         icon = {"type": "external", "external": {"url": TAG_ICON_URL}}
         properties = {
             "Name": get_title(chapter.get("title")),
@@ -428,41 +642,48 @@ class NotionHelper:
         parent = {"database_id": self.chapter_database_id, "type": "database_id"}
         self.create_page(parent, properties, icon)
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def update_book_page(self, page_id, properties):
-        return self.client.pages.update(page_id=page_id, properties=properties)
+        return self.write_page(
+            self.client.pages.update, page_id=page_id, properties=properties
+        )
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def update_page(self, page_id, properties, cover):
-        return self.client.pages.update(
-            page_id=page_id, properties=properties, cover=cover
+        return self.write_page(
+            self.client.pages.update,
+            page_id=page_id,
+            properties=properties,
+            cover=cover,
         )
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def create_page(self, parent, properties, icon):
-        return self.client.pages.create(parent=parent, properties=properties, icon=icon)
+        return self.write_page(
+            self.client.pages.create, parent=parent, properties=properties, icon=icon
+        )
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def create_book_page(self, parent, properties, icon):
-        return self.client.pages.create(
-            parent=parent, properties=properties, icon=icon, cover=icon
+        return self.write_page(
+            self.client.pages.create,
+            parent=parent,
+            properties=properties,
+            icon=icon,
+            cover=icon,
         )
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+    @retry_policy
     def query(self, **kwargs):
         kwargs = {k: v for k, v in kwargs.items() if v}
         return self.client.databases.query(**kwargs)
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+    @retry_policy
     def get_block_children(self, id):
         response = self.client.blocks.children.list(id)
         return response.get("results")
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+    @retry_policy
     def append_blocks(self, block_id, children):
         return self.client.blocks.children.append(block_id=block_id, children=children)
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+    @retry_policy
     def append_blocks_after(self, block_id, children, after):
         # 奇怪不知道为什么会多插入一个children，没找到问题，先暂时这么解决，搜索是否有parent
         parent = self.client.blocks.retrieve(after).get("parent")
@@ -472,11 +693,10 @@ class NotionHelper:
             block_id=block_id, children=children, after=after
         )
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
+    @retry_policy
     def delete_block(self, block_id):
         return self.client.blocks.delete(block_id=block_id)
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def get_all_book(self):
         """从Notion中获取所有的书籍"""
         results = self.query_all(self.book_database_id)
@@ -504,13 +724,13 @@ class NotionHelper:
             }
         return books_dict
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def query_all_by_book(self, database_id, filter):
         results = []
         has_more = True
         start_cursor = None
         while has_more:
-            response = self.client.databases.query(
+            # 每一页单独重试，而不是失败后从第一页重新开始
+            response = self.query(
                 database_id=database_id,
                 filter=filter,
                 start_cursor=start_cursor,
@@ -521,15 +741,15 @@ class NotionHelper:
             results.extend(response.get("results"))
         return results
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
-    def query_all(self, database_id):
-        """获取database中所有的数据"""
+    def query_all(self, database_id, filter=None):
+        """获取database中所有的数据，filter为可选的过滤条件"""
         results = []
         has_more = True
         start_cursor = None
         while has_more:
-            response = self.client.databases.query(
+            response = self.query(
                 database_id=database_id,
+                filter=filter,
                 start_cursor=start_cursor,
                 page_size=100,
             )
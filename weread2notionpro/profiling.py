@@ -0,0 +1,94 @@
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# 性能分析报告的输出目录，和运行日志放在一起
+PROFILE_DIR = os.getenv("PROFILE_DIR") or "logs"
+# 报告中列出的函数和内存分配位置的数量
+PROFILE_TOP = int(os.getenv("PROFILE_TOP") or 40)
+
+
+class Profiler:
+    """用cProfile和tracemalloc分析一次运行
+
+    生成两个文件：
+    - profile_<名称>_<时间>.pstats：可以用 snakeviz、flameprof 等工具查看火焰图
+    - profile_<名称>_<时间>.txt：按累计耗时和自身耗时排序的函数，以及内存分配最多的代码行
+    """
+
+    # 同一时间只能有一个cProfile在运行，sync中依次调用的各个入口不再单独分析
+    active = False
+
+    def __init__(self, name, directory=PROFILE_DIR, top=PROFILE_TOP):
+        self.name = name
+        self.directory = directory
+        self.top = top
+        self.profile = cProfile.Profile()
+
+    def __enter__(self):
+        Profiler.active = True
+        self.start = time.perf_counter()
+        tracemalloc.start(25)
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        Profiler.active = False
+        wall_time = time.perf_counter() - self.start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.write_report(wall_time, snapshot, peak)
+
+    def write_report(self, wall_time, snapshot, peak):
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(
+            self.directory, f"profile_{self.name}_{time.strftime('%Y%m%d_%H%M%S')}"
+        )
+        self.profile.dump_stats(f"{prefix}.pstats")
+
+        report = io.StringIO()
+        report.write(f"{self.name} 总耗时 {wall_time:.2f} 秒\n")
+        report.write(f"tracemalloc 内存峰值 {peak / 1024 / 1024:.1f} MB\n\n")
+        stats = pstats.Stats(self.profile, stream=report)
+        stats.strip_dirs()
+        for sort in ("cumulative", "tottime"):
+            report.write(f"==== 按 {sort} 排序 ====\n")
+            stats.sort_stats(sort).print_stats(self.top)
+        report.write("==== 内存分配最多的代码行 ====\n")
+        snapshot = snapshot.filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )
+        )
+        for stat in snapshot.statistics("lineno")[: self.top]:
+            report.write(f"{stat}\n")
+        with open(f"{prefix}.txt", "w", encoding="utf-8") as f:
+            f.write(report.getvalue())
+        logger.info(f"性能分析报告已写入 {prefix}.txt 和 {prefix}.pstats")
+
+
+def profiled(name):
+    """命令行带有--profile参数时，在性能分析下运行被装饰的入口函数"""
+
+    def decorator(main):
+        @functools.wraps(main)
+        def wrapper(*args, **kwargs):
+            if "--profile" not in sys.argv[1:] or Profiler.active:
+                return main(*args, **kwargs)
+            with Profiler(name):
+                return main(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
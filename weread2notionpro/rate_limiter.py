@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+
+# Notion官方限制平均每秒3个请求，允许短时间的突发
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT") or 3)
+NOTION_BURST = int(os.getenv("NOTION_BURST") or 5)
+# 收到429后速率最低降到多少
+NOTION_MIN_RATE = float(os.getenv("NOTION_MIN_RATE") or 0.5)
+
+
+class TokenBucket:
+    """令牌桶，rate为每秒生成的令牌数，capacity为允许突发的请求数
+
+    收到429后速率减半并暂停到Retry-After之后，之后每次成功请求慢慢恢复到初始速率。
+    """
+
+    def __init__(self, rate, capacity, min_rate=NOTION_MIN_RATE):
+        self.base_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """预定一个令牌，返回需要等待的秒数"""
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            # 令牌可以为负数，表示已经被前面等待中的请求预定了
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            return max(wait, self.paused_until - now)
+
+    def penalize(self, retry_after=None):
+        """收到429时降低速率"""
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+    def reward(self):
+        """请求成功后逐渐恢复速率"""
+        if self.rate >= self.base_rate:
+            return
+        with self.lock:
+            self.rate = min(self.base_rate, self.rate + 0.05 * self.base_rate)
+
+
+class RateLimiter:
+    """进程内共享的限流器，每个域名一个令牌桶，并统计等待时间"""
+
+    def __init__(self, rate=NOTION_RATE_LIMIT, capacity=NOTION_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.wait_time = 0
+        self.wait_count = 0
+        self.throttled_count = 0
+
+    def get_bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self.buckets[host]
+
+    def acquire(self, host):
+        """阻塞直到可以向host发送请求，返回等待的秒数"""
+        wait = self.get_bucket(host).reserve()
+        if wait > 0:
+            time.sleep(wait)
+            with self.lock:
+                self.wait_time += wait
+                self.wait_count += 1
+        return wait
+
+    def observe(self, host, status_code, retry_after=None):
+        """根据响应状态调整速率"""
+        bucket = self.get_bucket(host)
+        if status_code == 429:
+            with self.lock:
+                self.throttled_count += 1
+            bucket.penalize(parse_retry_after(retry_after))
+        elif status_code < 400:
+            bucket.reward()
+
+    def report(self):
+        rates = ", ".join(
+            f"{host} {bucket.rate:.2f}/s" for host, bucket in self.buckets.items()
+        )
+        return (
+            f"Notion限流: 等待 {self.wait_count} 次, 共 {self.wait_time:.1f} 秒, "
+            f"收到429 {self.throttled_count} 次, 当前速率 {rates or '-'}"
+        )
+
+
+def parse_retry_after(value):
+    """解析Retry-After响应头，只支持秒数格式"""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+notion_rate_limiter = RateLimiter()
@@ -4,7 +4,9 @@ from datetime import datetime, timedelta
 
 import pendulum
 
-from weread2notionpro.notion_helper import NotionHelper
+from weread2notionpro.context import ClientProxy
+from weread2notionpro.log_config import setup_logging
+from weread2notionpro.profiling import profiled
 from weread2notionpro.utils import (
     format_date,
     get_date,
@@ -13,7 +15,6 @@ from weread2notionpro.utils import (
     get_relation,
     get_title,
 )
-from weread2notionpro.weread_api import WeReadApi
 
 
 def insert_to_notion(page_id, timestamp, duration):
@@ -81,11 +82,15 @@ HEATMAP_GUIDE = "https://mp.weixin.qq.com/s?__biz=MzI1OTcxOTI4NA==&mid=224748414
 
 
 logger = logging.getLogger(__name__)
-notion_helper = NotionHelper()
-weread_api = WeReadApi()
+# 客户端在第一次使用时才创建，导入模块时不会发出任何请求
+weread_api = ClientProxy("weread_api")
+notion_helper = ClientProxy("notion_helper")
 
 
-def main():
+@profiled("read_time")
+def main(api_data=None):
+    """api_data为预先获取的阅读时长数据"""
+    setup_logging()
     image_file = get_file()
     if image_file:
         image_url = f"https://raw.githubusercontent.com/{os.getenv('REPOSITORY')}/{os.getenv('REF').split('/')[-1]}/OUT_FOLDER/{image_file}"
@@ -100,7 +105,8 @@ def main():
             )
     else:
         logger.error(f"更新热力图失败，没有生成热力图。具体参考：{HEATMAP_GUIDE}")
-    api_data = weread_api.get_api_data()
+    if api_data is None:
+        api_data = weread_api.get_api_data()
     readTimes = {int(key): value for key, value in api_data.get("readTimes").items()}
     now = pendulum.now("Asia/Shanghai").start_of("day")
     today_timestamp = now.int_timestamp
@@ -108,6 +114,8 @@ def main():
         readTimes[today_timestamp] = 0
     readTimes = dict(sorted(readTimes.items()))
     results = notion_helper.query_all(database_id=notion_helper.day_database_id)
+    # 先找出需要写入的记录，一次性解析它们的年、月、周页面再逐条写入
+    pending = []
     for result in results:
         timestamp = result.get("properties").get("时间戳").get("number")
         duration = result.get("properties").get("时长").get("number")
@@ -115,9 +123,19 @@ def main():
         if timestamp in readTimes:
             value = readTimes.pop(timestamp)
             if value != duration:
-                insert_to_notion(page_id=id, timestamp=timestamp, duration=value)
-    for key, value in readTimes.items():
-        insert_to_notion(None, int(key), value)
+                pending.append((id, timestamp, value))
+    pending.extend((None, int(key), value) for key, value in readTimes.items())
+    notion_helper.preload_dates(
+        (
+            datetime.utcfromtimestamp(timestamp) + timedelta(hours=8)
+            for _, timestamp, _ in pending
+        ),
+        days=False,
+    )
+    for id, timestamp, value in pending:
+        insert_to_notion(page_id=id, timestamp=timestamp, duration=value)
+    weread_api.log_request_stats()
+    notion_helper.log_stats()
 
 
 if __name__ == "__main__":
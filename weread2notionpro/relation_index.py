@@ -0,0 +1,167 @@
+"""Notion关联页面的本地索引
+
+python -m weread2notionpro.relation_index stats
+python -m weread2notionpro.relation_index warm-up
+python -m weread2notionpro.relation_index clear [--database 数据库id]
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from weread2notionpro.sync_state import STATE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 设置为false时不使用本地索引，每次运行都查询Notion
+NOTION_RELATION_INDEX = (
+    os.getenv("NOTION_RELATION_INDEX") or "true"
+).lower() != "false"
+
+
+class RelationIndex:
+    """作者、分类、年、月、周、日等关联页面的id，以数据库id和标题为键保存在SQLite中
+
+    命中时不再查询Notion。索引不主动校验，页面被删除后写入会失败，
+    这时由NotionHelper清除相关的记录并重新查询。
+    第一次在某个数据库中查找时，一次性分页读取整个数据库写入索引。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(STATE_DIR, "relations.sqlite3")
+        self.connection = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS relation ("
+                "database_id TEXT, title TEXT, page_id TEXT, updated_at REAL, "
+                "PRIMARY KEY (database_id, title))"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS relation_page ON relation (page_id)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS warmed ("
+                "database_id TEXT PRIMARY KEY, updated_at REAL)"
+            )
+        return self.connection
+
+    def get(self, database_id, title):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute(
+                    "SELECT page_id FROM relation WHERE database_id=? AND title=?",
+                    (database_id, title),
+                )
+                .fetchone()
+            )
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, database_id, title, page_id):
+        self.put_many(database_id, [(title, page_id)])
+
+    def put_many(self, database_id, items):
+        """items为(标题, page_id)的列表"""
+        now = time.time()
+        with self.lock:
+            self.connect().executemany(
+                "INSERT OR REPLACE INTO relation VALUES (?, ?, ?, ?)",
+                [(database_id, title, page_id, now) for title, page_id in items],
+            )
+
+    def is_warmed(self, database_id):
+        with self.lock:
+            row = (
+                self.connect()
+                .execute("SELECT 1 FROM warmed WHERE database_id=?", (database_id,))
+                .fetchone()
+            )
+        return row is not None
+
+    def warm(self, database_id, items):
+        """写入整个数据库的标题和页面id，并标记为已经预热"""
+        self.put_many(database_id, items)
+        with self.lock:
+            self.connect().execute(
+                "INSERT OR REPLACE INTO warmed VALUES (?, ?)",
+                (database_id, time.time()),
+            )
+
+    def remove_pages(self, page_ids):
+        """删除这些页面的记录，返回被删除的数量"""
+        page_ids = list(page_ids)
+        with self.lock:
+            cursor = self.connect().executemany(
+                "DELETE FROM relation WHERE page_id=?", [(x,) for x in page_ids]
+            )
+        return cursor.rowcount
+
+    def clear(self, database_id=None):
+        with self.lock:
+            connection = self.connect()
+            if database_id is None:
+                connection.execute("DELETE FROM relation")
+                connection.execute("DELETE FROM warmed")
+            else:
+                connection.execute(
+                    "DELETE FROM relation WHERE database_id=?", (database_id,)
+                )
+                connection.execute(
+                    "DELETE FROM warmed WHERE database_id=?", (database_id,)
+                )
+
+    def stats(self):
+        """每个数据库的记录数"""
+        with self.lock:
+            return dict(
+                self.connect().execute(
+                    "SELECT database_id, COUNT(*) FROM relation GROUP BY database_id"
+                )
+            )
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "-"
+        return (
+            f"关联页面索引: 命中 {self.hits} 次, 未命中 {self.misses} 次, 命中率 {rate}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="管理Notion关联页面的本地索引")
+    parser.add_argument("command", choices=("stats", "warm-up", "clear"))
+    parser.add_argument("--database", help="只清除这个数据库id的记录")
+    args = parser.parse_args()
+    index = RelationIndex()
+    if args.command == "clear":
+        index.clear(args.database)
+        print(f"已清除 {args.database or '所有数据库'} 的索引")
+    elif args.command == "warm-up":
+        from weread2notionpro.context import get_context
+
+        notion_helper = get_context().notion_helper
+        notion_helper.warm_up_relations(force=True)
+    for database_id, count in index.stats().items():
+        print(f"{database_id}: {count}")
+
+
+if __name__ == "__main__":
+    main()
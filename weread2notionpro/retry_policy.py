@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+import requests
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from weread2notionpro.rate_limiter import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS") or 3)
+# 指数退避的初始等待时间和最长等待时间，单位秒
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY") or 1)
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY") or 30)
+# 服务器要求等待的Retry-After超过这个秒数时不再重试，直接抛出错误
+RETRY_MAX_RETRY_AFTER = float(os.getenv("RETRY_MAX_RETRY_AFTER") or 300)
+# 这些状态码说明请求没有被处理或者服务暂时不可用，重试可能成功
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RetryableResponseError(Exception):
+    """响应状态码可以重试时抛出，重试次数用完后调用方可以取出最后一次的响应"""
+
+    def __init__(self, response):
+        super().__init__(f"请求失败，状态码: {response.status_code}")
+        self.response = response
+
+
+class RetryPolicy:
+    """微信读书和Notion共用的重试策略
+
+    只重试超时、连接错误、429和5xx，400之类的参数错误直接抛出；
+    等待时间为带随机抖动的指数退避（不超过max_delay），并且不会短于Retry-After。
+    Retry-After不受max_delay限制，超过max_retry_after时放弃重试。
+    """
+
+    def __init__(
+        self,
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY,
+        max_delay=RETRY_MAX_DELAY,
+        max_retry_after=RETRY_MAX_RETRY_AFTER,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retries = 0
+        # Notion请求会在多个线程中同时重试
+        self.lock = threading.Lock()
+
+    def get_retry_after(self, exception):
+        """判断异常是否可以重试，可以重试时返回Retry-After（可能为None），否则返回False"""
+        if isinstance(exception, RetryableResponseError):
+            return parse_retry_after(exception.response.headers.get("Retry-After"))
+        if isinstance(exception, HTTPResponseError):
+            if exception.status in RETRYABLE_STATUS:
+                return parse_retry_after(exception.headers.get("Retry-After"))
+            return False
+        if isinstance(
+            exception,
+            (
+                RequestTimeoutError,
+                httpx.TransportError,
+                requests.ConnectionError,
+                requests.Timeout,
+            ),
+        ):
+            return None
+        return False
+
+    def get_delay(self, attempt, retry_after=None):
+        """第attempt次失败后需要等待的秒数"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay = random.uniform(delay / 2, delay)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def should_retry(self, exception, attempt, name):
+        """返回需要等待的秒数，不需要重试时返回None"""
+        retry_after = self.get_retry_after(exception)
+        if retry_after is False or attempt >= self.max_attempts:
+            return None
+        if retry_after and retry_after > self.max_retry_after:
+            logger.warning(
+                f"{name} 请求失败: {str(exception)}，"
+                f"Retry-After {retry_after:.0f}秒超过{self.max_retry_after:.0f}秒，不再重试"
+            )
+            return None
+        delay = self.get_delay(attempt, retry_after)
+        with self.lock:
+            self.retries += 1
+        logger.warning(
+            f"{name} 第{attempt}次请求失败: {str(exception)}，{delay:.1f}秒后重试"
+        )
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                delay = self.should_retry(e, attempt, func.__name__)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def async_call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                delay = self.should_retry(e, attempt, func.__name__)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def __call__(self, func):
+        """作为装饰器使用"""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return wrapper
+
+
+retry_policy = RetryPolicy()
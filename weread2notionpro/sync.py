@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from weread2notionpro import book, read_time, weread
+from weread2notionpro.async_weread_api import AsyncWeReadApi
+from weread2notionpro.context import get_context
+from weread2notionpro.log_config import setup_logging
+from weread2notionpro.profiling import profiled
+from weread2notionpro.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("book", "weread", "read_time")
+
+
+def fetch_api_data(weread_api):
+    """在后台线程中获取阅读时长数据
+
+    使用AsyncWeReadApi自己的连接池，不和主线程共用requests.Session；
+    Cookie从weread_api读取，刷新仍由weread_api的CookieRefresher统一进行。
+    """
+
+    async def fetch():
+        async with AsyncWeReadApi(weread_api, concurrency=1) as async_api:
+            return await async_api.get_api_data()
+
+    return asyncio.run(fetch())
+
+
+@profiled("sync")
+def main():
+    """在一个进程中依次同步书籍、笔记和阅读时长
+
+    三个阶段共用同一个WeReadApi、NotionHelper和Notion书籍列表，
+    数据库查找、设置写入和书籍列表查询都只做一次。
+    """
+    parser = argparse.ArgumentParser(description="同步书籍、笔记和阅读时长到Notion")
+    parser.add_argument(
+        "phases",
+        nargs="*",
+        help=f"要运行的阶段，可选 {', '.join(PHASES)}，默认全部运行",
+    )
+    parser.add_argument(
+        "--overlap",
+        action="store_true",
+        help="同步书籍的同时在后台获取阅读时长数据",
+    )
+    parser.add_argument("--profile", action="store_true", help="输出性能分析报告")
+    args = parser.parse_args()
+    unknown = set(args.phases) - set(PHASES)
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(sorted(unknown))}")
+    phases = [x for x in PHASES if x in (args.phases or PHASES)]
+    setup_logging()
+    context = get_context()
+    with tracer.span("sync", cat="run"), ThreadPoolExecutor(max_workers=1) as executor:
+        api_data = None
+        if args.overlap and "book" in phases and "read_time" in phases:
+            # 阅读时长只依赖微信读书的数据，可以和书籍同步同时获取；
+            # 写入Notion的部分会和书籍同步创建相同的日期页面，仍然按顺序执行
+            api_data = executor.submit(fetch_api_data, context.weread_api)
+        for phase in phases:
+            logger.info(f"开始{phase}阶段")
+            with tracer.span(phase, cat="phase"):
+                if phase == "book":
+                    book.main()
+                elif phase == "weread":
+                    weread.main()
+                else:
+                    read_time.main(api_data.result() if api_data else None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 本地状态目录，GitHub Action中通过actions/cache在多次运行之间保留
+STATE_DIR = os.getenv("WEREAD_STATE_DIR") or ".weread"
+# 设置为false时每次都全量获取
+WEREAD_INCREMENTAL = (os.getenv("WEREAD_INCREMENTAL") or "true").lower() != "false"
+
+
+class SyncState:
+    """按书籍保存每个接口返回的synckey以及合并后的完整数据
+
+    每本书每个接口一个文件，只在用到的时候读取，避免书很多的时候一次性加载全部数据。
+    synckey为0时接口返回全量数据，直接覆盖本地缓存；否则只返回增量，合并到本地缓存。
+    """
+
+    def __init__(self, state_dir=None, enabled=None):
+        self.state_dir = os.path.join(state_dir or STATE_DIR, "synckey")
+        self.enabled = WEREAD_INCREMENTAL if enabled is None else enabled
+
+    def get_path(self, endpoint, key):
+        return os.path.join(self.state_dir, endpoint, f"{key}.json")
+
+    def load(self, endpoint, key):
+        """返回{"synckey": synckey, "items": {id: item}}，没有缓存时synckey为0"""
+        path = self.get_path(endpoint, key)
+        if self.enabled and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"读取同步状态 {path} 失败，改为全量获取: {str(e)}")
+        return {"synckey": 0, "items": {}}
+
+    def get_synckey(self, endpoint, key):
+        return self.load(endpoint, key).get("synckey", 0)
+
+    def save(self, endpoint, key, state):
+        if not self.enabled:
+            return
+        path = self.get_path(endpoint, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def merge(self, endpoint, key, synckey, new_synckey, updated, removed, id_key):
+        """合并增量数据并保存，返回合并后的完整列表
+
+        synckey为本次请求时传入的值，new_synckey为接口返回的值，
+        updated为新增或修改的数据，removed为被删除的数据的id。
+        """
+        state = self.load(endpoint, key) if synckey else {"items": {}}
+        items = state.get("items", {})
+        for item in updated or []:
+            items[str(item.get(id_key))] = item
+        for item_id in removed or []:
+            if isinstance(item_id, dict):
+                item_id = item_id.get(id_key)
+            items.pop(str(item_id), None)
+        if new_synckey is not None:
+            self.save(endpoint, key, {"synckey": new_synckey, "items": items})
+        if synckey:
+            logger.info(
+                f"增量同步 {endpoint}/{key}: synckey {synckey} -> {new_synckey}, "
+                f"更新 {len(updated or [])} 条, 删除 {len(removed or [])} 条, 共 {len(items)} 条"
+            )
+        return list(items.values())
+
+    def merge_dict(self, endpoint, key, synckey, new_synckey, updated):
+        """合并字典形式的增量数据（如每日阅读时长）"""
+        state = self.load(endpoint, key) if synckey else {"items": {}}
+        items = state.get("items", {})
+        items.update({str(k): v for k, v in (updated or {}).items()})
+        if new_synckey is not None:
+            self.save(endpoint, key, {"synckey": new_synckey, "items": items})
+        return items
@@ -0,0 +1,120 @@
+import atexit
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 追踪文件路径，Chrome trace格式，可以用 chrome://tracing 或 https://ui.perfetto.dev 打开
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+
+class Tracer:
+    """记录嵌套的耗时区间(运行 → 阶段 → 书籍 → 接口请求)，导出为Chrome trace JSON
+
+    同一线程内的区间按时间自动嵌套；协程中并发的请求使用异步事件，不会互相覆盖。
+    没有设置TRACE_FILE时所有方法都直接返回，不产生额外开销。
+    """
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.async_ids = itertools.count(1)
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def timestamp(self, t):
+        """perf_counter的时间转换为trace中的微秒"""
+        return round((t - self.origin) * 1e6, 1)
+
+    def thread_id(self):
+        thread = threading.current_thread()
+        if thread.ident not in self.threads:
+            self.threads[thread.ident] = thread.name
+        return thread.ident
+
+    @contextmanager
+    def span(self, name, cat="sync", **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.complete(name, cat, start, time.perf_counter() - start, **args)
+
+    def complete(self, name, cat, start, elapsed, **args):
+        """记录一个已经结束的区间，start为time.perf_counter()的值"""
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": self.timestamp(start),
+            "dur": round(elapsed * 1e6, 1),
+            "pid": self.pid,
+            "tid": self.thread_id(),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+
+    def complete_async(self, name, cat, start, elapsed, **args):
+        """记录协程中的区间，同一线程上并发的区间分别显示"""
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": cat,
+            "id": next(self.async_ids),
+            "pid": self.pid,
+            "tid": self.thread_id(),
+        }
+        begin = dict(event, ph="b", ts=self.timestamp(start), args=args)
+        end = dict(event, ph="e", ts=self.timestamp(start + elapsed))
+        with self.lock:
+            self.events.extend((begin, end))
+
+    def dump(self):
+        if not self.enabled or not self.events:
+            return
+        with self.lock:
+            events = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+                for tid, name in self.threads.items()
+            ]
+            events.extend(self.events)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"traceEvents": events, "displayTimeUnit": "ms"},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+        logger.info(f"写入了 {len(events)} 条追踪事件到 {self.path}")
+
+
+tracer = Tracer()
+if tracer.enabled:
+    atexit.register(tracer.dump)
@@ -0,0 +1,56 @@
+import time
+
+import httpx
+
+from weread2notionpro.cassette import CassetteTransport, cassette
+from weread2notionpro.metrics import (
+    metrics,
+    notion_endpoint,
+    request_key,
+    response_size,
+)
+from weread2notionpro.rate_limiter import notion_rate_limiter
+from weread2notionpro.tracing import tracer
+
+
+class NotionTransport(httpx.BaseTransport):
+    """NotionHelper所有请求的传输层，发送前经过进程内共享的限流器"""
+
+    def __init__(self, transport=None, limiter=notion_rate_limiter):
+        self.transport = transport or httpx.HTTPTransport()
+        if cassette:
+            # 设置了HTTP_CASSETTE时录制或回放所有请求
+            self.transport = CassetteTransport(cassette, self.transport)
+        self.limiter = limiter
+
+    def handle_request(self, request):
+        host = request.url.host
+        self.limiter.acquire(host)
+        endpoint = notion_endpoint(request.method, request.url.path)
+        key = request_key(request.method, request.url, request.read())
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"notion {endpoint}", cat="notion"):
+                response = self.transport.handle_request(request)
+                # Notion的响应不使用流式读取，这里读取后耗时包含下载响应体的时间
+                response.read()
+        except Exception:
+            metrics.observe(
+                "notion", endpoint, key, time.perf_counter() - start, error=True
+            )
+            raise
+        metrics.observe(
+            "notion",
+            endpoint,
+            key,
+            time.perf_counter() - start,
+            response_size(response),
+            response.status_code >= 400,
+        )
+        self.limiter.observe(
+            host, response.status_code, response.headers.get("Retry-After")
+        )
+        return response
+
+    def close(self):
+        self.transport.close()
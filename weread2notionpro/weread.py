@@ -1,40 +1,93 @@
+import asyncio
+import itertools
 import logging
+import os
 
-from weread2notionpro.notion_helper import NotionHelper
+from weread2notionpro.async_weread_api import prefetch_books
+from weread2notionpro.context import ClientProxy, get_context
+from weread2notionpro.log_config import setup_logging
+from weread2notionpro.profiling import profiled
 from weread2notionpro.utils import (
     get_block,
     get_heading,
     get_number,
     get_number_from_result,
+    get_property_value,
     get_quote,
     get_rich_text_from_result,
     get_table_of_contents,
+    timestamp_to_date,
+)
+from weread2notionpro.weread_api import (
+    WEREAD_CHAPTER_BATCH_SIZE,
+    WEREAD_STREAM_JSON,
 )
-from weread2notionpro.weread_api import WeReadApi
 
 # 获取logger实例
 logger = logging.getLogger(__name__)
 
+# 需要同步的书不少于这个数量时，一次性读取划线、笔记和章节数据库，不再逐本查询
+NOTION_NOTE_INDEX_THRESHOLD = int(os.getenv("NOTION_NOTE_INDEX_THRESHOLD") or 20)
+# 一次性读取的结果，{database_id: {书籍page_id: [(bookmarkId等, blockId, 页面id)]}}
+note_index = {}
+
+
+def load_note_index():
+    """分页读取一次划线、笔记和章节数据库，按书籍关联分组
+
+    只保留比较和删除时用到的id，不保存完整的页面。
+    """
+    filter = {"property": "blockId", "rich_text": {"is_not_empty": True}}
+    for database_id, key in (
+        (notion_helper.bookmark_database_id, "bookmarkId"),
+        (notion_helper.review_database_id, "reviewId"),
+        (notion_helper.chapter_database_id, "chapterUid"),
+    ):
+        results = notion_helper.query_all(database_id, filter=filter)
+        index = {}
+        for result in results:
+            properties = result.get("properties")
+            row = (
+                get_property_value(properties.get(key)),
+                get_property_value(properties.get("blockId")),
+                result.get("id"),
+            )
+            for relation in get_property_value(properties.get("书籍")) or []:
+                index.setdefault(relation.get("id"), []).append(row)
+        note_index[database_id] = index
+        logger.info(f"从数据库 {database_id} 读取了 {len(results)} 条记录")
+
+
+def get_note_rows(database_id, page_id, key, filter, get_value=None):
+    """一本书在database中已有的记录，返回(bookmarkId等, blockId, 页面id)的列表
+
+    已经一次性读取过这个数据库时直接从note_index中取，否则按书籍查询。
+    """
+    if database_id in note_index:
+        return note_index[database_id].get(page_id, [])
+    get_value = get_value or get_rich_text_from_result
+    results = notion_helper.query_all_by_book(database_id, filter)
+    return [
+        (get_value(x, key), get_rich_text_from_result(x, "blockId"), x.get("id"))
+        for x in results
+    ]
+
 
-def get_bookmark_list(page_id, bookId):
-    """获取我的划线"""
+def get_bookmark_list(page_id, bookId, bookmarks=None):
+    """获取我的划线，bookmarks为预先获取的微信读书划线"""
     filter = {
         "and": [
             {"property": "书籍", "relation": {"contains": page_id}},
             {"property": "blockId", "rich_text": {"is_not_empty": True}},
         ]
     }
-    results = notion_helper.query_all_by_book(
-        notion_helper.bookmark_database_id, filter
+    rows = get_note_rows(
+        notion_helper.bookmark_database_id, page_id, "bookmarkId", filter
     )
-    dict1 = {
-        get_rich_text_from_result(x, "bookmarkId"): get_rich_text_from_result(
-            x, "blockId"
-        )
-        for x in results
-    }
-    dict2 = {get_rich_text_from_result(x, "blockId"): x.get("id") for x in results}
-    bookmarks = weread_api.get_bookmark_list(bookId)
+    dict1 = {key: blockId for key, blockId, _ in rows}
+    dict2 = {blockId: id for _, blockId, id in rows}
+    if bookmarks is None:
+        bookmarks = weread_api.get_bookmark_list(bookId)
     for i in bookmarks:
         if i.get("bookmarkId") in dict1:
             i["blockId"] = dict1.pop(i.get("bookmarkId"))
@@ -44,23 +97,19 @@ def get_bookmark_list(page_id, bookId):
     return bookmarks
 
 
-def get_review_list(page_id, bookId):
-    """获取笔记"""
+def get_review_list(page_id, bookId, reviews=None):
+    """获取笔记，reviews为预先获取的微信读书想法"""
     filter = {
         "and": [
             {"property": "书籍", "relation": {"contains": page_id}},
             {"property": "blockId", "rich_text": {"is_not_empty": True}},
         ]
     }
-    results = notion_helper.query_all_by_book(notion_helper.review_database_id, filter)
-    dict1 = {
-        get_rich_text_from_result(x, "reviewId"): get_rich_text_from_result(
-            x, "blockId"
-        )
-        for x in results
-    }
-    dict2 = {get_rich_text_from_result(x, "blockId"): x.get("id") for x in results}
-    reviews = weread_api.get_review_list(bookId)
+    rows = get_note_rows(notion_helper.review_database_id, page_id, "reviewId", filter)
+    dict1 = {key: blockId for key, blockId, _ in rows}
+    dict2 = {blockId: id for _, blockId, id in rows}
+    if reviews is None:
+        reviews = weread_api.get_review_list(bookId)
     for i in reviews:
         if i.get("reviewId") in dict1:
             i["blockId"] = dict1.pop(i.get("reviewId"))
@@ -115,17 +164,21 @@ def sort_notes(page_id, chapter, bookmark_list):
 
     notes = []
     if chapter != None:
-        filter = {"property": "书籍", "relation": {"contains": page_id}}
-        results = notion_helper.query_all_by_book(
-            notion_helper.chapter_database_id, filter
-        )
-        dict1 = {
-            get_number_from_result(x, "chapterUid"): get_rich_text_from_result(
-                x, "blockId"
-            )
-            for x in results
+        filter = {
+            "and": [
+                {"property": "书籍", "relation": {"contains": page_id}},
+                {"property": "blockId", "rich_text": {"is_not_empty": True}},
+            ]
         }
-        dict2 = {get_rich_text_from_result(x, "blockId"): x.get("id") for x in results}
+        rows = get_note_rows(
+            notion_helper.chapter_database_id,
+            page_id,
+            "chapterUid",
+            filter,
+            get_number_from_result,
+        )
+        dict1 = {key: blockId for key, blockId, _ in rows}
+        dict2 = {blockId: id for _, blockId, id in rows}
         d = {}
         for data in bookmark_list:
             chapterUid = data.get("chapterUid", 1)
@@ -237,13 +290,29 @@ def append_blocks_to_notion(id, blocks, after, contents):
     return l
 
 
-weread_api = WeReadApi()
-notion_helper = NotionHelper()
+async def fetch_notes(async_api, bookId):
+    """并发获取一本书的划线和想法"""
+    bookmarks, reviews = await asyncio.gather(
+        async_api.get_bookmark_list(bookId),
+        async_api.get_review_list(bookId),
+    )
+    return {"bookmarks": bookmarks, "reviews": reviews}
+
+
+# 客户端在第一次使用时才创建，导入模块时不会发出任何请求
+weread_api = ClientProxy("weread_api")
+notion_helper = ClientProxy("notion_helper")
 
 
+@profiled("weread")
 def main(target_book_id=None):
-    notion_books = notion_helper.get_all_book()
-    books = weread_api.get_notebooklist()
+    setup_logging()
+    notion_books = get_context().notion_books
+    if WEREAD_STREAM_JSON:
+        # 逐本解析笔记本列表，只有需要同步的书会保留在内存中
+        books = weread_api.iter_notebooklist()
+    else:
+        books = weread_api.get_notebooklist()
     if books != None:
         # 如果指定了目标书籍ID，只处理该书籍
         if target_book_id:
@@ -253,6 +322,7 @@ def main(target_book_id=None):
                 return
             logger.info(f"指定同步书籍: {target_book_id}")
 
+        books_to_sync = []
         for index, book in enumerate(books):
             bookId = book.get("bookId")
             title = book.get("title")
@@ -262,7 +332,7 @@ def main(target_book_id=None):
             review_count = book.get("reviewCount", 0)
 
             logger.info(f"\n{'=' * 60}")
-            logger.info(f"开始处理第 {index + 1}/{len(books)} 本书籍")
+            logger.info(f"开始处理第 {index + 1} 本书籍")
             logger.info(f"书籍信息: 《{title}》 - {author}")
             logger.info(f"书籍ID: {bookId}")
             logger.info(f"笔记统计: {note_count} 个标注, {review_count} 个想法")
@@ -277,41 +347,81 @@ def main(target_book_id=None):
             if sort == notion_books.get(bookId).get("Sort"):
                 logger.info(f"书籍《{title}》的排序值未变化，跳过同步")
                 continue
+            books_to_sync.append(book)
+        # 流式解析时没有预先排序，这里保持按sort同步的顺序
+        books_to_sync.sort(key=lambda x: x.get("sort") or 0)
+
+        logger.info(f"共需要同步 {len(books_to_sync)} 本书的笔记")
+        # 变化的书较多时，读取一遍整个数据库比逐本查询的请求少
+        note_index.clear()
+        if len(books_to_sync) >= NOTION_NOTE_INDEX_THRESHOLD:
+            load_note_index()
+        # 划线和想法在后台并发获取，写入Notion仍按顺序进行
+        books_dict = {book.get("bookId"): book for book in books_to_sync}
+        book_ids = list(books_dict.keys())
+        notes = prefetch_books(weread_api, book_ids, fetch_notes)
+        # 按批次处理：章节信息一次请求覆盖整批书，整批新笔记的日期页面也一次性解析，
+        # 只保留当前批次的结果
+        for _ in range(0, len(book_ids), WEREAD_CHAPTER_BATCH_SIZE):
+            batch = list(itertools.islice(notes, WEREAD_CHAPTER_BATCH_SIZE))
+            chapters = weread_api.get_chapter_infos([bookId for bookId, _ in batch])
+            batch_notes = []
+            for bookId, prefetched in batch:
+                prefetched = prefetched or {}
+                title = books_dict.get(bookId).get("title")
+                pageId = notion_books.get(bookId).get("pageId")
+                logger.info(f"开始同步《{title}》的笔记内容...")
+
+                bookmark_list = get_bookmark_list(
+                    pageId, bookId, prefetched.get("bookmarks")
+                )
+                logger.info(f"获取标注列表完成，标注数: {len(bookmark_list)}")
 
-            pageId = notion_books.get(bookId).get("pageId")
-            logger.info(f"开始同步《{title}》的笔记内容...")
-
-            chapter = weread_api.get_chapter_info(bookId)
-            logger.info(f"获取章节信息完成，章节数: {len(chapter) if chapter else 0}")
+                reviews = get_review_list(pageId, bookId, prefetched.get("reviews"))
+                logger.info(f"获取想法列表完成，想法数: {len(reviews)}")
 
-            bookmark_list = get_bookmark_list(pageId, bookId)
-            logger.info(f"获取标注列表完成，标注数: {len(bookmark_list)}")
+                bookmark_list.extend(reviews)
+                logger.info(f"合并后总笔记数: {len(bookmark_list)}")
+                batch_notes.append((bookId, pageId, bookmark_list))
 
-            reviews = get_review_list(pageId, bookId)
-            logger.info(f"获取想法列表完成，想法数: {len(reviews)}")
+            # 还没有写入Notion的笔记才需要关联日期
+            notion_helper.preload_dates(
+                timestamp_to_date(int(note.get("createTime")))
+                for _, _, bookmark_list in batch_notes
+                for note in bookmark_list
+                if "createTime" in note and "blockId" not in note
+            )
 
-            bookmark_list.extend(reviews)
-            total_notes = len(bookmark_list)
-            logger.info(f"合并后总笔记数: {total_notes}")
+            for bookId, pageId, bookmark_list in batch_notes:
+                book = books_dict.get(bookId)
+                title = book.get("title")
+                sort = book.get("sort")
+                chapter = chapters.get(bookId)
+                logger.info(
+                    f"获取章节信息完成，章节数: {len(chapter) if chapter else 0}"
+                )
 
-            content = sort_notes(pageId, chapter, bookmark_list)
-            logger.info("笔记排序完成，准备写入Notion...")
+                content = sort_notes(pageId, chapter, bookmark_list)
+                logger.info("笔记排序完成，准备写入Notion...")
 
-            append_blocks(pageId, content)
-            logger.info("笔记内容写入完成")
+                append_blocks(pageId, content)
+                logger.info("笔记内容写入完成")
 
-            properties = {"Sort": get_number(sort)}
-            notion_helper.update_book_page(page_id=pageId, properties=properties)
-            logger.info("书籍属性更新完成")
-            logger.info(f"《{title}》同步完成！")
-            logger.info(f"{'=' * 60}\n")
+                properties = {"Sort": get_number(sort)}
+                notion_helper.update_book_page(page_id=pageId, properties=properties)
+                logger.info("书籍属性更新完成")
+                logger.info(f"《{title}》同步完成！")
+                logger.info(f"{'=' * 60}\n")
+    weread_api.log_request_stats()
+    notion_helper.log_stats()
 
 
 if __name__ == "__main__":
     import sys
 
     # 支持命令行参数指定书籍ID
-    target_book_id = sys.argv[1] if len(sys.argv) > 1 else None
+    args = [x for x in sys.argv[1:] if not x.startswith("--")]
+    target_book_id = args[0] if args else None
     if target_book_id:
         logger.info(f"命令行指定同步书籍ID: {target_book_id}")
     main(target_book_id)
@@ -1,73 +1,264 @@
 import hashlib
+import json
 import logging
 import os
 import re
-from datetime import datetime
+import threading
+import time
+from collections import Counter
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from requests.utils import cookiejar_from_dict
-from retrying import retry
 
-# 配置日志 - 同时输出到控制台和文件
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-log_filename = os.path.join(
-    log_dir, f"weread_sync_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+from weread2notionpro.book_info_cache import BookInfoCache
+from weread2notionpro.cassette import CassetteAdapter, cassette
+from weread2notionpro.cookie_cache import CookieCache
+from weread2notionpro.json_stream import JsonArrayStream
+from weread2notionpro.log_config import preview
+from weread2notionpro.metrics import (
+    metrics,
+    request_key,
+    response_size,
+    weread_endpoint,
+)
+from weread2notionpro.retry_policy import (
+    RETRYABLE_STATUS,
+    RetryableResponseError,
+    retry_policy,
 )
+from weread2notionpro.sync_state import SyncState
+from weread2notionpro.tracing import tracer
 
-# 创建logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# 创建formatter
-formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-
-# 创建控制台handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(formatter)
-
-# 创建文件handler
-file_handler = logging.FileHandler(log_filename, encoding="utf-8")
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-
-# 添加handlers到logger
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
-
-# 避免重复日志
-logger.propagate = False
-
-logger.info(f"日志文件已创建: {log_filename}")
 
 load_dotenv()
-WEREAD_URL = "https://weread.qq.com"
-WEREAD_NOTEBOOKS_URL = "https://weread.qq.com/api/user/notebook"
-WEREAD_BOOKMARKLIST_URL = "https://weread.qq.com/web/book/bookmarklist"
-WEREAD_CHAPTER_INFO = "https://weread.qq.com/web/book/chapterInfos"
-WEREAD_READ_INFO_URL = "https://weread.qq.com/web/book/getProgress"
-WEREAD_REVIEW_LIST_URL = "https://weread.qq.com/web/review/list"
-WEREAD_BOOK_INFO = "https://weread.qq.com/web/book/info"
-WEREAD_READDATA_DETAIL = "https://weread.qq.com/web/readdata/detail"
-WEREAD_HISTORY_URL = "https://weread.qq.com/web/readdata/summary?synckey=0"
+# 可以指向本地的模拟服务器（python -m weread2notionpro.fake_weread）做压力测试
+WEREAD_URL = (os.getenv("WEREAD_BASE_URL") or "https://weread.qq.com").rstrip("/")
+WEREAD_NOTEBOOKS_URL = f"{WEREAD_URL}/api/user/notebook"
+WEREAD_BOOKMARKLIST_URL = f"{WEREAD_URL}/web/book/bookmarklist"
+WEREAD_CHAPTER_INFO = f"{WEREAD_URL}/web/book/chapterInfos"
+WEREAD_READ_INFO_URL = f"{WEREAD_URL}/web/book/getProgress"
+WEREAD_REVIEW_LIST_URL = f"{WEREAD_URL}/web/review/list"
+WEREAD_BOOK_INFO = f"{WEREAD_URL}/web/book/info"
+WEREAD_READDATA_DETAIL = f"{WEREAD_URL}/web/readdata/detail"
+WEREAD_HISTORY_URL = f"{WEREAD_URL}/web/readdata/summary"
+WEREAD_SHELF_SYNC_URL = f"{WEREAD_URL}/web/shelf/sync"
+
+# 章节信息每次批量请求的书籍数
+WEREAD_CHAPTER_BATCH_SIZE = int(os.getenv("WEREAD_CHAPTER_BATCH_SIZE") or 50)
+# Cookie超过这个时间（秒）没有刷新时，在下一次请求前主动刷新，避免遇到登录超时
+WEREAD_COOKIE_MAX_AGE = int(os.getenv("WEREAD_COOKIE_MAX_AGE") or 1800)
+# 登录超时的响应很小，只在小响应里查找错误码，避免解析大的响应
+LOGIN_TIMEOUT_PATTERN = re.compile(rb'"errCode"\s*:\s*-2012')
+# 连接池大小，并发请求时可以适当调大
+WEREAD_POOL_SIZE = int(os.getenv("WEREAD_POOL_SIZE") or 10)
+# (连接超时, 读取超时)，单位秒
+WEREAD_TIMEOUT = (
+    float(os.getenv("WEREAD_CONNECT_TIMEOUT") or 10),
+    float(os.getenv("WEREAD_READ_TIMEOUT") or 30),
+)
+# 书架和笔记本列表以流的方式逐本解析，书很多时避免一次性加载整个响应
+WEREAD_STREAM_JSON = os.getenv("WEREAD_STREAM_JSON", "true").lower() != "false"
+WEREAD_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class CookieRefresher:
+    """Cookie刷新协调器，多个请求同时遇到登录超时时只有一个去刷新，其他的等待结果
+
+    每次刷新成功version加一，调用方传入请求时看到的version，
+    如果已经变化说明其他请求刚刷新过，直接使用刷新结果而不是再刷新一次。
+    """
+
+    def __init__(self, refresh, max_age=WEREAD_COOKIE_MAX_AGE):
+        self.refresh_func = refresh
+        self.max_age = max_age
+        self.version = 0
+        self.refreshed_at = time.time()
+        self.last_result = True
+        self.refresh_count = 0
+        self.lock = threading.Lock()
+
+    def age(self):
+        """Cookie距离上次获取或刷新的秒数"""
+        return time.time() - self.refreshed_at
+
+    def refresh(self, version, refresh=None):
+        """refresh为本次使用的刷新方法，默认使用初始化时传入的方法"""
+        with self.lock:
+            if version != self.version:
+                return self.last_result
+            self.refresh_count += 1
+            self.last_result = (refresh or self.refresh_func)()
+            if self.last_result:
+                self.version += 1
+                self.refreshed_at = time.time()
+            return self.last_result
+
+    def ensure_fresh(self):
+        """Cookie快要过期时提前刷新"""
+        if self.max_age and self.age() > self.max_age:
+            logger.info(f"Cookie已使用 {self.age():.0f} 秒，提前刷新")
+            if not self.refresh(self.version):
+                # 刷新失败时不再每次请求都尝试，等遇到登录超时再处理
+                self.refreshed_at = time.time()
 
 
 class WeReadApi:
     def __init__(self):
+        # Cookie来源：env为环境变量，cloud为CookieCloud，cache为本地缓存
+        self.cookie_source = "env"
+        self.cookie_cache = None
+        self.cookie_expires = None
         self.cookie = self.get_cookie()
-        self.session = requests.Session()
-        self.session.cookies = self.parse_cookie_string()
-        self.session.headers.update(
+        self.session = self.create_session()
+        # 主页预热只在首次请求或登录超时后进行，而不是每个请求之前都访问一次主页
+        self.warmed_up = False
+        self.request_count = Counter()
+        self.cookie_refresher = CookieRefresher(self.refresh_cookie)
+        # 各接口的synckey，用于增量获取
+        self.sync_state = SyncState()
+        # 书籍基本信息几乎不变，缓存到本地避免重复请求
+        self.book_info_cache = BookInfoCache()
+
+    def create_session(self):
+        """创建复用连接池的session，所有请求都通过它发出"""
+        session = requests.Session()
+        pool_options = dict(
+            pool_connections=1, pool_maxsize=WEREAD_POOL_SIZE, max_retries=0
+        )
+        if cassette:
+            # 设置了HTTP_CASSETTE时录制或回放所有请求
+            adapter = CassetteAdapter(cassette, **pool_options)
+        else:
+            adapter = HTTPAdapter(**pool_options)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.cookies = self.parse_cookie_string()
+        session.headers.update(
             {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/73.0.3683.103 Safari/537.36",
                 "Accept": "application/json, text/plain, */*",
                 "Content-Type": "application/json",
             }
         )
+        return session
+
+    def warm_up(self, force=False):
+        """访问一次主页以获取必要的Cookie，同一次运行中只需要一次"""
+        if self.warmed_up and not force:
+            return
+        self.request_count["warmup"] += 1
+        self.session.get(WEREAD_URL, timeout=WEREAD_TIMEOUT)
+        self.warmed_up = True
+
+    def request(self, method, url, warm_up=True, **kwargs):
+        """统一的请求入口，复用连接池并统计请求次数"""
+        if warm_up:
+            # 旧实现中每个请求前都会访问一次主页，记录下来用于统计节省的请求数
+            self.request_count["legacy_warmup"] += 1
+            self.warm_up()
+        self.cookie_refresher.ensure_fresh()
+        kwargs.setdefault("timeout", WEREAD_TIMEOUT)
+        version = self.cookie_refresher.version
+        stream = kwargs.get("stream", False)
+        r = self.send_with_retry(method, url, **kwargs)
+        if self.is_login_timeout(r, stream) and self.cookie_refresher.refresh(version):
+            logger.info("登录超时，Cookie刷新后重新请求")
+            version = self.cookie_refresher.version
+            r.close()
+            r = self.send_with_retry(method, url, **kwargs)
+        if (
+            self.is_login_timeout(r, stream)
+            and self.cookie_source == "cache"
+            and self.cookie_refresher.refresh(version, self.reload_cloud_cookie)
+        ):
+            logger.info("登录超时，使用CookieCloud的Cookie重新请求")
+            r.close()
+            r = self.send_with_retry(method, url, **kwargs)
+        return r
+
+    def is_login_timeout(self, r, stream=False):
+        # 流式响应不能提前读取整个响应体，只看开头的内容，
+        # 分块传输的响应没有Content-Length，不能靠响应头判断大小
+        content = self.peek_stream(r) if stream else r.content
+        return len(content) < 1024 and LOGIN_TIMEOUT_PATTERN.search(content)
+
+    def peek_stream(self, r, size=1024):
+        """读取流式响应开头至少size字节，之后用iter_stream读取时仍从头开始"""
+        if not hasattr(r, "stream_head"):
+            chunks = r.iter_content(chunk_size=WEREAD_STREAM_CHUNK_SIZE)
+            head = b""
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= size:
+                    break
+            r.stream_head = head
+            r.stream_chunks = chunks
+        return r.stream_head
+
+    def iter_stream(self, r):
+        """逐块返回流式响应的内容，包括peek_stream已经读取的开头"""
+        self.peek_stream(r)
+        if r.stream_head:
+            yield r.stream_head
+        yield from r.stream_chunks
+
+    def send_with_retry(self, method, url, **kwargs):
+        try:
+            return retry_policy.call(self.send, method, url, **kwargs)
+        except RetryableResponseError as e:
+            # 重试次数用完，交给调用方按失败的响应处理
+            return e.response
+
+    def send(self, method, url, **kwargs):
+        self.request_count["api"] += 1
+        endpoint = weread_endpoint(url)
+        key = request_key(method, url, kwargs.get("params"), kwargs.get("json"))
+        start = time.perf_counter()
+        try:
+            with tracer.span(f"weread {endpoint}", cat="weread"):
+                r = self.session.request(method, url, **kwargs)
+        except Exception:
+            metrics.observe(
+                "weread", endpoint, key, time.perf_counter() - start, error=True
+            )
+            raise
+        metrics.observe(
+            "weread",
+            endpoint,
+            key,
+            time.perf_counter() - start,
+            response_size(r, kwargs.get("stream", False)),
+            r.status_code >= 400,
+        )
+        if r.status_code in RETRYABLE_STATUS:
+            # 流式响应要读完并关闭，连接才会回到连接池，而不是一直占用到被回收；
+            # 错误响应很小，重试次数用完时调用方仍然可以读取r.text
+            r.content
+            r.close()
+            raise RetryableResponseError(r)
+        return r
+
+    def log_request_stats(self):
+        """输出本次运行的请求统计"""
+        api = self.request_count["api"]
+        warmup = self.request_count["warmup"]
+        saved = self.request_count["legacy_warmup"] - warmup
+        logger.info(
+            f"微信读书请求统计: API请求 {api} 次, 主页预热 {warmup} 次, "
+            f"共 {api + warmup} 次往返, 相比每次请求前预热节省 {saved} 次往返"
+        )
+        logger.info(self.book_info_cache.report())
+        if cassette:
+            logger.info(cassette.report())
+        logger.info(
+            f"Cookie刷新 {self.cookie_refresher.refresh_count} 次, "
+            f"当前Cookie已使用 {self.cookie_refresher.age():.0f} 秒"
+        )
+        logger.info(metrics.summary())
+        metrics.dump()
 
     def try_get_cloud_cookie(self, url, id, password):
         if url.endswith("/"):
@@ -85,6 +276,13 @@ class WeReadApi:
                     [f"{cookie['name']}={cookie['value']}" for cookie in cookies]
                 )
                 result = cookie_str
+                # 记录最早的过期时间，本地缓存不会超过这个时间
+                expires = [
+                    cookie.get("expirationDate")
+                    for cookie in cookies
+                    if cookie.get("expirationDate")
+                ]
+                self.cookie_expires = min(expires) if expires else None
         return result
 
     def get_cookie(self):
@@ -94,12 +292,57 @@ class WeReadApi:
         id = os.getenv("CC_ID")
         password = os.getenv("CC_PASSWORD")
         cookie = os.getenv("WEREAD_COOKIE")
+        if cassette and cassette.replaying:
+            # 回放时不会真正发出请求，也不需要访问CookieCloud
+            return cookie or "wr_replay=1"
         if url and id and password:
-            cookie = self.try_get_cloud_cookie(url, id, password)
+            self.cookie_cache = CookieCache(id, password)
+            cookie = self.cookie_cache.load()
+            if cookie:
+                logger.info("使用本地缓存的Cookie，跳过CookieCloud")
+                self.cookie_source = "cache"
+            else:
+                cookie = self.get_cloud_cookie()
         if not cookie or not cookie.strip():
             raise Exception("没有找到cookie，请按照文档填写cookie")
         return cookie
 
+    def get_cloud_cookie(self):
+        """从CookieCloud获取Cookie并保存到本地缓存"""
+        url = os.getenv("CC_URL") or "https://cookiecloud.malinkang.com/"
+        cookie = self.try_get_cloud_cookie(
+            url, os.getenv("CC_ID"), os.getenv("CC_PASSWORD")
+        )
+        if cookie:
+            self.cookie_source = "cloud"
+            self.cookie_cache.save(cookie, self.cookie_expires)
+        return cookie
+
+    def reload_cloud_cookie(self):
+        """本地缓存的Cookie被拒绝时，重新从CookieCloud获取"""
+        if self.cookie_source != "cache":
+            return False
+        logger.info("本地缓存的Cookie已失效，重新从CookieCloud获取")
+        self.cookie_cache.clear()
+        try:
+            cookie = self.get_cloud_cookie()
+        except Exception as e:
+            logger.error(f"从CookieCloud获取Cookie失败: {str(e)}")
+            return False
+        if not cookie:
+            return False
+        self.cookie = cookie
+        self.session.cookies = self.parse_cookie_string()
+        self.warmed_up = False
+        return True
+
+    def save_cookie_cache(self):
+        """刷新后的Cookie写回本地缓存，后续进程直接使用"""
+        if self.cookie_cache is None:
+            return
+        cookie = "; ".join(f"{c.name}={c.value}" for c in self.session.cookies)
+        self.cookie_cache.save(cookie, self.cookie_expires)
+
     def parse_cookie_string(self):
         cookies_dict = {}
 
@@ -114,43 +357,44 @@ class WeReadApi:
 
         return cookiejar
 
-    def get_bookshelf(self, retry_count=0):
-        """获取书架信息"""
+    def get_bookshelf(self, book_fields=None):
+        """获取书架信息，返回书籍、阅读进度和书架分类
+
+        返回的bookProgress和archive用于判断哪些书需要同步，
+        book_fields不为空时每本书只保留这些字段。
+        """
+        if WEREAD_STREAM_JSON:
+            # 逐本解析书架，书很多时不需要在内存中保留完整响应
+            fields = {}
+            books = [
+                self.trim_book(book, book_fields)
+                for book in self.iter_bookshelf(fields)
+            ]
+            return self.make_shelf(books, fields)
         logger.info("正在获取书架信息...")
         try:
-            url = "https://weread.qq.com/web/shelf/sync"
+            url = WEREAD_SHELF_SYNC_URL
             headers = dict(self.session.headers)
             logger.info(f"请求URL: {url}")
             logger.debug(f"请求头: {headers}")
 
-            self.session.get(WEREAD_URL)
-            r = self.session.get(url, headers=headers)
+            r = self.request("GET", url, headers=headers)
             logger.info(f"书架API响应状态: {r.status_code}")
-            logger.debug(f"响应头: {dict(r.headers)}")
+            logger.debug("响应头: %s", preview(dict(r.headers)))
 
             if r.ok:
                 data = r.json()
                 logger.info(
                     f"书架API响应成功，数据键: {list(data.keys()) if data else 'None'}"
                 )
-                logger.debug(f"完整响应数据: {data}")
+                logger.debug("完整响应数据: %s", preview(data))
 
                 # 检查是否有错误码
                 if data.get("errCode") and data.get("errCode") != 0:
                     logger.warning(
                         f"API返回错误: {data.get('errMsg', '未知错误')} (错误码: {data.get('errCode')})"
                     )
-                    if (
-                        data.get("errCode") == -2012 and retry_count == 0
-                    ):  # 登录超时，尝试刷新Cookie
-                        logger.info("获取书架信息 - 登录超时，尝试刷新Cookie后重试")
-                        if self.refresh_cookie():
-                            logger.info("获取书架信息 - Cookie刷新成功，重新请求")
-                            return self.get_bookshelf(retry_count + 1)
-                        else:
-                            logger.warning("获取书架信息 - Cookie刷新失败")
-                            return {"books": []}
-                    elif data.get("errCode") == -2012:
+                    if data.get("errCode") == -2012:  # 刷新Cookie重试后仍然登录超时
                         logger.warning("获取书架信息 - 重试后仍登录超时")
                         return {"books": []}
                     self.handle_errcode(data.get("errCode", 0))
@@ -176,10 +420,11 @@ class WeReadApi:
                         )
                     if len(books) > 5:
                         logger.info(f"  ... 还有 {len(books) - 5} 本书")
-                return {"books": books}
+                books = [self.trim_book(book, book_fields) for book in books]
+                return self.make_shelf(books, data)
             else:
-                logger.error(f"书架API响应失败: {r.status_code} - {r.text}")
-                logger.debug(f"错误响应内容: {r.text}")
+                logger.error("书架API响应失败: %s - %s", r.status_code, preview(r.text))
+                logger.debug("错误响应内容: %s", preview(r.text))
                 errcode = r.json().get("errcode", 0) if r.text else 0
                 self.handle_errcode(errcode)
                 return {"books": []}
@@ -190,14 +435,93 @@ class WeReadApi:
             traceback.print_exc()
             raise
 
+    def trim_book(self, book, book_fields):
+        if not book_fields:
+            return book
+        return {key: book[key] for key in book_fields if key in book}
+
+    def make_shelf(self, books, data):
+        """书架数据，bookProgress中每本书包含readingTime、progress和updateTime"""
+        return {
+            "books": books,
+            "bookProgress": data.get("bookProgress") or [],
+            "archive": data.get("archive") or [],
+            "synckey": data.get("synckey"),
+        }
+
+    def iter_bookshelf(self, fields=None):
+        """以流的方式获取书架，逐本返回书籍，不在内存中保留完整响应
+
+        fields用于接收books以外的顶层字段（bookProgress、archive等），迭代结束后可用。
+        """
+        logger.info("正在以流的方式获取书架信息...")
+        fields = {} if fields is None else fields
+        count = 0
+        for book in self.stream_json_array(WEREAD_SHELF_SYNC_URL, "books", fields):
+            count += 1
+            yield book
+        info = fields.get("info")
+        if not count and isinstance(info, dict):
+            # 如果books为空，尝试从info中获取
+            for book in info.pop("books", None) or []:
+                count += 1
+                yield book
+        if self.check_stream_errcode("获取书架信息", fields):
+            logger.info(f"获取到书架信息，包含 {count} 本书")
+
+    def iter_notebooklist(self):
+        """以流的方式获取笔记本列表，逐本返回转换后的书籍
+
+        和get_notebooklist不同，返回顺序为接口原始顺序，没有按sort排序。
+        """
+        logger.info("正在以流的方式获取笔记本列表...")
+        fields = {}
+        count = 0
+        for notebook in self.stream_json_array(WEREAD_NOTEBOOKS_URL, "books", fields):
+            book = self.format_notebook(notebook)
+            if book:
+                count += 1
+                yield book
+        if self.check_stream_errcode("获取笔记本列表", fields):
+            logger.info(f"获取到 {count} 本有笔记的书")
+
+    def stream_json_array(self, url, key, fields):
+        """请求url并逐个返回响应中key数组的元素，其他顶层字段写入fields"""
+        headers = dict(self.session.headers)
+        logger.info(f"请求URL: {url}")
+        r = self.request("GET", url, headers=headers, stream=True)
+        with r:
+            logger.info(f"{url} 响应状态: {r.status_code}")
+            if not r.ok:
+                # 开头已经被is_login_timeout读取，r.text中没有这部分
+                text = b"".join(self.iter_stream(r)).decode("utf-8", "replace")
+                logger.error("请求失败: %s - %s", r.status_code, preview(text))
+                errcode = json.loads(text).get("errcode", 0) if text else 0
+                self.handle_errcode(errcode)
+                return
+            stream = JsonArrayStream(self.iter_stream(r), key)
+            for item in stream:
+                yield item
+            fields.update(stream.fields)
+
+    def check_stream_errcode(self, name, fields):
+        """检查流式响应中的错误码，没有错误时返回True"""
+        errcode = fields.get("errCode")
+        if not errcode:
+            return True
+        logger.warning(
+            f"{name} - API返回错误: {fields.get('errMsg', '未知错误')} (错误码: {errcode})"
+        )
+        self.handle_errcode(errcode)
+        return False
+
     def handle_errcode(self, errcode):
         if errcode == -2012 or errcode == -2010:
             logger.error(
                 "::error::微信读书Cookie过期了，请参考文档重新设置。https://mp.weixin.qq.com/s/B_mqLUZv7M1rmXRsMlBf7A"
             )
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
-    def get_notebooklist(self, retry_count=0):
+    def get_notebooklist(self):
         """获取笔记本列表"""
         logger.info("正在获取笔记本列表...")
         try:
@@ -205,34 +529,23 @@ class WeReadApi:
             logger.info(f"请求URL: {WEREAD_NOTEBOOKS_URL}")
             logger.debug(f"请求头: {headers}")
 
-            self.session.get(WEREAD_URL)
-            r = self.session.get(WEREAD_NOTEBOOKS_URL, headers=headers)
+            r = self.request("GET", WEREAD_NOTEBOOKS_URL, headers=headers)
             logger.info(f"笔记本API响应状态: {r.status_code}")
-            logger.debug(f"响应头: {dict(r.headers)}")
+            logger.debug("响应头: %s", preview(dict(r.headers)))
 
             if r.ok:
                 data = r.json()
                 logger.info(
                     f"笔记本API响应数据键: {list(data.keys()) if data else 'None'}"
                 )
-                logger.debug(f"完整响应数据: {data}")
+                logger.debug("完整响应数据: %s", preview(data))
 
                 # 检查是否有错误码
                 if data.get("errCode") and data.get("errCode") != 0:
                     logger.warning(
                         f"API返回错误: {data.get('errMsg', '未知错误')} (错误码: {data.get('errCode')})"
                     )
-                    if (
-                        data.get("errCode") == -2012 and retry_count == 0
-                    ):  # 登录超时，尝试刷新Cookie
-                        logger.info("获取笔记本列表 - 登录超时，尝试刷新Cookie后重试")
-                        if self.refresh_cookie():
-                            logger.info("获取笔记本列表 - Cookie刷新成功，重新请求")
-                            return self.get_notebooklist(retry_count + 1)
-                        else:
-                            logger.warning("获取笔记本列表 - Cookie刷新失败")
-                            return []
-                    elif data.get("errCode") == -2012:
+                    if data.get("errCode") == -2012:  # 刷新Cookie重试后仍然登录超时
                         logger.warning("获取笔记本列表 - 重试后仍登录超时")
                         return []
                     self.handle_errcode(data.get("errCode", 0))
@@ -246,17 +559,7 @@ class WeReadApi:
                         f"第一本有笔记的书示例: {books[0] if books else 'None'}"
                     )
 
-                    # 为了保持与原有书架API的兼容性，将笔记本数据转换为书架格式
-                    # 提取book字段作为主要书籍信息，保持原有的数据结构
-                    formatted_books = []
-                    for notebook in books:
-                        if "book" in notebook:
-                            book_info = notebook["book"].copy()
-                            # 保留笔记本特有的信息
-                            book_info["noteCount"] = notebook.get("noteCount", 0)
-                            book_info["reviewCount"] = notebook.get("reviewCount", 0)
-                            book_info["sort"] = notebook.get("sort", 0)
-                            formatted_books.append(book_info)
+                    formatted_books = self.format_notebooks(books)
 
                     logger.debug(
                         f"转换后的书籍格式示例: {formatted_books[0] if formatted_books else 'None'}"
@@ -266,8 +569,10 @@ class WeReadApi:
                     logger.warning("未获取到笔记本数据")
                     return []
             else:
-                logger.error(f"笔记本API响应失败: {r.status_code} - {r.text}")
-                logger.debug(f"错误响应内容: {r.text}")
+                logger.error(
+                    "笔记本API响应失败: %s - %s", r.status_code, preview(r.text)
+                )
+                logger.debug("错误响应内容: %s", preview(r.text))
                 errcode = r.json().get("errcode", 0) if r.text else 0
                 self.handle_errcode(errcode)
                 return []
@@ -278,42 +583,32 @@ class WeReadApi:
             traceback.print_exc()
             raise
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
-    def get_bookinfo(self, bookId, retry_count=0):
-        """获取书的详情"""
+    def get_bookinfo(self, bookId):
+        """获取书的详情，优先使用本地缓存"""
+        book_info = self.book_info_cache.get(bookId)
+        if book_info:
+            logger.debug(f"获取书籍信息 - 命中缓存 (bookId: {bookId})")
+            return book_info
         headers = dict(self.session.headers)
         logger.info(f"获取书籍信息 - 请求URL: {WEREAD_BOOK_INFO}")
         logger.info(f"获取书籍信息 - 请求参数: bookId={bookId}")
         logger.debug(f"获取书籍信息 - 请求头: {headers}")
 
-        self.session.get(WEREAD_URL)
         params = dict(bookId=bookId)
-        r = self.session.get(WEREAD_BOOK_INFO, params=params, headers=headers)
+        r = self.request("GET", WEREAD_BOOK_INFO, params=params, headers=headers)
         logger.info(f"获取书籍信息 - 响应状态: {r.status_code}")
-        logger.debug(f"获取书籍信息 - 响应头: {dict(r.headers)}")
+        logger.debug("获取书籍信息 - 响应头: %s", preview(dict(r.headers)))
 
         if r.ok:
             data = r.json()
-            logger.info(f"获取书籍信息 - 完整原始响应: {data}")
+            logger.debug("获取书籍信息 - 原始响应: %s", preview(data))
 
             # 检查是否有错误码
             if data.get("errCode") and data.get("errCode") != 0:
                 logger.warning(
                     f"获取书籍信息 - API返回错误: {data.get('errMsg', '未知错误')} (错误码: {data.get('errCode')})"
                 )
-                if (
-                    data.get("errCode") == -2012 and retry_count == 0
-                ):  # 登录超时，尝试刷新Cookie
-                    logger.info("获取书籍信息 - 登录超时，尝试刷新Cookie后重试")
-                    if self.refresh_cookie():
-                        logger.info("获取书籍信息 - Cookie刷新成功，重新请求")
-                        return self.get_bookinfo(bookId, retry_count + 1)
-                    else:
-                        logger.warning(
-                            f"获取书籍信息 - Cookie刷新失败，跳过书籍 {bookId}"
-                        )
-                        return None
-                elif data.get("errCode") == -2012:
+                if data.get("errCode") == -2012:  # 刷新Cookie重试后仍然登录超时
                     logger.warning(
                         f"获取书籍信息 - 重试后仍登录超时，跳过书籍 {bookId}"
                     )
@@ -330,52 +625,44 @@ class WeReadApi:
             logger.debug(
                 f"获取书籍信息 - 书籍详细信息: title={book_title}, author={book_author}, cover={data.get('cover', 'None')}, isbn={data.get('isbn', 'None')}"
             )
+            self.book_info_cache.put(bookId, data)
 
             return data
         else:
-            logger.error(f"获取书籍信息 - 请求失败: {r.status_code} - {r.text}")
+            logger.error(
+                "获取书籍信息 - 请求失败: %s - %s", r.status_code, preview(r.text)
+            )
             errcode = r.json().get("errcode", 0) if r.text else 0
             self.handle_errcode(errcode)
             return None
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
-    def get_bookmark_list(self, bookId, retry_count=0):
+    def get_bookmark_list(self, bookId):
         headers = dict(self.session.headers)
         logger.info(f"获取标注列表 - 请求URL: {WEREAD_BOOKMARKLIST_URL}")
         logger.info(f"获取标注列表 - 请求参数: bookId={bookId}")
         logger.debug(f"获取标注列表 - 请求头: {headers}")
 
-        self.session.get(WEREAD_URL)
+        synckey = self.sync_state.get_synckey("bookmarks", bookId)
         params = dict(bookId=bookId)
-        r = self.session.get(WEREAD_BOOKMARKLIST_URL, params=params, headers=headers)
+        if synckey:
+            params["synckey"] = synckey
+        r = self.request("GET", WEREAD_BOOKMARKLIST_URL, params=params, headers=headers)
         logger.info(f"获取标注列表 - 响应状态: {r.status_code}")
-        logger.debug(f"获取标注列表 - 响应头: {dict(r.headers)}")
+        logger.debug("获取标注列表 - 响应头: %s", preview(dict(r.headers)))
 
         if r.ok:
             data = r.json()
             logger.info(
                 f"获取标注列表 - 响应数据键: {list(data.keys()) if data else 'None'}"
             )
-            logger.debug(f"获取标注列表 - 完整响应: {data}")
+            logger.debug("获取标注列表 - 完整响应: %s", preview(data))
 
             # 检查是否有错误码
             if data.get("errCode") and data.get("errCode") != 0:
                 logger.warning(
                     f"获取标注列表 - API返回错误: {data.get('errMsg', '未知错误')} (错误码: {data.get('errCode')})"
                 )
-                if (
-                    data.get("errCode") == -2012 and retry_count == 0
-                ):  # 登录超时，尝试刷新Cookie
-                    logger.info("获取标注列表 - 登录超时，尝试刷新Cookie后重试")
-                    if self.refresh_cookie():
-                        logger.info("获取标注列表 - Cookie刷新成功，重新请求")
-                        return self.get_bookmark_list(bookId, retry_count + 1)
-                    else:
-                        logger.warning(
-                            f"获取标注列表 - Cookie刷新失败，跳过书籍 {bookId}"
-                        )
-                        return []
-                elif data.get("errCode") == -2012:
+                if data.get("errCode") == -2012:  # 刷新Cookie重试后仍然登录超时
                     logger.warning(
                         f"获取标注列表 - 重试后仍登录超时，跳过书籍 {bookId}"
                     )
@@ -383,17 +670,18 @@ class WeReadApi:
                 self.handle_errcode(data.get("errCode", 0))
                 return []
 
-            bookmarks = data.get("updated", [])
+            bookmarks = self.merge_bookmarks(bookId, synckey, data)
             logger.info(f"获取到 {len(bookmarks)} 个标注")
             return bookmarks
         else:
-            logger.error(f"获取标注列表 - 请求失败: {r.status_code} - {r.text}")
+            logger.error(
+                "获取标注列表 - 请求失败: %s - %s", r.status_code, preview(r.text)
+            )
             errcode = r.json().get("errcode", 0) if r.text else 0
             self.handle_errcode(errcode)
             return []
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
-    def get_read_info(self, bookId, retry_count=0):
+    def get_read_info(self, bookId):
         # 构建请求头，模仿TypeScript版本的实现
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/73.0.3683.103 Safari/537.36",
@@ -416,61 +704,26 @@ class WeReadApi:
             except Exception as e:
                 logger.debug(f"获取阅读信息 - 无法获取cookies信息: {str(e)}")
 
-            r = requests.get(
+            r = self.request(
+                "GET",
                 WEREAD_READ_INFO_URL,
+                warm_up=False,
                 params=params,
                 headers=headers,
-                cookies=self.session.cookies,
-                timeout=30,
             )
             logger.info(f"获取阅读信息 - 响应状态: {r.status_code}")
-            logger.debug(f"获取阅读信息 - 响应头: {dict(r.headers)}")
-            logger.debug(
-                f"获取阅读信息 - 响应内容预览: {r.text[:500] if r.text else 'None'}..."
-            )
+            logger.debug("获取阅读信息 - 响应头: %s", preview(dict(r.headers)))
 
             if r.ok:
                 data = r.json()
-                logger.info(f"获取阅读信息 - 完整原始响应: {data}")
+                logger.debug("获取阅读信息 - 原始响应: %s", preview(data))
 
                 # 检查是否有错误码
                 if data.get("errCode") and data.get("errCode") != 0:
                     logger.warning(
                         f"获取阅读信息 - API返回错误: {data.get('errMsg', '未知错误')} (错误码: {data.get('errCode')})"
                     )
-                    if (
-                        data.get("errCode") == -2012 and retry_count == 0
-                    ):  # 登录超时，尝试刷新Cookie
-                        logger.info("获取阅读信息 - 登录超时，尝试刷新Cookie后重试")
-                        # 避免Cookie冲突，只记录Cookie数量
-                        try:
-                            cookie_count = len(list(self.session.cookies))
-                            logger.debug(
-                                f"获取阅读信息 - 当前cookies数量: {cookie_count}"
-                            )
-                        except Exception as e:
-                            logger.debug(
-                                f"获取阅读信息 - 无法获取当前cookies信息: {str(e)}"
-                            )
-
-                        if self.refresh_cookie():
-                            logger.info("获取阅读信息 - Cookie刷新成功，重新请求")
-                            try:
-                                cookie_count = len(list(self.session.cookies))
-                                logger.debug(
-                                    f"获取阅读信息 - 刷新后cookies数量: {cookie_count}"
-                                )
-                            except Exception as e:
-                                logger.debug(
-                                    f"获取阅读信息 - 无法获取刷新后cookies信息: {str(e)}"
-                                )
-                            return self.get_read_info(bookId, retry_count + 1)
-                        else:
-                            logger.warning(
-                                f"获取阅读信息 - Cookie刷新失败，跳过书籍 {bookId}"
-                            )
-                            return None
-                    elif data.get("errCode") == -2012:
+                    if data.get("errCode") == -2012:  # 刷新Cookie重试后仍然登录超时
                         logger.warning(
                             f"获取阅读信息 - 重试后仍登录超时，跳过书籍 {bookId}"
                         )
@@ -478,82 +731,8 @@ class WeReadApi:
                     self.handle_errcode(data.get("errCode", 0))
                     return None
 
-                # 根据book.py中实际使用的字段进行适配
-                result = {}
-
-                # 基础标识字段
-                result["bookId"] = bookId
-                result["canFreeRead"] = data.get("canFreeRead")
-                result["timestamp"] = data.get("timestamp")
-
-                # book.py中实际使用的核心字段
-                result["readingTime"] = data.get(
-                    "readingTime", 0
-                )  # 阅读时长（秒）- 用于计算"阅读时长"和"阅读状态"
-                result["progress"] = data.get("progress", 0)  # 阅读进度（0-100）
-                result["readingProgress"] = data.get(
-                    "progress", 0
-                )  # 兼容字段，用于计算"阅读进度"
-
-                # book.py中期望但API可能不返回的字段（设置默认值）
-                result["markedStatus"] = data.get(
-                    "markedStatus", 1
-                )  # 阅读状态标记：1-想读，4-读完，其他-在读
-                result["totalReadDay"] = data.get("totalReadDay", 0)  # 阅读天数
-                result["newRating"] = data.get("newRating")  # 评分
-                result["newRatingDetail"] = data.get("newRatingDetail")  # 评分详情
-
-                # 获取嵌套的book对象数据
-                book_data = data.get("book", {})
-
-                # 时间相关字段（优先从book对象中获取，然后从顶级对象获取）
-                result["finishedDate"] = book_data.get("finishedDate") or data.get(
-                    "finishedDate"
-                )  # 完成日期
-                result["lastReadingDate"] = book_data.get(
-                    "lastReadingDate"
-                ) or data.get("lastReadingDate")  # 最后阅读日期
-                result["readingBookDate"] = book_data.get(
-                    "readingBookDate"
-                ) or data.get("readingBookDate")  # 阅读书籍日期
-                result["beginReadingDate"] = book_data.get(
-                    "beginReadingDate"
-                ) or data.get("beginReadingDate")  # 开始阅读日期
-                result["startReadingTime"] = book_data.get(
-                    "startReadingTime"
-                ) or data.get("startReadingTime")  # 开始阅读时间戳
-                result["finishTime"] = book_data.get("finishTime") or data.get(
-                    "finishTime"
-                )  # 完成时间戳
-                result["updateTime"] = book_data.get("updateTime") or data.get(
-                    "updateTime"
-                )  # 更新时间
-
-                # 从book对象中提取其他重要字段
-                if book_data:
-                    # 覆盖之前设置的字段，使用book对象中的实际数据
-                    result["readingTime"] = book_data.get(
-                        "readingTime", result.get("readingTime", 0)
-                    )
-                    result["progress"] = book_data.get(
-                        "progress", result.get("progress", 0)
-                    )
-                    result["readingProgress"] = book_data.get(
-                        "progress", result.get("readingProgress", 0)
-                    )
-                    result["chapterUid"] = book_data.get("chapterUid")
-                    result["chapterOffset"] = book_data.get("chapterOffset")
-                    result["chapterIdx"] = book_data.get("chapterIdx")
-                    result["isStartReading"] = book_data.get("isStartReading")
-
-                # 阅读详情数据（用于插入阅读时间数据）
-                result["readDetail"] = data.get("readDetail", {})
-
-                # 书籍信息（可能包含额外的书籍元数据）
-                result["bookInfo"] = data.get("bookInfo", {})
-
-                # 保留原始数据以保持完整性和向后兼容
-                result["book"] = book_data
+                result = self.parse_read_info(bookId, data)
+                book_data = result["book"]
 
                 # 记录获取到的阅读信息详情
                 reading_time = result.get("readingTime", 0)
@@ -607,11 +786,13 @@ class WeReadApi:
                 logger.info(
                     f"获取阅读信息 - 时间字段详情: finishedDate={result.get('finishedDate')}, lastReadingDate={result.get('lastReadingDate')}, beginReadingDate={result.get('beginReadingDate')}"
                 )
-                logger.debug(f"获取阅读信息 - 最终返回数据: {result}")
+                logger.debug("获取阅读信息 - 最终返回数据: %s", preview(result))
                 return result
             else:
-                logger.error(f"获取阅读信息 - 请求失败: {r.status_code} - {r.text}")
-                logger.debug(f"获取阅读信息 - 失败响应头: {dict(r.headers)}")
+                logger.error(
+                    "获取阅读信息 - 请求失败: %s - %s", r.status_code, preview(r.text)
+                )
+                logger.debug("获取阅读信息 - 失败响应头: %s", preview(dict(r.headers)))
                 try:
                     errcode = r.json().get("errcode", 0) if r.text else 0
                 except:
@@ -626,6 +807,83 @@ class WeReadApi:
             logger.error(f"获取阅读信息 - 异常堆栈: {traceback.format_exc()}")
             return None
 
+    def parse_read_info(self, bookId, data):
+        """将阅读进度接口的响应转换为book.py中使用的格式"""
+        result = {}
+
+        # 基础标识字段
+        result["bookId"] = bookId
+        result["canFreeRead"] = data.get("canFreeRead")
+        result["timestamp"] = data.get("timestamp")
+
+        # book.py中实际使用的核心字段
+        result["readingTime"] = data.get(
+            "readingTime", 0
+        )  # 阅读时长（秒）- 用于计算"阅读时长"和"阅读状态"
+        result["progress"] = data.get("progress", 0)  # 阅读进度（0-100）
+        result["readingProgress"] = data.get(
+            "progress", 0
+        )  # 兼容字段，用于计算"阅读进度"
+
+        # book.py中期望但API可能不返回的字段（设置默认值）
+        result["markedStatus"] = data.get(
+            "markedStatus", 1
+        )  # 阅读状态标记：1-想读，4-读完，其他-在读
+        result["totalReadDay"] = data.get("totalReadDay", 0)  # 阅读天数
+        result["newRating"] = data.get("newRating")  # 评分
+        result["newRatingDetail"] = data.get("newRatingDetail")  # 评分详情
+
+        # 获取嵌套的book对象数据
+        book_data = data.get("book", {})
+
+        # 时间相关字段（优先从book对象中获取，然后从顶级对象获取）
+        result["finishedDate"] = book_data.get("finishedDate") or data.get(
+            "finishedDate"
+        )  # 完成日期
+        result["lastReadingDate"] = book_data.get("lastReadingDate") or data.get(
+            "lastReadingDate"
+        )  # 最后阅读日期
+        result["readingBookDate"] = book_data.get("readingBookDate") or data.get(
+            "readingBookDate"
+        )  # 阅读书籍日期
+        result["beginReadingDate"] = book_data.get("beginReadingDate") or data.get(
+            "beginReadingDate"
+        )  # 开始阅读日期
+        result["startReadingTime"] = book_data.get("startReadingTime") or data.get(
+            "startReadingTime"
+        )  # 开始阅读时间戳
+        result["finishTime"] = book_data.get("finishTime") or data.get(
+            "finishTime"
+        )  # 完成时间戳
+        result["updateTime"] = book_data.get("updateTime") or data.get(
+            "updateTime"
+        )  # 更新时间
+
+        # 从book对象中提取其他重要字段
+        if book_data:
+            # 覆盖之前设置的字段，使用book对象中的实际数据
+            result["readingTime"] = book_data.get(
+                "readingTime", result.get("readingTime", 0)
+            )
+            result["progress"] = book_data.get("progress", result.get("progress", 0))
+            result["readingProgress"] = book_data.get(
+                "progress", result.get("readingProgress", 0)
+            )
+            result["chapterUid"] = book_data.get("chapterUid")
+            result["chapterOffset"] = book_data.get("chapterOffset")
+            result["chapterIdx"] = book_data.get("chapterIdx")
+            result["isStartReading"] = book_data.get("isStartReading")
+
+        # 阅读详情数据（用于插入阅读时间数据）
+        result["readDetail"] = data.get("readDetail", {})
+
+        # 书籍信息（可能包含额外的书籍元数据）
+        result["bookInfo"] = data.get("bookInfo", {})
+
+        # 保留原始数据以保持完整性和向后兼容
+        result["book"] = book_data
+        return result
+
     def refresh_cookie(self):
         """刷新Cookie，模仿TypeScript版本的实现"""
         try:
@@ -636,10 +894,9 @@ class WeReadApi:
                 "Content-Type": "application/json",
             }
 
-            # 发送HEAD请求到主页
-            r = requests.head(
-                WEREAD_URL, headers=headers, cookies=self.session.cookies, timeout=30
-            )
+            # 发送HEAD请求到主页，同时也起到了预热的作用
+            self.request_count["warmup"] += 1
+            r = self.session.head(WEREAD_URL, headers=headers, timeout=WEREAD_TIMEOUT)
 
             # 检查是否有新的Cookie
             if "Set-Cookie" in r.headers:
@@ -647,34 +904,36 @@ class WeReadApi:
                 # 更新session的cookies
                 for cookie in r.cookies:
                     self.session.cookies.set(cookie.name, cookie.value)
+                self.warmed_up = True
+                self.save_cookie_cache()
                 return True
             else:
                 logger.warning("未收到新的Cookie")
-                return False
+                # 本地缓存的Cookie无法刷新时直接换成CookieCloud的
+                return self.reload_cloud_cookie()
 
         except Exception as e:
             logger.error(f"刷新Cookie失败: {str(e)}")
             return False
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def get_review_list(self, bookId):
         headers = dict(self.session.headers)
         logger.info(f"获取想法列表 - 请求URL: {WEREAD_REVIEW_LIST_URL}")
         logger.info(f"获取想法列表 - 请求参数: bookId={bookId}")
         logger.debug(f"获取想法列表 - 请求头: {headers}")
 
-        self.session.get(WEREAD_URL)
-        params = dict(bookId=bookId, listType=11, mine=1, synckey=0)
-        r = self.session.get(WEREAD_REVIEW_LIST_URL, params=params, headers=headers)
+        synckey = self.sync_state.get_synckey("reviews", bookId)
+        params = dict(bookId=bookId, listType=11, mine=1, synckey=synckey)
+        r = self.request("GET", WEREAD_REVIEW_LIST_URL, params=params, headers=headers)
         logger.info(f"获取想法列表 - 响应状态: {r.status_code}")
-        logger.debug(f"获取想法列表 - 响应头: {dict(r.headers)}")
+        logger.debug("获取想法列表 - 响应头: %s", preview(dict(r.headers)))
 
         if r.ok:
             data = r.json()
             logger.info(
                 f"获取想法列表 - 响应数据键: {list(data.keys()) if data else 'None'}"
             )
-            logger.debug(f"获取想法列表 - 完整响应: {data}")
+            logger.debug("获取想法列表 - 完整响应: %s", preview(data))
 
             # 检查是否有错误码
             if data.get("errCode") and data.get("errCode") != 0:
@@ -687,17 +946,13 @@ class WeReadApi:
                 self.handle_errcode(data.get("errCode", 0))
                 return []
 
-            reviews = data.get("reviews", [])
-            if reviews:
-                reviews = list(map(lambda x: x.get("review"), reviews))
-                reviews = [
-                    {"chapterUid": 1000000, **x} if x.get("type") == 4 else x
-                    for x in reviews
-                ]
+            reviews = self.merge_reviews(bookId, synckey, data)
             logger.info(f"获取到 {len(reviews)} 个想法")
             return reviews
         else:
-            logger.error(f"获取想法列表 - 请求失败: {r.status_code} - {r.text}")
+            logger.error(
+                "获取想法列表 - 请求失败: %s - %s", r.status_code, preview(r.text)
+            )
             errcode = r.json().get("errcode", 0) if r.text else 0
             self.handle_errcode(errcode)
             return []
@@ -707,17 +962,18 @@ class WeReadApi:
         logger.info(f"获取历史数据 - 请求URL: {WEREAD_HISTORY_URL}")
         logger.debug(f"获取历史数据 - 请求头: {headers}")
 
-        self.session.get(WEREAD_URL)
-        r = self.session.get(WEREAD_HISTORY_URL, headers=headers)
+        synckey = self.sync_state.get_synckey("history", "summary")
+        params = dict(synckey=synckey)
+        r = self.request("GET", WEREAD_HISTORY_URL, params=params, headers=headers)
         logger.info(f"获取历史数据 - 响应状态: {r.status_code}")
-        logger.debug(f"获取历史数据 - 响应头: {dict(r.headers)}")
+        logger.debug("获取历史数据 - 响应头: %s", preview(dict(r.headers)))
 
         if r.ok:
             data = r.json()
             logger.info(
                 f"获取历史数据 - 响应数据键: {list(data.keys()) if data else 'None'}"
             )
-            logger.debug(f"获取历史数据 - 完整响应: {data}")
+            logger.debug("获取历史数据 - 完整响应: %s", preview(data))
 
             # 检查是否有错误码
             if data.get("errCode") and data.get("errCode") != 0:
@@ -727,32 +983,49 @@ class WeReadApi:
                 self.handle_errcode(data.get("errCode", 0))
                 return None
 
-            return data
+            return self.merge_read_times(synckey, data)
         else:
-            logger.error(f"获取历史数据 - 请求失败: {r.status_code} - {r.text}")
+            logger.error(
+                "获取历史数据 - 请求失败: %s - %s", r.status_code, preview(r.text)
+            )
             errcode = r.json().get("errcode", 0) if r.text else 0
             self.handle_errcode(errcode)
             return None
 
-    @retry(stop_max_attempt_number=3, wait_fixed=5000)
     def get_chapter_info(self, bookId):
+        """获取单本书的章节信息"""
+        return self.get_chapter_infos([bookId]).get(bookId)
+
+    def get_chapter_infos(self, bookIds, chunk_size=None):
+        """批量获取章节信息，返回{bookId: {chapterUid: chapter}}
+
+        chapterInfos接口本身支持一次传入多个bookId，按chunk_size分批请求，
+        获取失败的书籍不会出现在结果中。
+        """
+        chunk_size = chunk_size or WEREAD_CHAPTER_BATCH_SIZE
+        result = {}
+        for i in range(0, len(bookIds), chunk_size):
+            result.update(self.fetch_chapter_chunk(bookIds[i : i + chunk_size]))
+        return result
+
+    def fetch_chapter_chunk(self, bookIds):
         headers = dict(self.session.headers)
         logger.info(f"获取章节信息 - 请求URL: {WEREAD_CHAPTER_INFO}")
-        logger.info(f"获取章节信息 - 请求参数: bookId={bookId}")
+        logger.info(f"获取章节信息 - 请求参数: {len(bookIds)} 本书, bookIds={bookIds}")
         logger.debug(f"获取章节信息 - 请求头: {headers}")
 
-        self.session.get(WEREAD_URL)
-        body = {"bookIds": [bookId], "synckeys": [0], "teenmode": 0}
-        r = self.session.post(WEREAD_CHAPTER_INFO, json=body, headers=headers)
+        synckeys = [self.sync_state.get_synckey("chapters", x) for x in bookIds]
+        body = {"bookIds": bookIds, "synckeys": synckeys, "teenmode": 0}
+        r = self.request("POST", WEREAD_CHAPTER_INFO, json=body, headers=headers)
         logger.info(f"获取章节信息 - 响应状态: {r.status_code}")
-        logger.debug(f"获取章节信息 - 响应头: {dict(r.headers)}")
+        logger.debug("获取章节信息 - 响应头: %s", preview(dict(r.headers)))
 
         if r.ok:
             data = r.json()
             logger.info(
                 f"获取章节信息 - 响应数据键: {list(data.keys()) if data else 'None'}"
             )
-            logger.debug(f"获取章节信息 - 完整响应: {data}")
+            logger.debug("获取章节信息 - 完整响应: %s", preview(data))
 
             # 检查是否有错误码
             if data.get("errCode") and data.get("errCode") != 0:
@@ -760,37 +1033,124 @@ class WeReadApi:
                     f"获取章节信息 - API返回错误: {data.get('errMsg', '未知错误')} (错误码: {data.get('errCode')})"
                 )
                 if data.get("errCode") == -2012:  # 登录超时
-                    logger.warning(f"获取章节信息 - 登录超时，跳过书籍 {bookId}")
-                    return None
+                    logger.warning(f"获取章节信息 - 登录超时，跳过书籍 {bookIds}")
+                    return {}
                 self.handle_errcode(data.get("errCode", 0))
-                return None
+                return {}
 
-            if (
-                "data" in data
-                and len(data["data"]) == 1
-                and "updated" in data["data"][0]
-            ):
-                update = data["data"][0]["updated"]
-                update.append(
-                    {
-                        "chapterUid": 1000000,
-                        "chapterIdx": 1000000,
-                        "updateTime": 1683825006,
-                        "readAhead": 0,
-                        "title": "点评",
-                        "level": 1,
-                    }
-                )
-                logger.info(f"获取到 {len(update)} 个章节信息")
-                return {item["chapterUid"]: item for item in update}
-            else:
+            result = self.parse_chapter_infos(data, dict(zip(bookIds, synckeys)))
+            if not result:
                 logger.warning("获取章节信息 - 响应数据格式异常")
-                return None
+            for bookId, chapters in result.items():
+                logger.info(f"获取到 {len(chapters)} 个章节信息 (bookId: {bookId})")
+            return result
         else:
-            logger.error(f"获取章节信息 - 请求失败: {r.status_code} - {r.text}")
+            logger.error(
+                "获取章节信息 - 请求失败: %s - %s", r.status_code, preview(r.text)
+            )
             errcode = r.json().get("errcode", 0) if r.text else 0
             self.handle_errcode(errcode)
+            return {}
+
+    def parse_chapter_infos(self, data, synckeys=None):
+        """将chapterInfos接口的响应转换为{bookId: {chapterUid: chapter}}
+
+        synckeys为请求时每本书传入的synckey，增量返回的章节会合并到本地缓存中。
+        """
+        synckeys = synckeys or {}
+        result = {}
+        for item in data.get("data") or []:
+            bookId = item.get("bookId")
+            if bookId is None or "updated" not in item:
+                continue
+            chapters = self.sync_state.merge(
+                "chapters",
+                bookId,
+                synckeys.get(bookId, 0),
+                item.get("synckey"),
+                item.get("updated"),
+                item.get("removed"),
+                "chapterUid",
+            )
+            result[bookId] = self.format_chapters(chapters)
+        return result
+
+    def merge_bookmarks(self, bookId, synckey, data):
+        """合并增量返回的划线，返回完整的划线列表"""
+        return self.sync_state.merge(
+            "bookmarks",
+            bookId,
+            synckey,
+            data.get("synckey"),
+            data.get("updated", []),
+            data.get("removed", []),
+            "bookmarkId",
+        )
+
+    def merge_reviews(self, bookId, synckey, data):
+        """合并增量返回的想法，返回完整的想法列表"""
+        return self.sync_state.merge(
+            "reviews",
+            bookId,
+            synckey,
+            data.get("synckey"),
+            self.format_reviews(data.get("reviews", [])),
+            data.get("removed", []),
+            "reviewId",
+        )
+
+    def merge_read_times(self, synckey, data):
+        """合并增量返回的每日阅读时长"""
+        data["readTimes"] = self.sync_state.merge_dict(
+            "history", "summary", synckey, data.get("synckey"), data.get("readTimes")
+        )
+        return data
+
+    def format_notebooks(self, notebooks):
+        """为了保持与原有书架API的兼容性，将笔记本数据转换为书架格式"""
+        formatted_books = []
+        for notebook in notebooks:
+            book_info = self.format_notebook(notebook)
+            if book_info:
+                formatted_books.append(book_info)
+        return formatted_books
+
+    def format_notebook(self, notebook):
+        """提取book字段作为主要书籍信息，保持原有的数据结构
+
+        直接修改notebook中的book而不是复制一份，调用方不再使用原始响应。
+        """
+        if "book" not in notebook:
             return None
+        book_info = notebook["book"]
+        # 保留笔记本特有的信息
+        book_info["noteCount"] = notebook.get("noteCount", 0)
+        book_info["reviewCount"] = notebook.get("reviewCount", 0)
+        book_info["sort"] = notebook.get("sort", 0)
+        return book_info
+
+    def format_reviews(self, reviews):
+        """提取想法列表中的review，点评统一放到chapterUid为1000000的章节下"""
+        if not reviews:
+            return []
+        reviews = list(map(lambda x: x.get("review"), reviews))
+        return [
+            {"chapterUid": 1000000, **x} if x.get("type") == 4 else x for x in reviews
+        ]
+
+    def format_chapters(self, update):
+        """章节列表转换为以chapterUid为键的字典，并追加点评章节"""
+        update.append(
+            {
+                "chapterUid": 1000000,
+                "chapterIdx": 1000000,
+                "updateTime": 1683825006,
+                "readAhead": 0,
+                "title": "点评",
+                "level": 1,
+            }
+        )
+        return {item["chapterUid"]: item for item in update}
 
     def transform_id(self, book_id):
         id_length = len(book_id)